@@ -0,0 +1,241 @@
+import heapq
+import random
+import numpy as np
+import pandas as pd
+
+from esquema import a_booleano
+from generate_data import (
+    RONDAS, gestionar_plazas_por_destino_y_ronda, registrar_asignacion, registrar_renuncia
+)
+
+# ---- Configuración del modo de aceptación diferida ----
+NUM_PREFERENCIAS = 10  # Máximo de destinos que ordena cada estudiante
+PROB_CUMPLE_IDIOMA = 0.85  # Probabilidad de cumplir el requisito de idioma de un destino que lo exige
+PROB_RENUNCIA_POR_RONDA = {  # Solo aplica a estudiantes con propensión a renunciar (EstadoFinal inicial 'Renuncia')
+    '1ª Adjudicación': 0.4,
+    '2ª Adjudicación': 0.3,
+    '3ª Adjudicación': 0.3,
+    'Adjudicación Final': 0.0
+}
+
+def requiere_idioma_array(destinos_df):
+    """Devuelve un array booleano con RequiereIdioma, aceptando tanto bool como 'Sí'/'No'."""
+    return a_booleano(destinos_df['RequiereIdioma']).to_numpy()
+
+def generar_preferencias(estudiantes_df, destinos_df, num_preferencias=NUM_PREFERENCIAS):
+    """
+    Genera para cada estudiante una lista ordenada de hasta `num_preferencias` destinos distintos.
+    La 1ª preferencia es siempre el DestinoSolicitado y el resto se muestrea entre los destinos
+    no cancelados en la fecha de solicitud. Devuelve un array (estudiantes x preferencias) de
+    DestinoIDs, con 0 como relleno cuando no hay suficientes destinos disponibles.
+    """
+    num_estudiantes = len(estudiantes_df)
+    destino_ids = destinos_df['DestinoID'].to_numpy(dtype=np.int64)
+    num_destinos = len(destino_ids)
+    solicitados = estudiantes_df['DestinoSolicitado'].to_numpy(dtype=np.int64)
+
+    # Fecha límite de disponibilidad de cada destino (los no cancelados nunca caducan)
+    fechas_cancelacion = pd.to_datetime(destinos_df['FechaCancelación'], errors='coerce')
+    fechas_cancelacion = fechas_cancelacion.fillna(pd.Timestamp.max).to_numpy(dtype='datetime64[ns]')
+    fechas_solicitud = pd.to_datetime(estudiantes_df['FechaSolicitud']).to_numpy(dtype='datetime64[ns]')
+
+    # Muestreamos candidatos con holgura y nos quedamos con los primeros válidos y no repetidos
+    num_candidatos = max(1, (num_preferencias - 1) * 3)
+    candidatos = destino_ids[np.random.randint(0, num_destinos, size=(num_estudiantes, num_candidatos))]
+    candidatos = np.concatenate([solicitados[:, None], candidatos], axis=1)
+
+    posiciones = np.searchsorted(destino_ids, candidatos)
+    validos = fechas_solicitud[:, None] < fechas_cancelacion[posiciones]
+    validos[:, 0] = True  # El destino solicitado ya se eligió disponible en generar_estudiantes
+
+    # Marcamos repeticiones dentro de cada fila (se conserva la primera aparición)
+    orden = np.argsort(candidatos, axis=1, kind='stable')
+    ordenados = np.take_along_axis(candidatos, orden, axis=1)
+    repetidos_ordenados = np.zeros_like(validos)
+    repetidos_ordenados[:, 1:] = ordenados[:, 1:] == ordenados[:, :-1]
+    repetidos = np.zeros_like(validos)
+    np.put_along_axis(repetidos, orden, repetidos_ordenados, axis=1)
+    validos &= ~repetidos
+
+    rango = np.cumsum(validos, axis=1) - 1
+    seleccion = validos & (rango < num_preferencias)
+    preferencias = np.zeros((num_estudiantes, num_preferencias), dtype=np.int64)
+    filas, columnas = np.nonzero(seleccion)
+    preferencias[filas, rango[filas, columnas]] = candidatos[filas, columnas]
+    return preferencias
+
+def preferencias_a_texto(preferencias):
+    """Convierte el array de preferencias en cadenas 'id;id;...' para la columna Preferencias."""
+    return [";".join(str(d) for d in fila if d > 0) for fila in preferencias.tolist()]
+
+def _aceptacion_diferida(participantes, preferencias_pos, claves, capacidad):
+    """
+    Aceptación diferida propuesta por estudiantes con prioridad por expediente.
+    Cada destino mantiene un min-heap con sus titulares provisionales, de modo que la cima es el
+    peor expediente y puede ser desplazado en O(log k). Devuelve {destino_pos: heap}.
+    """
+    preferencias = preferencias_pos.tolist()
+    num_pref = preferencias_pos.shape[1]
+    siguiente = [0] * len(preferencias)
+    heaps = {}
+    libres = list(participantes[::-1])
+
+    while libres:
+        s = libres.pop()
+        fila = preferencias[s]
+        k = siguiente[s]
+        while k < num_pref:
+            d = fila[k]
+            k += 1
+            if d < 0 or capacidad[d] <= 0:
+                continue
+            heap = heaps.setdefault(d, [])
+            clave = claves[s]
+            if len(heap) < capacidad[d]:
+                heapq.heappush(heap, (clave, s))
+                break
+            if clave > heap[0][0]:
+                desplazado = heapq.heapreplace(heap, (clave, s))[1]
+                libres.append(desplazado)
+                break
+        siguiente[s] = k
+
+    return heaps
+
+def preparar_preferencias(estudiantes_df, destinos_df, preferencias):
+    """
+    Traduce el array de DestinoIDs a posiciones en destinos_df y anula (-1) las preferencias
+    cuyo requisito de idioma no cumple el estudiante (se sortea una vez por par estudiante-destino).
+    """
+    destino_ids = destinos_df['DestinoID'].to_numpy(dtype=np.int64)
+    orden_destinos = np.argsort(destino_ids)
+    posiciones = orden_destinos[np.clip(np.searchsorted(destino_ids, preferencias, sorter=orden_destinos), 0, len(destino_ids) - 1)]
+    preferencias_pos = np.where((preferencias > 0) & (destino_ids[posiciones] == preferencias), posiciones, -1)
+    exige_idioma = requiere_idioma_array(destinos_df)
+    no_cumple = np.random.random(preferencias_pos.shape) >= PROB_CUMPLE_IDIOMA
+    preferencias_pos[(preferencias_pos >= 0) & exige_idioma[preferencias_pos] & no_cumple] = -1
+    return preferencias_pos
+
+def ejecutar_rondas(preferencias_pos, expedientes, estudiante_ids, estados, plazas):
+    """
+    Núcleo de la adjudicación por rondas sobre arrays (sin DataFrames ni impresión).
+    Devuelve ({ronda: resultado}, con_plaza), donde cada resultado contiene la capacidad ofertada,
+    los participantes, los titulares por destino (ordenados por expediente) y las renuncias (s, d).
+    """
+    num_estudiantes = len(estudiante_ids)
+    # Prioridad: mayor expediente y, a igualdad, menor EstudianteID
+    claves = list(zip(expedientes.tolist(), (-estudiante_ids).tolist()))
+
+    excluido = estados == 'Excluido'
+    propenso_renuncia = estados == 'Renuncia'
+    llega_a_final = np.isin(estados, ['Aceptado', 'No asignado'])
+    con_plaza = np.zeros(num_estudiantes, dtype=bool)
+    renuncio = np.zeros(num_estudiantes, dtype=bool)
+    ocupadas = np.zeros(len(plazas), dtype=np.int64)
+
+    resultados = {}
+    for ronda in RONDAS:
+        participa = ~excluido & ~con_plaza & ~renuncio
+        if ronda == 'Adjudicación Final':
+            participa &= llega_a_final
+        participantes = np.flatnonzero(participa)
+        capacidad = (plazas - ocupadas).tolist()
+
+        heaps = _aceptacion_diferida(participantes, preferencias_pos, claves, capacidad)
+
+        titulares = {}
+        for d, heap in heaps.items():
+            titulares[d] = [s for _, s in sorted(heap, reverse=True)]
+            con_plaza[titulares[d]] = True
+            ocupadas[d] += len(heap)
+
+        # Renuncias: liberan la plaza para las rondas siguientes
+        renuncias = []
+        prob_renuncia = PROB_RENUNCIA_POR_RONDA[ronda]
+        if prob_renuncia > 0:
+            for d, lista in titulares.items():
+                for s in lista:
+                    if propenso_renuncia[s] and random.random() < prob_renuncia:
+                        renuncias.append((s, d))
+                        ocupadas[d] -= 1
+                        con_plaza[s] = False
+                        renuncio[s] = True
+
+        resultados[ronda] = {
+            'capacidad': capacidad,
+            'participantes': participantes,
+            'titulares': titulares,
+            'renuncias': renuncias
+        }
+
+    return resultados, con_plaza
+
+def simular_adjudicacion_aceptacion_diferida(estudiantes_df, destinos_df, preferencias=None,
+                                             num_preferencias=NUM_PREFERENCIAS):
+    """
+    Simula las cuatro RONDAS mediante aceptación diferida con listas de preferencias.
+    En cada ronda participan los estudiantes sin plaza (ni renuncia previa) y se reparten las plazas
+    que siguen libres; tras cada ronda los estudiantes propensos a renunciar liberan su plaza.
+    Devuelve la misma estructura gestion_plazas que simular_adjudicacion_con_plazas, de modo que
+    el histórico y el reporte se generan igual.
+    """
+    print("🎯 Simulando adjudicación por aceptación diferida con preferencias...")
+
+    if preferencias is None:
+        preferencias = generar_preferencias(estudiantes_df, destinos_df, num_preferencias)
+
+    estudiante_ids = estudiantes_df['EstudianteID'].to_numpy(dtype=np.int64)
+    destino_ids = destinos_df['DestinoID'].to_numpy(dtype=np.int64)
+    expedientes = estudiantes_df['Expediente'].to_numpy(dtype=float)
+    num_estudiantes = len(estudiante_ids)
+
+    preferencias_pos = preparar_preferencias(estudiantes_df, destinos_df, preferencias)
+    resultados, _ = ejecutar_rondas(
+        preferencias_pos, expedientes, estudiante_ids,
+        estudiantes_df['EstadoFinal'].to_numpy(), destinos_df['NúmeroPlazas'].to_numpy(dtype=np.int64)
+    )
+
+    gestion_plazas = gestionar_plazas_por_destino_y_ronda()
+    for clave in ('plazas_disponibles', 'asignaciones_titulares', 'asignaciones_suplentes', 'renuncias'):
+        gestion_plazas[clave] = {int(d): {ronda: ([] if clave != 'plazas_disponibles' else 0) for ronda in RONDAS} for d in destino_ids}
+
+    primera_preferencia = np.where(
+        (preferencias_pos >= 0).any(axis=1),
+        preferencias_pos[np.arange(num_estudiantes), np.argmax(preferencias_pos >= 0, axis=1)],
+        -1
+    )
+
+    for ronda in RONDAS:
+        print(f"   📋 Procesando {ronda}...")
+        resultado = resultados[ronda]
+
+        for pos, destino_id in enumerate(destino_ids.tolist()):
+            gestion_plazas['plazas_disponibles'][destino_id][ronda] = resultado['capacidad'][pos]
+
+        # Titulares de la ronda, en orden de expediente
+        titular_en_ronda = np.zeros(num_estudiantes, dtype=bool)
+        for d, lista in resultado['titulares'].items():
+            destino_id = int(destino_ids[d])
+            for s in lista:
+                estudiante_id = int(estudiante_ids[s])
+                gestion_plazas['asignaciones_titulares'][destino_id][ronda].append(estudiante_id)
+                registrar_asignacion(gestion_plazas, estudiante_id, ronda, destino_id, 'Titular')
+            titular_en_ronda[lista] = True
+
+        # Suplentes: participantes sin plaza, en la lista de su primera preferencia válida
+        participantes = resultado['participantes']
+        sin_plaza = participantes[~titular_en_ronda[participantes] & (primera_preferencia[participantes] >= 0)]
+        sin_plaza = sin_plaza[np.lexsort((estudiante_ids[sin_plaza], -expedientes[sin_plaza]))]
+        for s in sin_plaza.tolist():
+            destino_id = int(destino_ids[primera_preferencia[s]])
+            estudiante_id = int(estudiante_ids[s])
+            gestion_plazas['asignaciones_suplentes'][destino_id][ronda].append(estudiante_id)
+            registrar_asignacion(gestion_plazas, estudiante_id, ronda, destino_id, 'Suplente')
+
+        for s, d in resultado['renuncias']:
+            destino_id = int(destino_ids[d])
+            estudiante_id = int(estudiante_ids[s])
+            gestion_plazas['renuncias'][destino_id][ronda].append(estudiante_id)
+            registrar_renuncia(gestion_plazas, estudiante_id, ronda, destino_id)
+
+    return gestion_plazas
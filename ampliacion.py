@@ -0,0 +1,262 @@
+import glob
+import json
+import os
+import random
+import re
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+import generate_data as gd
+from base_datos import MOTORES_BD, NOMBRE_BD, leer_tabla_bd, tablas_bd
+from cohortes import COLUMNAS_ID_SECUENCIALES, TABLAS_CON_ESTUDIANTE
+from esquema import aplicar_esquema
+from eventlog_binario import EXTENSION_BINARIA, leer_eventlog_binario
+from instrumentacion import anotar_informe, ejecutar_etapa, guardar_informe, iniciar_ejecucion
+
+# ---- Ampliación de un dataset existente ----
+# Se generan solo los estudiantes nuevos (con sus eventos, alegaciones e histórico) sobre las plazas que
+# quedan libres y se añaden a las tablas ya escritas, continuando los IDs. El estado guardado junto al
+# dataset (gd.NOMBRE_ESTADO) evita releer el EventLog; sin él se reconstruye leyendo solo las columnas de ID.
+NOMBRE_INFORME_AMPLIACION = "informe_ampliacion.json"
+TABLAS_NUEVAS = ("Estudiantes", "EventLog", "Alegaciones", "HistoricoAdjudicaciones")
+PATRON_ESTUDIANTE = re.compile(r"^Estudiante (\d+):")
+
+def detectar_salida(ruta_data):
+    """Deduce formato, compresión y particiones de un dataset escrito sin fichero de estado."""
+    for formato, extension in MOTORES_BD.items():
+        if os.path.exists(os.path.join(ruta_data, f"{NOMBRE_BD}.{extension}")):
+            return {"formato": formato, "compresion": None, "particiones": {}}
+    particiones, ficheros = {}, []
+    for nombre in gd.TABLAS_DATASET.values():
+        directorio = os.path.join(ruta_data, nombre)
+        if os.path.isdir(directorio):
+            subdirectorios = sorted(d for d in os.listdir(directorio) if "=" in d)
+            if subdirectorios:
+                particiones[nombre] = subdirectorios[0].split("=", 1)[0]
+                ficheros += glob.glob(os.path.join(directorio, subdirectorios[0], "part-*"))
+        else:
+            ficheros += glob.glob(os.path.join(ruta_data, f"{nombre}.csv*")) + glob.glob(os.path.join(ruta_data, f"{nombre}.parquet"))
+    if not ficheros:
+        raise FileNotFoundError(f"No se encontró ningún dataset en {ruta_data}")
+    extension = os.path.basename(ficheros[0]).split(".", 1)[1]
+    compresion = next((c for c, sufijo in gd.COMPRESIONES_SALIDA.items() if sufijo and extension.endswith(sufijo)), None)
+    return {"formato": extension.split(".")[0], "compresion": compresion, "particiones": particiones}
+
+def _leer_fichero(ruta, formato, columnas=None):
+    if formato == "parquet":
+        return pd.read_parquet(ruta, columns=columnas)
+    return pd.read_csv(ruta, usecols=columnas)
+
+def leer_tabla(ruta_data, nombre, salida, columnas=None):
+    """Lee una tabla del dataset (o solo `columnas`) sea cual sea su formato, compresión o particionado."""
+    formato = salida["formato"]
+    if formato in MOTORES_BD:
+        ruta_bd = os.path.join(ruta_data, f"{NOMBRE_BD}.{MOTORES_BD[formato]}")
+        return leer_tabla_bd(ruta_bd, nombre, columnas, motor=formato)
+    extension = formato + (gd.COMPRESIONES_SALIDA[salida["compresion"]] if formato == "csv" else "")
+    columna = salida["particiones"].get(nombre)
+    if columna is None:
+        return _leer_fichero(os.path.join(ruta_data, f"{nombre}.{extension}"), formato, columnas)
+
+    partes = []
+    for ruta in sorted(glob.glob(os.path.join(ruta_data, nombre, f"{columna}=*", f"part-*.{extension}"))):
+        parte = _leer_fichero(ruta, formato, [c for c in columnas if c != columna] if columnas else None)
+        if columnas is None or columna in columnas:
+            valor = unquote(os.path.basename(os.path.dirname(ruta)).split("=", 1)[1])
+            parte[columna] = None if valor == gd.PARTICION_NULA else valor
+        partes.append(parte)
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=columnas)
+
+def existe_tabla(ruta_data, nombre, salida):
+    """Indica si el dataset tiene la tabla `nombre` sin particionar (los datasets antiguos no tienen ResumenRutas)."""
+    formato = salida["formato"]
+    if formato in MOTORES_BD:
+        return nombre in tablas_bd(os.path.join(ruta_data, f"{NOMBRE_BD}.{MOTORES_BD[formato]}"), motor=formato)
+    extension = formato + (gd.COMPRESIONES_SALIDA[salida["compresion"]] if formato == "csv" else "")
+    return os.path.exists(os.path.join(ruta_data, f"{nombre}.{extension}"))
+
+def ruta_eventlog_binario(ruta_data):
+    """
+    Ruta de EventLog.evlog si existe y coincide con la tabla: con fichero de estado, su número de eventos
+    debe ser el registrado para EventLog. Si falta o está desactualizado devuelve None y se lee la tabla.
+    """
+    ruta = os.path.join(ruta_data, f"EventLog.{EXTENSION_BINARIA}")
+    if not os.path.exists(ruta):
+        return None
+    ruta_estado = os.path.join(ruta_data, gd.NOMBRE_ESTADO)
+    if os.path.exists(ruta_estado):
+        with open(ruta_estado, encoding="utf-8") as f:
+            esperados = json.load(f).get("filas", {}).get("EventLog")
+        eventos = leer_eventlog_binario(ruta)["eventos"]
+        if esperados is not None and eventos != esperados:
+            print(f"⚠️ {ruta} tiene {eventos} eventos y la tabla EventLog {esperados}: está desactualizado y se ignora.")
+            return None
+    return ruta
+
+def reconstruir_estado(ruta_data):
+    """Estado de un dataset sin fichero de estado: lee solo las columnas de ID y las plazas ocupadas."""
+    print(f"⚠️ {ruta_data} no tiene {gd.NOMBRE_ESTADO}; se reconstruye leyendo las columnas de ID.")
+    salida = detectar_salida(ruta_data)
+    estudiantes = leer_tabla(ruta_data, "Estudiantes", salida, ["EstudianteID", "DestinoAsignado", "EstadoFinal"])
+    aceptados = estudiantes.loc[estudiantes["EstadoFinal"] == "Aceptado", "DestinoAsignado"].dropna()
+    ids, filas = {}, {}
+    for clave, columna in gd.COLUMNAS_ID_DATASET.items():
+        nombre = gd.TABLAS_DATASET[clave]
+        valores = estudiantes[columna] if clave == "estudiantes" else leer_tabla(ruta_data, nombre, salida, [columna])[columna]
+        ids[columna] = int(valores.max()) if len(valores) else 0
+        filas[nombre] = len(valores)
+    return {
+        **salida,
+        "anio_curso": gd.ANIO_CURSO_BASE,
+        "modo_adjudicacion": None,  # Desconocido: se usa --mode o MODO_ADJUDICACION
+        "ids": ids,
+        "plazas_ocupadas": {str(int(d)): int(n) for d, n in aceptados.value_counts().sort_index().items()},
+        "filas": filas,
+    }
+
+def cargar_estado(ruta_data):
+    ruta = os.path.join(ruta_data, gd.NOMBRE_ESTADO)
+    if not os.path.exists(ruta):
+        return reconstruir_estado(ruta_data)
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+def plazas_libres(destinos_df, plazas_ocupadas):
+    """Catálogo con NúmeroPlazas reducido a las plazas que no ocupan los aceptados existentes."""
+    ocupadas = destinos_df["DestinoID"].astype(str).map(plazas_ocupadas).fillna(0).to_numpy(dtype=np.int64)
+    libres = np.maximum(0, destinos_df["NúmeroPlazas"].to_numpy(dtype=np.int64) - ocupadas)
+    return destinos_df.assign(**{"NúmeroPlazas": libres})
+
+def combinar_reportes(reporte_previo, reporte_nuevo):
+    """
+    Suma los contadores del reporte de gestión de plazas por (DestinoID, Ronda) y recalcula las tasas
+    sobre las plazas totales originales (misma regla que generar_reporte_gestion_plazas).
+    """
+    contadores = ["NumTitulares", "NumSuplentes", "NumRenuncias", "TotalCandidatos"]
+    claves = ["DestinoID", "Ronda"]
+    nuevos = reporte_nuevo[claves + contadores].astype({"Ronda": str})
+    reporte = reporte_previo.astype({"Ronda": str}).merge(nuevos, on=claves, how="left", suffixes=("", "_nuevo"))
+    for columna in contadores:
+        reporte[columna] = reporte[columna] + reporte.pop(f"{columna}_nuevo").fillna(0).astype(np.int64)
+
+    plazas = reporte["PlazasTotales"].to_numpy(dtype=float)
+    titulares, candidatos = reporte["NumTitulares"].to_numpy(), reporte["TotalCandidatos"].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        reporte["TasaOcupacion"] = np.where(plazas > 0, np.round(titulares / plazas * 100, 2), 0)
+        reporte["TasaRenuncia"] = np.where(titulares > 0, np.round(reporte["NumRenuncias"] / titulares * 100, 2), 0)
+    reporte["Competitividad"] = np.select([candidatos > plazas * 2, candidatos > plazas], ["Alta", "Media"], default="Baja")
+    return aplicar_esquema(reporte, "ReporteGestionPlazas")
+
+def combinar_resumen_rutas(resumen_previo, resumen_nuevo):
+    """
+    Une dos tablas de resumir_rutas por Secuencia: suma los casos, pondera la duración media y
+    renumera las variantes por frecuencia (a igualdad, primero las del dataset previo).
+    """
+    tabla = pd.concat([resumen_previo, resumen_nuevo], ignore_index=True)
+    tabla["DiasTotales"] = tabla["Casos"] * tabla["DuracionMediaDias"]
+    tabla = tabla.groupby("Secuencia", sort=False).agg(
+        Casos=("Casos", "sum"), Longitud=("Longitud", "first"), CasosBucleLA=("CasosBucleLA", "sum"),
+        RechazosLA=("RechazosLA", "first"), DiasTotales=("DiasTotales", "sum"),
+        DuracionMinDias=("DuracionMinDias", "min"), DuracionMaxDias=("DuracionMaxDias", "max"),
+    ).reset_index()
+    tabla["DuracionMediaDias"] = (tabla.pop("DiasTotales") / tabla["Casos"]).round(2)
+    tabla["Porcentaje"] = (tabla["Casos"] / tabla["Casos"].sum() * 100).round(2)
+    tabla = tabla.sort_values("Casos", ascending=False, kind="stable", ignore_index=True)
+    tabla["VarianteID"] = range(1, len(tabla) + 1)
+    return tabla[gd.COLUMNAS_RESUMEN_RUTAS]
+
+def desplazar_ids(dataset, ids):
+    """Continúa los IDs del dataset existente (mismos desplazamientos que las cohortes)."""
+    for clave in TABLAS_CON_ESTUDIANTE:
+        dataset[clave]["EstudianteID"] += ids["EstudianteID"]
+    for clave, columna in COLUMNAS_ID_SECUENCIALES.items():
+        dataset[clave][columna] += ids[columna]
+    # Las validaciones se hicieron con los IDs locales de la ampliación
+    dataset["inconsistencias"] = [
+        PATRON_ESTUDIANTE.sub(lambda m: f"Estudiante {int(m.group(1)) + ids['EstudianteID']}:", inc)
+        for inc in dataset["inconsistencias"]
+    ]
+    return dataset
+
+def ampliar_dataset(ruta_data=None, num_estudiantes=1000, semilla=None, num_workers=1, use_llm=None, modo_adjudicacion=None):
+    """
+    Añade `num_estudiantes` estudiantes nuevos, con sus eventos, alegaciones e histórico, a un dataset
+    ya generado en `ruta_data`. Solo se leen el catálogo de destinos, el reporte de plazas y el estado
+    del dataset, así que el coste depende de los casos nuevos y no del tamaño del dataset. Las plazas
+    ocupadas por los aceptados existentes no se vuelven a adjudicar. Se usa el modo de adjudicación
+    guardado en el estado del dataset salvo que se indique `modo_adjudicacion`, y nunca se recalibran
+    las plazas (son las libres, no el catálogo). use_llm solo se aplica durante la ampliación.
+    Devuelve el dataset de la ampliación.
+    """
+    ruta_data = gd.RUTA_DATA if ruta_data is None else ruta_data
+    with gd.configuracion_temporal(USE_LLM=use_llm):
+        return _ampliar_dataset(ruta_data, num_estudiantes, semilla, num_workers, modo_adjudicacion)
+
+def _ampliar_dataset(ruta_data, num_estudiantes, semilla, num_workers, modo_adjudicacion):
+    if semilla is not None:
+        random.seed(semilla)
+        np.random.seed(semilla)
+
+    print(f"➕ Ampliando el dataset de {ruta_data} con {num_estudiantes} estudiantes...")
+    iniciar_ejecucion({"ruta_data": ruta_data, "num_estudiantes": num_estudiantes, "semilla": semilla,
+                       "use_llm": gd.USE_LLM, "modo_adjudicacion": modo_adjudicacion})
+    estado = ejecutar_etapa("estado_previo", cargar_estado, ruta_data)
+    salida = {clave: estado[clave] for clave in ("formato", "compresion", "particiones")}
+    modo_previo = estado.get("modo_adjudicacion")
+    if modo_adjudicacion is None:
+        modo_adjudicacion = modo_previo or gd.MODO_ADJUDICACION
+    elif modo_previo and modo_adjudicacion != modo_previo:
+        print(f"⚠️ El dataset se generó en modo {modo_previo}; la ampliación usa el modo {modo_adjudicacion}.")
+    anotar_informe("modo_adjudicacion", modo_adjudicacion)
+
+    destinos = ejecutar_etapa("lectura_destinos", leer_tabla, ruta_data, "Destinos", salida)
+    destinos["FechaCancelación"] = destinos["FechaCancelación"].fillna("").astype(str)
+    libres = plazas_libres(destinos, estado["plazas_ocupadas"])
+    print(f"   📋 Último EstudianteID: {estado['ids']['EstudianteID']}, plazas libres: {int(libres['NúmeroPlazas'].sum())}")
+
+    with gd.aplicar_curso(estado["anio_curso"]), gd.configuracion_temporal(
+            MODO_ADJUDICACION=modo_adjudicacion, CALIBRAR_PLAZAS=False):
+        dataset = desplazar_ids(gd.generar_dataset(num_estudiantes, destinos=libres), estado["ids"])
+    reporte = combinar_reportes(leer_tabla(ruta_data, "ReporteGestionPlazas", salida), dataset["reporte_plazas"])
+
+    tablas = {nombre: tabla for nombre, tabla in gd.tablas_de_dataset(dataset, salida["particiones"]).items()
+              if nombre in TABLAS_NUEVAS}
+    tablas["ReporteGestionPlazas"] = reporte
+    if existe_tabla(ruta_data, gd.NOMBRE_RESUMEN_RUTAS, salida):
+        resumen_previo = leer_tabla(ruta_data, gd.NOMBRE_RESUMEN_RUTAS, salida)
+        tablas[gd.NOMBRE_RESUMEN_RUTAS] = combinar_resumen_rutas(resumen_previo, dataset["resumen_rutas"])
+    ejecutar_etapa("escritura", gd.anexar_tablas, tablas, ruta_data, num_workers=num_workers,
+                   reemplazar=("ReporteGestionPlazas", gd.NOMBRE_RESUMEN_RUTAS), **salida)
+
+    ruta_binaria = os.path.join(ruta_data, f"EventLog.{EXTENSION_BINARIA}")
+    if os.path.exists(ruta_binaria):
+        os.remove(ruta_binaria)  # Su formato no admite añadir eventos: quedaría desactualizado
+        print(f"⚠️ Se eliminó {ruta_binaria}; vuelve a generarlo con --binary-eventlog si lo necesitas.")
+    if dataset["inconsistencias"]:
+        with open(os.path.join(ruta_data, "reporte_inconsistencias.txt"), "a", encoding="utf-8") as f:
+            f.write(f"\nAMPLIACIÓN ({num_estudiantes} estudiantes desde el {estado['ids']['EstudianteID'] + 1})\n")
+            for inc in dataset["inconsistencias"]:
+                f.write(f"- {inc}\n")
+
+    nuevo_estado = gd.estado_dataset(dataset, **salida)
+    nuevo_estado["modo_adjudicacion"] = modo_previo or modo_adjudicacion  # El modo del dataset original
+    nuevo_estado["anio_curso"] = estado["anio_curso"]
+    for columna, ultimo in nuevo_estado["ids"].items():
+        nuevo_estado["ids"][columna] = max(ultimo, estado["ids"][columna])
+    for destino, ocupadas in estado["plazas_ocupadas"].items():
+        nuevo_estado["plazas_ocupadas"][destino] = nuevo_estado["plazas_ocupadas"].get(destino, 0) + ocupadas
+    nuevo_estado["plazas_ocupadas"] = dict(sorted(nuevo_estado["plazas_ocupadas"].items(), key=lambda item: int(item[0])))
+    nuevo_estado["filas"] = {
+        nombre: filas + (nuevo_estado["filas"].get(nombre, 0) if nombre in TABLAS_NUEVAS else 0)
+        for nombre, filas in estado["filas"].items()
+    }
+    gd.guardar_estado_dataset(ruta_data, nuevo_estado)
+    anotar_informe("estado_dataset", nuevo_estado["filas"])
+    ruta_informe = guardar_informe(ruta_data, NOMBRE_INFORME_AMPLIACION)
+
+    print(f"✅ Ampliación completada: {len(dataset['estudiantes'])} estudiantes y {len(dataset['eventlog'])} eventos nuevos "
+          f"(EstudianteID {estado['ids']['EstudianteID'] + 1}-{nuevo_estado['ids']['EstudianteID']}).")
+    print(f"⏱️ Informe de la ampliación guardado en {ruta_informe}")
+    return dataset
@@ -0,0 +1,236 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from eventlog_binario import leer_eventlog_binario
+
+# ---- Analítica de proceso sobre los arrays del EventLog ----
+# Todo se calcula con operaciones vectorizadas sobre el EventLog ordenado por caso: los límites de cada
+# caso se obtienen una vez y las métricas por caso son reducciones segmentadas (reduceat/bincount), el
+# grafo de sucesión directa compara el array de actividades con su desplazamiento y cada variante se
+# identifica por un hash polinómico de su secuencia. No hay bucles de Python por evento ni por caso.
+INICIO_FIN = 0  # En el grafo de sucesión directa, origen de la primera actividad y destino de la última
+ACTIVIDADES_RETRABAJO_LA = {26: "RechazosResponsable", 30: "RechazosSubdirectora"}
+# Ronda: (publicación, aceptación/reserva, renuncia)
+RONDAS_ADJUDICACION = {
+    "1ª Adjudicación": (10, 11, 12),
+    "2ª Adjudicación": (14, 15, 16),
+    "3ª Adjudicación": (18, 19, 20),
+}
+ACTIVIDADES_CIERRE = {"Formalizados": 31, "Finalizados": 32, "Cancelados": 33}
+BASE_HASH = np.uint64(1_000_003)  # Base del hash de variantes (la aritmética uint64 es módulo 2**64)
+MEZCLA_LONGITUD = np.uint64(0x9E3779B97F4A7C15)
+VARIANTES_RESUMEN = 10
+SEGUNDOS_DIA = 86_400
+# Nombre del CSV de cada tabla al guardarlas con analizar_dataset
+NOMBRES_TABLAS_ANALITICA = {
+    "variantes": "Variantes", "grafo": "GrafoSucesionDirecta", "casos": "TiemposCaso", "embudo": "EmbudoRenuncias",
+}
+
+def arrays_eventlog(fuente):
+    """
+    Extrae EstudianteID, ActividadID, Timestamp (segundos desde epoch) y EventID de un DataFrame, de un
+    .evlog abierto con leer_eventlog_binario o de su ruta. Del .evlog se usan sus columnas sin parsear nada.
+    """
+    if isinstance(fuente, (str, os.PathLike)):
+        fuente = leer_eventlog_binario(fuente)
+    if isinstance(fuente, dict):
+        return {
+            "casos": np.asarray(fuente["EstudianteID"], dtype=np.int64),
+            "actividades": np.asarray(fuente["ActividadID"], dtype=np.int64),
+            "segundos": np.asarray(fuente["Timestamp"], dtype=np.int64),
+            "eventos": np.asarray(fuente["EventID"], dtype=np.int64),
+        }
+    instantes = pd.to_datetime(fuente["Timestamp"], format="%Y-%m-%d %H:%M:%S")
+    return {
+        "casos": fuente["EstudianteID"].to_numpy(dtype=np.int64),
+        "actividades": fuente["ActividadID"].to_numpy(dtype=np.int64),
+        "segundos": instantes.to_numpy().astype("datetime64[s]").view(np.int64),
+        "eventos": fuente["EventID"].to_numpy(dtype=np.int64),
+    }
+
+def segmentar_casos(arrays):
+    """
+    Ordena los eventos por (caso, Timestamp, EventID) y calcula los límites de cada caso. El EventLog
+    generado ya viene agrupado y ordenado, así que normalmente solo se comprueba y no se reordena.
+    """
+    casos, segundos, eventos = arrays["casos"], arrays["segundos"], arrays["eventos"]
+    mismo_caso = casos[1:] == casos[:-1]
+    ordenado = bool(np.all(casos[1:] >= casos[:-1])) and bool(np.all(
+        ~mismo_caso | (segundos[1:] > segundos[:-1]) | ((segundos[1:] == segundos[:-1]) & (eventos[1:] > eventos[:-1]))
+    ))
+    if not ordenado:
+        orden = np.lexsort((eventos, segundos, casos))
+        arrays = {clave: valores[orden] for clave, valores in arrays.items()}
+        mismo_caso = arrays["casos"][1:] == arrays["casos"][:-1]
+
+    inicios = np.flatnonzero(np.r_[True, ~mismo_caso]) if len(arrays["casos"]) else np.array([], dtype=np.int64)
+    longitudes = np.diff(np.r_[inicios, len(arrays["casos"])])
+    return {
+        **arrays,
+        "inicios": inicios,
+        "longitudes": longitudes,
+        "indice_caso": np.repeat(np.arange(len(inicios)), longitudes),
+        "posiciones": np.arange(len(arrays["casos"])) - np.repeat(inicios, longitudes),
+    }
+
+def variantes(log):
+    """
+    Agrupa los casos por su secuencia de actividades. El hash de cada caso es sum(act_i * BASE**i) en
+    uint64 (una suma segmentada) mezclado con la longitud. Devuelve (DataFrame de variantes ordenado por
+    frecuencia, VarianteID de cada caso).
+    """
+    if not len(log["inicios"]):
+        return pd.DataFrame(columns=["VarianteID", "Casos", "Porcentaje", "Longitud", "Secuencia"]), np.array([], dtype=np.int64)
+    potencias = np.cumprod(np.r_[np.uint64(1), np.full(int(log["longitudes"].max()) - 1, BASE_HASH, dtype=np.uint64)])
+    terminos = (log["actividades"].astype(np.uint64) + np.uint64(1)) * potencias[log["posiciones"]]
+    hashes = np.add.reduceat(terminos, log["inicios"]) ^ (log["longitudes"].astype(np.uint64) * MEZCLA_LONGITUD)
+
+    _, primeros, inversa, conteos = np.unique(hashes, return_index=True, return_inverse=True, return_counts=True)
+    orden = np.lexsort((primeros, -conteos))  # Más frecuentes primero; a igualdad, por primera aparición
+    rango = np.empty_like(orden)
+    rango[orden] = np.arange(len(orden))
+
+    representantes = primeros[orden]
+    secuencias = [
+        ">".join(map(str, log["actividades"][inicio:inicio + longitud]))
+        for inicio, longitud in zip(log["inicios"][representantes], log["longitudes"][representantes])
+    ]
+    tabla = pd.DataFrame({
+        "VarianteID": np.arange(1, len(orden) + 1),
+        "Casos": conteos[orden],
+        "Porcentaje": np.round(conteos[orden] / len(hashes) * 100, 2),
+        "Longitud": log["longitudes"][representantes],
+        "Secuencia": secuencias,
+    })
+    return tabla, rango[inversa.ravel()] + 1
+
+def grafo_directo(log):
+    """
+    Grafo de sucesión directa (DFG): frecuencia y tiempo medio (horas) de cada par de actividades
+    consecutivas de un mismo caso, más las aristas desde/hacia INICIO_FIN para el inicio y el fin.
+    """
+    actividades, segundos = log["actividades"], log["segundos"]
+    tamano = int(actividades.max()) + 1 if len(actividades) else 1
+    continua = log["posiciones"][1:] > 0
+    origen = np.r_[np.full(len(log["inicios"]), INICIO_FIN), actividades[:-1][continua], actividades[log["inicios"] + log["longitudes"] - 1]]
+    destino = np.r_[actividades[log["inicios"]], actividades[1:][continua], np.full(len(log["inicios"]), INICIO_FIN)]
+    esperas = np.r_[np.zeros(len(log["inicios"])), (segundos[1:] - segundos[:-1])[continua], np.zeros(len(log["inicios"]))]
+
+    codigos = origen * tamano + destino
+    frecuencias = np.bincount(codigos, minlength=tamano * tamano)
+    horas = np.bincount(codigos, weights=esperas, minlength=tamano * tamano) / 3600
+    presentes = np.flatnonzero(frecuencias)
+    return pd.DataFrame({
+        "Origen": presentes // tamano,
+        "Destino": presentes % tamano,
+        "Frecuencia": frecuencias[presentes],
+        "HorasMedias": np.round(horas[presentes] / frecuencias[presentes], 2),
+    }).sort_values(["Frecuencia", "Origen", "Destino"], ascending=[False, True, True], ignore_index=True)
+
+def _conteo_por_caso(log, actividad):
+    """Veces que aparece `actividad` en cada caso (bincount sobre el índice de caso de sus eventos)."""
+    return np.bincount(log["indice_caso"][log["actividades"] == actividad], minlength=len(log["inicios"]))
+
+def casos(log, variante_por_caso=None):
+    """
+    Una fila por caso con sus eventos, inicio, fin y duración (reducciones segmentadas sobre los límites
+    de caso), los rechazos del Learning Agreement (retrabajo 26/30) y, si se pasa, su variante.
+    """
+    inicios = log["inicios"]
+    tabla = pd.DataFrame({"EstudianteID": log["casos"][inicios], "Eventos": log["longitudes"]})
+    if len(inicios):
+        primero = np.minimum.reduceat(log["segundos"], inicios)
+        ultimo = np.maximum.reduceat(log["segundos"], inicios)
+    else:
+        primero = ultimo = np.array([], dtype=np.int64)
+    tabla["Inicio"] = primero.astype("datetime64[s]")
+    tabla["Fin"] = ultimo.astype("datetime64[s]")
+    tabla["DuracionDias"] = np.round((ultimo - primero) / SEGUNDOS_DIA, 2)
+    for actividad, columna in ACTIVIDADES_RETRABAJO_LA.items():
+        tabla[columna] = _conteo_por_caso(log, actividad)
+    if variante_por_caso is not None:
+        tabla["VarianteID"] = variante_por_caso
+    return tabla
+
+def embudo_renuncias(log):
+    """Casos con publicación, aceptación/reserva y renuncia en cada ronda de adjudicación."""
+    filas = []
+    for ronda, (publicacion, aceptacion, renuncia) in RONDAS_ADJUDICACION.items():
+        publicados = int((_conteo_por_caso(log, publicacion) > 0).sum())
+        aceptados = int((_conteo_por_caso(log, aceptacion) > 0).sum())
+        renuncias = int((_conteo_por_caso(log, renuncia) > 0).sum())
+        filas.append({
+            "Ronda": ronda, "Publicados": publicados, "Aceptados": aceptados, "Renuncias": renuncias,
+            "TasaRenuncia": round(renuncias / publicados * 100, 2) if publicados else 0.0,
+        })
+    return pd.DataFrame(filas)
+
+def analizar_eventlog(fuente):
+    """
+    Calcula todas las tablas de analítica de un EventLog (DataFrame, .evlog o su ruta). Devuelve
+    {"variantes", "grafo", "casos", "embudo", "resumen"}; el resumen es un dict serializable a JSON.
+    """
+    log = segmentar_casos(arrays_eventlog(fuente))
+    tabla_variantes, variante_por_caso = variantes(log)
+    tabla_casos = casos(log, variante_por_caso)
+    embudo = embudo_renuncias(log)
+
+    duracion = tabla_casos["DuracionDias"]
+    retrabajo = tabla_casos[list(ACTIVIDADES_RETRABAJO_LA.values())].sum(axis=1)
+    total_casos = len(tabla_casos)
+    resumen = {
+        "eventos": int(len(log["casos"])),
+        "casos": total_casos,
+        "variantes": int(len(tabla_variantes)),
+        "cobertura_top_variantes": round(float(tabla_variantes["Porcentaje"].head(VARIANTES_RESUMEN).sum()), 2),
+        "eventos_por_caso": round(float(log["longitudes"].mean()), 2) if total_casos else 0.0,
+        "duracion_dias": {
+            "media": round(float(duracion.mean()), 2) if total_casos else 0.0,
+            "mediana": round(float(duracion.median()), 2) if total_casos else 0.0,
+            "p90": round(float(duracion.quantile(0.9)), 2) if total_casos else 0.0,
+        },
+        "retrabajo_la": {
+            "casos": int((retrabajo > 0).sum()),
+            **{columna: int(tabla_casos[columna].sum()) for columna in ACTIVIDADES_RETRABAJO_LA.values()},
+        },
+        "cierres": {nombre: int((_conteo_por_caso(log, actividad) > 0).sum()) for nombre, actividad in ACTIVIDADES_CIERRE.items()},
+        "embudo": embudo.set_index("Ronda").to_dict("index"),
+    }
+    return {"variantes": tabla_variantes, "grafo": grafo_directo(log), "casos": tabla_casos, "embudo": embudo, "resumen": resumen}
+
+def imprimir_resumen(resumen):
+    """Muestra el resumen de analizar_eventlog."""
+    casos_totales = resumen["casos"] or 1
+    print("📊 Estadísticas del proceso:")
+    print(f"   • Casos: {resumen['casos']} ({resumen['eventos']} eventos, {resumen['eventos_por_caso']} por caso)")
+    print(f"   • Variantes: {resumen['variantes']} (las {VARIANTES_RESUMEN} más frecuentes cubren el {resumen['cobertura_top_variantes']}% de los casos)")
+    duracion = resumen["duracion_dias"]
+    print(f"   • Duración por caso: media {duracion['media']} días, mediana {duracion['mediana']}, p90 {duracion['p90']}")
+    retrabajo = resumen["retrabajo_la"]
+    print(f"   • Retrabajo LA: {retrabajo['casos']} casos ({retrabajo['casos'] / casos_totales * 100:.1f}%), "
+          + ", ".join(f"{columna} {retrabajo[columna]}" for columna in ACTIVIDADES_RETRABAJO_LA.values()))
+    for ronda, fila in resumen["embudo"].items():
+        print(f"   • {ronda}: {fila['Publicados']} publicados -> {fila['Aceptados']} aceptan, "
+              f"{fila['Renuncias']} renuncian ({fila['TasaRenuncia']}%)")
+    print("   • Cierre: " + ", ".join(f"{nombre} {valor}" for nombre, valor in resumen["cierres"].items()))
+
+def analizar_dataset(ruta_data, ruta_salida=None):
+    """
+    Analiza el EventLog de un dataset ya escrito: usa EventLog.evlog si existe y está al día y, si no, lee
+    solo las columnas necesarias de la tabla (en cualquier formato). Con `ruta_salida` guarda las tablas en CSV.
+    """
+    from ampliacion import detectar_salida, leer_tabla, ruta_eventlog_binario
+    fuente = ruta_eventlog_binario(ruta_data)
+    if fuente is None:
+        fuente = leer_tabla(ruta_data, "EventLog", detectar_salida(ruta_data),
+                            ["EventID", "EstudianteID", "ActividadID", "Timestamp"])
+    analitica = analizar_eventlog(fuente)
+    imprimir_resumen(analitica["resumen"])
+    if ruta_salida:
+        os.makedirs(ruta_salida, exist_ok=True)
+        for clave, nombre in NOMBRES_TABLAS_ANALITICA.items():
+            analitica[clave].to_csv(os.path.join(ruta_salida, f"{nombre}.csv"), index=False)
+        print(f"💾 Tablas de analítica guardadas en {ruta_salida}")
+    return analitica
@@ -0,0 +1,139 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import generate_data as gd
+
+# ---- Configuración del barrido ----
+NUM_REPLICAS = 50
+NUM_WORKERS = os.cpu_count() or 1
+CUANTILES = (0.05, 0.5, 0.95)
+METRICAS = ["Ocupacion", "TasaRenuncia", "NoAsignados", "Aceptados"]
+
+# Datos de solo lectura compartidos por cada proceso del pool. Con fork los workers los heredan del proceso
+# principal sin copiarlos (copy-on-write); donde no hay fork se envían una vez por worker al inicializarlo
+_DESTINOS = None
+_ESTUDIANTES = None
+_MODO = "clasico"
+_PREFERENCIAS = None
+
+def _inicializar_worker(destinos_df, estudiantes_df, modo, preferencias=None):
+    """Inicializador del pool: fija los DataFrames base una única vez por proceso."""
+    global _DESTINOS, _ESTUDIANTES, _MODO, _PREFERENCIAS
+    _DESTINOS = destinos_df
+    _ESTUDIANTES = estudiantes_df
+    _MODO = modo
+    _PREFERENCIAS = preferencias
+
+def metricas_por_destino(destinos_df, estudiantes_df, gestion_plazas):
+    """
+    Resume una réplica en un array (métricas x destinos): ocupación final, tasa de renuncia (sobre los
+    estudiantes distintos que fueron titulares en alguna ronda), estudiantes no asignados que
+    solicitaron el destino y aceptados finales.
+    """
+    destino_ids = destinos_df['DestinoID'].to_numpy(dtype=np.int64)
+    plazas = destinos_df['NúmeroPlazas'].to_numpy(dtype=float)
+    posicion = {d: i for i, d in enumerate(destino_ids.tolist())}
+
+    titulares = np.zeros(len(destino_ids))
+    renuncias = np.zeros(len(destino_ids))
+    for destino_id, por_ronda in gestion_plazas['asignaciones_titulares'].items():
+        i = posicion[destino_id]
+        # En modo clásico un titular vuelve a figurar en las rondas siguientes: se cuenta una sola vez
+        titulares[i] = len(set().union(*por_ronda.values()))
+        renuncias[i] = sum(len(lista) for lista in gestion_plazas['renuncias'][destino_id].values())
+
+    estados = estudiantes_df['EstadoFinal'].to_numpy()
+    asignados = estudiantes_df['DestinoAsignado'].to_numpy(dtype=float)
+    aceptado = (estados == 'Aceptado') & ~np.isnan(asignados)
+    pos_asignado = np.searchsorted(destino_ids, asignados[aceptado].astype(np.int64))
+    aceptados = np.bincount(pos_asignado, minlength=len(destino_ids)).astype(float)
+
+    no_asignado = estados == 'No asignado'
+    pos_solicitado = np.searchsorted(destino_ids, estudiantes_df['DestinoSolicitado'].to_numpy(dtype=np.int64)[no_asignado])
+    no_asignados = np.bincount(pos_solicitado, minlength=len(destino_ids)).astype(float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ocupacion = np.where(plazas > 0, aceptados / plazas * 100, np.nan)
+        tasa_renuncia = np.where(titulares > 0, renuncias / titulares * 100, np.nan)
+
+    return np.vstack([ocupacion, tasa_renuncia, no_asignados, aceptados])
+
+def _ejecutar_replica(semilla):
+    """Ejecuta una réplica (adjudicación + ajuste + estados) y devuelve solo sus métricas."""
+    random.seed(semilla)
+    np.random.seed(semilla % (2**32))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if _MODO == "diferida":
+            from adjudicacion_diferida import simular_adjudicacion_aceptacion_diferida
+            gestion_plazas = simular_adjudicacion_aceptacion_diferida(_ESTUDIANTES, _DESTINOS, _PREFERENCIAS)
+        else:
+            gestion_plazas = gd.simular_adjudicacion_con_plazas(_ESTUDIANTES, _DESTINOS)
+        gestion_plazas = gd.ajustar_asignaciones_por_plazas(gestion_plazas, _DESTINOS, _ESTUDIANTES)
+        estudiantes = gd.actualizar_estados_desde_gestion_plazas(_ESTUDIANTES, gestion_plazas)
+
+    return metricas_por_destino(_DESTINOS, estudiantes, gestion_plazas)
+
+def ejecutar_barrido(destinos_df, estudiantes_df, num_replicas=NUM_REPLICAS, num_workers=NUM_WORKERS,
+                     semilla=0, modo="clasico", cuantiles=CUANTILES):
+    """
+    Ejecuta `num_replicas` adjudicaciones independientes sobre los mismos destinos y estudiantes en
+    un pool de procesos y agrega, por destino, la media y los cuantiles de cada métrica.
+    Solo se conserva el array de métricas de cada réplica, nunca los datasets completos, y los datos
+    base no se serializan hacia los workers si el sistema admite fork.
+    """
+    print(f"🎲 Ejecutando barrido Monte Carlo: {num_replicas} réplicas con {num_workers} procesos...")
+    semillas = [semilla + i for i in range(num_replicas)]
+
+    # Las preferencias son un dato del estudiante: se generan una vez y se comparten entre réplicas
+    preferencias = None
+    if modo == "diferida":
+        from adjudicacion_diferida import generar_preferencias
+        np.random.seed(semilla % (2**32))
+        preferencias = generar_preferencias(estudiantes_df, destinos_df)
+
+    _inicializar_worker(destinos_df, estudiantes_df, modo, preferencias)
+    try:
+        if num_workers <= 1:
+            resultados = [_ejecutar_replica(s) for s in semillas]
+        elif "fork" in multiprocessing.get_all_start_methods():
+            with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("fork")) as pool:
+                resultados = list(pool.map(_ejecutar_replica, semillas))
+        else:
+            with ProcessPoolExecutor(max_workers=num_workers, initializer=_inicializar_worker,
+                                     initargs=(destinos_df, estudiantes_df, modo, preferencias)) as pool:
+                resultados = list(pool.map(_ejecutar_replica, semillas))
+    finally:
+        _inicializar_worker(None, None, "clasico")  # No retener los datos base en el proceso principal
+
+    replicas = np.stack(resultados)  # (réplicas x métricas x destinos)
+    resumen = destinos_df[['DestinoID', 'NombreDestino', 'NúmeroPlazas']].reset_index(drop=True).copy()
+    resumen.insert(3, 'Replicas', num_replicas)
+    for m, metrica in enumerate(METRICAS):
+        valores = replicas[:, m, :]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # Destinos cancelados: todo NaN
+            resumen[f'{metrica}_Media'] = np.round(np.nanmean(valores, axis=0), 2)
+            for q in cuantiles:
+                resumen[f'{metrica}_P{int(round(q * 100))}'] = np.round(np.nanquantile(valores, q, axis=0), 2)
+
+    print(f"✅ Barrido completado: {len(resumen)} destinos resumidos.")
+    return resumen
+
+# ---- Ejecución principal ----
+if __name__ == "__main__":
+    random.seed(0)
+    np.random.seed(0)
+    destinos = gd.generar_destinos(gd.NUM_DESTINOS)
+    estudiantes = gd.generar_estudiantes(gd.NUM_ESTUDIANTES, destinos)
+    resumen = ejecutar_barrido(destinos, estudiantes, modo=gd.MODO_ADJUDICACION)
+    os.makedirs(gd.RUTA_DATA, exist_ok=True)
+    resumen.to_csv(f"{gd.RUTA_DATA}/ResumenMonteCarlo.csv", index=False)
+    print(f"💾 Resumen guardado en {gd.RUTA_DATA}/ResumenMonteCarlo.csv")
@@ -0,0 +1,250 @@
+import os
+import sqlite3
+
+import pandas as pd
+
+# ---- Configuración de la salida a base de datos ----
+MOTORES_BD = {"sqlite": "sqlite", "duckdb": "duckdb"}  # formato -> extensión del fichero
+NOMBRE_BD = "erasmus"
+TAMANO_LOTE_BD = 50_000  # Filas por executemany en SQLite
+
+# Clave primaria e índices de cada tabla. Las fechas se guardan como texto ISO ('AAAA-MM-DD[ HH:MM:SS]'),
+# que se ordena y compara igual en SQLite y DuckDB.
+ESQUEMA_BD = {
+    "Destinos": {"clave": ["DestinoID"], "indices": [["País"]]},
+    "Estudiantes": {"clave": ["EstudianteID"], "indices": [["DestinoSolicitado"], ["DestinoAsignado"], ["EstadoFinal"]]},
+    "Actividades": {"clave": ["ActividadID"], "indices": []},
+    "EventLog": {"clave": ["EventID"], "indices": [["EstudianteID", "Timestamp"], ["ActividadID"]]},
+    "Alegaciones": {"clave": ["AlegacionID"], "indices": [["EstudianteID"]]},
+    "HistoricoAdjudicaciones": {"clave": ["AsignacionID"], "indices": [["DestinoID", "Ronda"], ["EstudianteID"]]},
+    "ReporteGestionPlazas": {"clave": ["DestinoID", "Ronda"], "indices": []},
+    "ResumenRutas": {"clave": ["VarianteID"], "indices": []},
+}
+
+def _conectar(ruta_bd, motor):
+    if motor == "duckdb":
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("La salida DuckDB requiere el paquete duckdb (pip install duckdb)") from e
+        return duckdb.connect(ruta_bd)
+    return sqlite3.connect(ruta_bd, isolation_level=None)  # Transacciones explícitas con BEGIN/COMMIT
+
+def _tipo_sql(dtype, motor):
+    if pd.api.types.is_bool_dtype(dtype):
+        return "BOOLEAN"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "BIGINT" if motor == "duckdb" else "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "DOUBLE" if motor == "duckdb" else "REAL"
+    return "VARCHAR" if motor == "duckdb" else "TEXT"
+
+def _columnas(columnas):
+    return ", ".join(f'"{c}"' for c in columnas)
+
+def _crear_tabla(conexion, nombre, df, motor):
+    definiciones = [f'"{c}" {_tipo_sql(df[c].dtype, motor)}' for c in df.columns]
+    clave = [c for c in ESQUEMA_BD.get(nombre, {}).get("clave", []) if c in df.columns]
+    if "Curso" in df.columns and clave:
+        clave = ["Curso"] + clave  # Varias cohortes en una misma base de datos
+    if clave:
+        definiciones.append(f"PRIMARY KEY ({_columnas(clave)})")
+    conexion.execute(f'DROP TABLE IF EXISTS "{nombre}"')
+    conexion.execute(f'CREATE TABLE "{nombre}" ({", ".join(definiciones)})')
+
+def _cargar_sqlite(conexion, nombre, df):
+    """Inserta por lotes con executemany dentro de una única transacción."""
+    marcadores = ", ".join("?" for _ in df.columns)
+    sentencia = f'INSERT INTO "{nombre}" VALUES ({marcadores})'
+    for inicio in range(0, len(df), TAMANO_LOTE_BD):
+        lote = df.iloc[inicio:inicio + TAMANO_LOTE_BD].astype(object)
+        lote = lote.where(lote.notna(), None)  # NaN/NA -> NULL
+        conexion.executemany(sentencia, lote.itertuples(index=False, name=None))
+
+def _cargar_duckdb(conexion, nombre, df):
+    """DuckDB lee el DataFrame registrado de forma vectorizada (sin pasar fila a fila por Python)."""
+    conexion.register("_tabla_origen", df)
+    conexion.execute(f'INSERT INTO "{nombre}" SELECT {_columnas(df.columns)} FROM _tabla_origen')
+    conexion.unregister("_tabla_origen")
+
+def guardar_en_bd(tablas, ruta_data, motor="sqlite", nombre_bd=NOMBRE_BD):
+    """
+    Carga todas las tablas {nombre: DataFrame} en un único fichero SQLite o DuckDB en ruta_data, con
+    clave primaria por tabla. Los índices de ESQUEMA_BD se crean después de la carga masiva.
+    Devuelve la ruta de la base de datos.
+    """
+    if motor not in MOTORES_BD:
+        raise ValueError(f"Motor de base de datos no soportado: {motor} (opciones: {', '.join(MOTORES_BD)})")
+    os.makedirs(ruta_data, exist_ok=True)
+    ruta_bd = os.path.join(ruta_data, f"{nombre_bd}.{MOTORES_BD[motor]}")
+    for ruta in (ruta_bd, f"{ruta_bd}.wal"):
+        if os.path.exists(ruta):
+            os.remove(ruta)  # Cada ejecución genera la base de datos desde cero
+    conexion = _conectar(ruta_bd, motor)
+    try:
+        if motor == "sqlite":
+            conexion.execute("PRAGMA journal_mode = OFF")  # Carga masiva: el fichero se regenera si falla
+            conexion.execute("PRAGMA synchronous = OFF")
+        conexion.execute("BEGIN")
+        for nombre, df in tablas.items():
+            _crear_tabla(conexion, nombre, df, motor)
+            if motor == "sqlite":
+                _cargar_sqlite(conexion, nombre, df)
+            else:
+                _cargar_duckdb(conexion, nombre, df)
+            for i, columnas in enumerate(ESQUEMA_BD.get(nombre, {}).get("indices", [])):
+                if all(c in df.columns for c in columnas):
+                    conexion.execute(f'CREATE INDEX "idx_{nombre}_{i}" ON "{nombre}" ({_columnas(columnas)})')
+        conexion.execute("COMMIT")
+    finally:
+        conexion.close()
+    return ruta_bd
+
+def _columnas_tabla(conexion, nombre):
+    cursor = conexion.execute(f'SELECT * FROM "{nombre}" LIMIT 0')
+    return [d[0] for d in cursor.description]
+
+def anexar_en_bd(tablas, ruta_bd, motor="sqlite", reemplazar=()):
+    """
+    Inserta las filas de cada tabla {nombre: DataFrame} en una base de datos creada por guardar_en_bd,
+    en una única transacción (las claves primarias rechazan IDs repetidos). Las tablas de `reemplazar`
+    se vacían antes de insertar. Devuelve la ruta de la base de datos.
+    """
+    if not os.path.exists(ruta_bd):
+        raise FileNotFoundError(f"No existe la base de datos {ruta_bd}")
+    conexion = _conectar(ruta_bd, motor)
+    try:
+        conexion.execute("BEGIN")
+        for nombre, df in tablas.items():
+            columnas = _columnas_tabla(conexion, nombre)
+            if sorted(columnas) != sorted(df.columns):
+                raise ValueError(f"Las columnas nuevas de {nombre} no coinciden con las de la base de datos: {list(df.columns)} != {columnas}")
+            if nombre in reemplazar:
+                conexion.execute(f'DELETE FROM "{nombre}"')
+            if motor == "sqlite":
+                _cargar_sqlite(conexion, nombre, df[columnas])
+            else:
+                _cargar_duckdb(conexion, nombre, df[columnas])
+        conexion.execute("COMMIT")
+    except Exception:
+        conexion.execute("ROLLBACK")
+        raise
+    finally:
+        conexion.close()
+    return ruta_bd
+
+def leer_tabla_bd(ruta_bd, nombre, columnas=None, motor=None):
+    """Lee una tabla (o solo `columnas`) de la base de datos como DataFrame."""
+    motor = motor or ("duckdb" if ruta_bd.endswith(".duckdb") else "sqlite")
+    conexion = _conectar(ruta_bd, motor)
+    try:
+        cursor = conexion.execute(f'SELECT {_columnas(columnas) if columnas else "*"} FROM "{nombre}"')
+        filas = cursor.fetchall()
+        return pd.DataFrame(filas, columns=[d[0] for d in cursor.description])
+    finally:
+        conexion.close()
+
+def tablas_bd(ruta_bd, motor=None):
+    """Nombres de las tablas de la base de datos."""
+    motor = motor or ("duckdb" if ruta_bd.endswith(".duckdb") else "sqlite")
+    consulta = ("SELECT table_name FROM information_schema.tables" if motor == "duckdb"
+                else "SELECT name FROM sqlite_master WHERE type = 'table'")
+    conexion = _conectar(ruta_bd, motor)
+    try:
+        return {fila[0] for fila in conexion.execute(consulta).fetchall()}
+    finally:
+        conexion.close()
+
+# ---- Validaciones como SQL ----
+# Equivalentes a validar_coherencia_datos y validar_coherencia_temporal_destinos de generate_data.
+# Cada consulta devuelve (EstudianteID, mensaje) y funciona igual en SQLite y DuckDB (por eso los números
+# se convierten explícitamente con CAST antes de concatenarlos).
+VALIDACIONES_SQL = {
+    "sin_eventos": """
+        SELECT e.EstudianteID, 'Estudiante ' || CAST(e.EstudianteID AS VARCHAR) || ': Sin eventos en EventLog'
+        FROM Estudiantes e
+        WHERE NOT EXISTS (SELECT 1 FROM EventLog ev WHERE ev.EstudianteID = e.EstudianteID)
+    """,
+    "aceptado_sin_destino": """
+        SELECT e.EstudianteID, 'Estudiante ' || CAST(e.EstudianteID AS VARCHAR) || ': Estado ''Aceptado'' pero sin destino asignado'
+        FROM Estudiantes e
+        WHERE e.EstadoFinal = 'Aceptado' AND e.DestinoAsignado IS NULL
+    """,
+    "estado_con_destino": """
+        SELECT e.EstudianteID, 'Estudiante ' || CAST(e.EstudianteID AS VARCHAR) || ': Estado ''' || e.EstadoFinal
+               || ''' pero tiene destino asignado (' || CAST(CAST(e.DestinoAsignado AS BIGINT) AS VARCHAR) || ')'
+        FROM Estudiantes e
+        WHERE e.EstadoFinal IN ('Renuncia', 'No asignado', 'Excluido') AND e.DestinoAsignado IS NOT NULL
+    """,
+    "destino_fuera_de_historico": """
+        SELECT e.EstudianteID, 'Estudiante ' || CAST(e.EstudianteID AS VARCHAR) || ': Destino asignado '
+               || CAST(CAST(e.DestinoAsignado AS BIGINT) AS VARCHAR) || ' no aparece en histórico'
+        FROM Estudiantes e
+        WHERE e.DestinoAsignado IS NOT NULL
+          AND EXISTS (SELECT 1 FROM HistoricoAdjudicaciones h WHERE h.EstudianteID = e.EstudianteID)
+          AND NOT EXISTS (SELECT 1 FROM HistoricoAdjudicaciones h
+                          WHERE h.EstudianteID = e.EstudianteID AND h.DestinoID = e.DestinoAsignado)
+    """,
+    "fecha_adjudicacion": """
+        WITH publicaciones AS (
+            SELECT EstudianteID, ActividadID, MIN(Timestamp) AS Primera
+            FROM EventLog WHERE ActividadID IN (10, 14, 18, 22)
+            GROUP BY EstudianteID, ActividadID
+        )
+        SELECT h.EstudianteID, 'Estudiante ' || CAST(h.EstudianteID AS VARCHAR) || ': Fecha adjudicación ' || h.Ronda
+               || ' no coincide (Histórico: ' || substr(h.FechaAsignacion, 1, 10)
+               || ', EventLog: ' || substr(p.Primera, 1, 10) || ')'
+        FROM HistoricoAdjudicaciones h
+        JOIN publicaciones p ON p.EstudianteID = h.EstudianteID AND p.ActividadID = CASE
+            WHEN h.Ronda LIKE '%1ª%' THEN 10 WHEN h.Ronda LIKE '%2ª%' THEN 14
+            WHEN h.Ronda LIKE '%3ª%' THEN 18 WHEN h.Ronda LIKE '%Final%' THEN 22 END
+        WHERE substr(h.FechaAsignacion, 1, 10) <> substr(p.Primera, 1, 10)
+    """,
+    "excluido_con_historico": """
+        SELECT e.EstudianteID, 'Estudiante ' || CAST(e.EstudianteID AS VARCHAR) || ': Estado ''Excluido'' pero tiene histórico de adjudicaciones'
+        FROM Estudiantes e
+        WHERE e.EstadoFinal = 'Excluido'
+          AND EXISTS (SELECT 1 FROM HistoricoAdjudicaciones h WHERE h.EstudianteID = e.EstudianteID)
+    """,
+    "solicitud_tras_cancelacion": """
+        SELECT e.EstudianteID, 'Estudiante ' || CAST(e.EstudianteID AS VARCHAR) || ': Solicitó destino ' || CAST(e.DestinoSolicitado AS VARCHAR)
+               || ' el ' || e.FechaSolicitud || ' pero fue cancelado el ' || d."FechaCancelación"
+        FROM Estudiantes e
+        JOIN Destinos d ON d.DestinoID = e.DestinoSolicitado
+        WHERE d.Cancelado = 'Sí' AND d."FechaCancelación" IS NOT NULL AND d."FechaCancelación" <> ''
+          AND e.FechaSolicitud >= d."FechaCancelación"
+    """,
+}
+
+def validar_en_bd(ruta_bd, motor=None):
+    """
+    Ejecuta las validaciones de coherencia como consultas SQL dentro de la base de datos y devuelve
+    las inconsistencias (en el mismo formato que validar_coherencia_datos), ordenadas por estudiante.
+    """
+    motor = motor or ("duckdb" if ruta_bd.endswith(".duckdb") else "sqlite")
+    print(f"🔍 Validando coherencia en {ruta_bd} con SQL...")
+    conexion = _conectar(ruta_bd, motor)
+    try:
+        resultados = {nombre: conexion.execute(consulta).fetchall() for nombre, consulta in VALIDACIONES_SQL.items()}
+    finally:
+        conexion.close()
+
+    # Como validar_coherencia_datos, un estudiante sin eventos no se sigue validando (salvo la validación temporal)
+    sin_eventos = {estudiante for estudiante, _ in resultados["sin_eventos"]}
+    filas = []
+    for nombre, resultado in resultados.items():
+        if nombre not in ("sin_eventos", "solicitud_tras_cancelacion"):
+            resultado = [fila for fila in resultado if fila[0] not in sin_eventos]
+        print(f"   📋 {nombre}: {len(resultado)}")
+        filas.extend(resultado)
+
+    inconsistencias = [mensaje for _, mensaje in sorted(filas, key=lambda fila: fila[0])]
+    if inconsistencias:
+        print(f"⚠️ Se encontraron {len(inconsistencias)} inconsistencias:")
+        for inc in inconsistencias[:10]:
+            print(f"   - {inc}")
+        if len(inconsistencias) > 10:
+            print(f"   ... y {len(inconsistencias) - 10} más.")
+    else:
+        print("✅ No se encontraron inconsistencias.")
+    return inconsistencias
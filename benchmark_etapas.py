@@ -0,0 +1,169 @@
+"""
+Benchmark por etapas del generador Erasmus.
+
+Cada escala se ejecuta en un proceso hijo (USE_LLM desactivado, semilla fija) que mide cada etapa
+con instrumentacion.py: tiempo de pared y de CPU, filas de entrada y salida, eventos por segundo y
+pico de memoria (tracemalloc y RSS). tracemalloc añade sobrecarga a las etapas con mucho código
+Python, por lo que puede desactivarse con --sin-tracemalloc (solo se registra el RSS). Los
+resultados se añaden a un historial JSON comparable entre ejecuciones; si una escala supera el
+tiempo límite, se conservan las etapas ya medidas.
+
+Uso:
+    python benchmark_etapas.py                      # escalas 3k, 30k y 300k
+    python benchmark_etapas.py --escalas 3k 30k --timeout 900
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+# ---- Configuración del benchmark ----
+ESCALAS = {  # nombre: (estudiantes, destinos, factor_plazas)
+    "3k": (3231, 400, 1.0),
+    "30k": (30_000, 2000, 1.85),
+    "300k": (300_000, 5000, 7.4),
+}
+SEMILLA = 12345
+TIMEOUT_ESCALA = 3600  # Segundos máximos por escala
+RUTA_HISTORIAL = "benchmarks_historial.json"
+PREFIJO_RESULTADO = "@@ETAPA "
+
+def ejecutar_etapas(num_estudiantes, num_destinos, factor_plazas, semilla=SEMILLA, medir_memoria=True):
+    """
+    Ejecuta el pipeline completo (generación, validación y escritura en un directorio temporal) y
+    emite, mediante un hook de instrumentacion, una línea JSON por etapa con sus métricas.
+    """
+    import numpy as np
+    import generate_data as gd
+    import instrumentacion
+
+    # El arranque (importaciones sin LLM) se registra como una etapa más
+    print(PREFIJO_RESULTADO + json.dumps({"etapa": "arranque", "segundos": round(gd.SEGUNDOS_CARGA, 4),
+                                          "eventos_por_segundo": None, "pico_memoria_mb": None,
+                                          "pico_rss_mb": None}), file=sys.__stdout__, flush=True)
+
+    gd.USE_LLM = False
+    gd.FACTOR_PLAZAS = factor_plazas
+    random.seed(semilla)
+    np.random.seed(semilla)
+    estado = {}
+
+    def emitir(registro):
+        registro = dict(registro)
+        if registro["etapa"] == "eventlog":
+            estado["num_eventos"] = registro["filas_salida"]  # Desde aquí el rendimiento también se da en eventos/s
+        num_eventos, segundos = estado.get("num_eventos"), registro["segundos"]
+        registro["eventos_por_segundo"] = round(num_eventos / segundos, 1) if num_eventos and segundos > 0 else None
+        print(PREFIJO_RESULTADO + json.dumps(registro), file=sys.__stdout__, flush=True)
+
+    instrumentacion.iniciar_ejecucion({"num_estudiantes": num_estudiantes, "num_destinos": num_destinos},
+                                      medir_memoria=medir_memoria)
+    instrumentacion.registrar_hook(emitir)
+    with contextlib.redirect_stdout(io.StringIO()), tempfile.TemporaryDirectory() as ruta:
+        dataset = gd.generar_dataset(num_estudiantes, num_destinos)
+        gd.guardar_dataset(dataset, ruta)
+
+def _commit_actual():
+    """Hash corto del commit actual (None si no es un repositorio git)."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def ejecutar_escala(nombre, timeout=TIMEOUT_ESCALA, semilla=SEMILLA, medir_memoria=True):
+    """Ejecuta una escala en un proceso hijo y recoge las etapas medidas (aunque expire el tiempo)."""
+    num_estudiantes, num_destinos, factor_plazas = ESCALAS[nombre]
+    print(f"⏱️ Benchmark escala {nombre}: {num_estudiantes} estudiantes, {num_destinos} destinos...")
+    comando = [sys.executable, os.path.abspath(__file__), "--_hijo",
+               str(num_estudiantes), str(num_destinos), str(factor_plazas), str(semilla), str(int(medir_memoria))]
+    proceso = subprocess.Popen(comando, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    estado = "completado"
+    try:
+        salida, errores = proceso.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+        salida, errores = proceso.communicate()
+        estado = "timeout"
+
+    etapas = [json.loads(linea[len(PREFIJO_RESULTADO):]) for linea in salida.splitlines()
+              if linea.startswith(PREFIJO_RESULTADO)]
+    if estado == "completado" and proceso.returncode != 0:
+        estado = "error"
+        print(errores.strip().splitlines()[-1] if errores.strip() else f"   ❌ Código de salida {proceso.returncode}")
+    for etapa in etapas:
+        eps = f", {etapa['eventos_por_segundo']:.0f} eventos/s" if etapa['eventos_por_segundo'] else ""
+        memoria = etapa['pico_memoria_mb'] if etapa['pico_memoria_mb'] is not None else etapa['pico_rss_mb']
+        memoria = f"{memoria:>8.1f} MB" if memoria is not None else " " * 11
+        print(f"   📋 {etapa['etapa']:<26} {etapa['segundos']:>9.3f} s  {memoria}{eps}")
+    if estado != "completado":
+        print(f"   ⚠️ Escala {nombre} terminada con estado '{estado}' tras {len(etapas)} etapas")
+
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit_actual(),
+        "python": platform.python_version(),
+        "escala": nombre,
+        "estudiantes": num_estudiantes,
+        "destinos": num_destinos,
+        "semilla": semilla,
+        "tracemalloc": medir_memoria,
+        "estado": estado,
+        "etapas": etapas,
+    }
+
+def guardar_historial(resultados, ruta=RUTA_HISTORIAL):
+    """Añade los resultados al historial JSON y muestra la variación frente a la ejecución anterior."""
+    historial = []
+    if os.path.exists(ruta):
+        with open(ruta, encoding="utf-8") as f:
+            historial = json.load(f)
+
+    for resultado in resultados:
+        # Solo son comparables ejecuciones de la misma escala y con el mismo modo de medición de memoria
+        anteriores = [r for r in historial if r["escala"] == resultado["escala"]
+                      and r.get("tracemalloc") == resultado["tracemalloc"]]
+        if anteriores:
+            previas = {e["etapa"]: e["segundos"] for e in anteriores[-1]["etapas"]}
+            print(f"📊 {resultado['escala']}: comparación con {anteriores[-1]['commit'] or anteriores[-1]['fecha']}")
+            for etapa in resultado["etapas"]:
+                if previas.get(etapa["etapa"]):
+                    cambio = (etapa["segundos"] / previas[etapa["etapa"]] - 1) * 100
+                    print(f"   {etapa['etapa']:<26} {cambio:+7.1f}%")
+        historial.append(resultado)
+
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(historial, f, ensure_ascii=False, indent=2)
+    print(f"💾 Historial actualizado en {ruta}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark por etapas del generador Erasmus.")
+    parser.add_argument("--escalas", nargs="+", choices=list(ESCALAS), default=list(ESCALAS))
+    parser.add_argument("--timeout", type=int, default=TIMEOUT_ESCALA, help="Segundos máximos por escala")
+    parser.add_argument("--semilla", type=int, default=SEMILLA)
+    parser.add_argument("--historial", default=RUTA_HISTORIAL, help="Fichero JSON del historial")
+    parser.add_argument("--sin-tracemalloc", dest="medir_memoria", action="store_false",
+                        help="No usar tracemalloc (menos sobrecarga; solo se registra el RSS máximo)")
+    parser.add_argument("--_hijo", nargs=5, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args._hijo:
+        num_estudiantes, num_destinos, factor_plazas, semilla, medir_memoria = args._hijo
+        ejecutar_etapas(int(num_estudiantes), int(num_destinos), float(factor_plazas), int(semilla),
+                        medir_memoria=medir_memoria == "1")
+        return 0
+
+    resultados = [ejecutar_escala(nombre, args.timeout, args.semilla, args.medir_memoria) for nombre in args.escalas]
+    guardar_historial(resultados, args.historial)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import dis
+import hashlib
+import inspect
+import os
+import pickle
+import random
+import shutil
+import types
+
+import numpy as np
+import pandas as pd
+
+from instrumentacion import ejecutar_etapa
+
+# ---- Configuración de la caché de etapas ----
+RUTA_CACHE = ".cache_etapas"
+VERSION_CACHE = 1  # Incrementar para invalidar todas las entradas (p. ej. si cambia el formato de los resultados)
+TIPOS_CONSTANTE = (bool, int, float, str, bytes, tuple, list, dict, set, frozenset, type(None))
+
+# Estado de la caché en la ejecución en curso
+_CONFIG = {"activa": False, "ruta": RUTA_CACHE, "semilla": None}
+# id(objeto) -> (objeto, clave): claves de los resultados producidos en esta ejecución. Guardamos
+# también el objeto para que su id no pueda reutilizarse mientras dure la ejecución.
+_CLAVES = {}
+_HUELLAS_CODIGO = {}
+
+def activar_cache(semilla, ruta=RUTA_CACHE):
+    """Activa la caché de etapas. Requiere semilla: cada etapa se resiembra a partir de ella y de su nombre."""
+    _CONFIG.update(activa=True, ruta=ruta, semilla=semilla)
+    _CLAVES.clear()
+    _HUELLAS_CODIGO.clear()
+
+def desactivar_cache(semilla=None):
+    """
+    Desactiva la caché. Con semilla, cada etapa se sigue resembrando como con la caché activa, de modo
+    que `--seed N` y `--cache --seed N` producen el mismo dataset.
+    """
+    _CONFIG.update(activa=False, semilla=semilla)
+    _CLAVES.clear()
+
+def cache_activa():
+    return _CONFIG["activa"]
+
+def limpiar_cache(ruta=RUTA_CACHE):
+    """Elimina todas las entradas de la caché en disco."""
+    shutil.rmtree(ruta, ignore_errors=True)
+
+def _nombres_referenciados(codigo):
+    """Nombres globales usados por un objeto código y sus funciones anidadas (lambdas, comprensiones...)."""
+    nombres = set()
+    for instruccion in dis.get_instructions(codigo):
+        if instruccion.opname in ("LOAD_GLOBAL", "LOAD_NAME"):
+            nombres.add(instruccion.argval)
+    for constante in codigo.co_consts:
+        if isinstance(constante, types.CodeType):
+            nombres |= _nombres_referenciados(constante)
+    return nombres
+
+def huella_codigo(funcion):
+    """
+    Versión del código de una etapa: hash del código fuente de la función, de las funciones del
+    proyecto que llama (recursivamente) y del valor de las constantes de módulo que lee, de modo que
+    cambiar p. ej. las probabilidades de aplicar_bucles_la_a_ruta o PCT_ESTUDIANTES_CON_ALEGACIONES
+    invalida solo las etapas que los usan.
+    """
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    visitadas = set()
+    partes = []
+
+    def visitar(f):
+        if f in visitadas:
+            return
+        visitadas.add(f)
+        try:
+            partes.append(inspect.getsource(f))
+        except (OSError, TypeError):
+            partes.append(f.__qualname__)
+        for nombre in sorted(_nombres_referenciados(f.__code__)):
+            valor = f.__globals__.get(nombre)
+            if isinstance(valor, types.FunctionType):
+                modulo = inspect.getmodule(valor)
+                ruta_modulo = getattr(modulo, "__file__", None) or ""
+                if os.path.dirname(os.path.abspath(ruta_modulo)) == directorio:
+                    visitar(valor)
+            elif nombre.startswith("_"):
+                continue  # Estado privado de módulo (precargas, clientes...), no parámetros
+            elif isinstance(valor, (set, frozenset)):
+                partes.append(f"{nombre}={sorted(map(repr, valor))!r}")  # El orden de un set varía entre procesos
+            elif isinstance(valor, TIPOS_CONSTANTE):
+                representacion = repr(valor)
+                if " at 0x" not in representacion:  # Registros de funciones: su repr cambia en cada proceso
+                    partes.append(f"{nombre}={representacion}")
+
+    if funcion not in _HUELLAS_CODIGO:
+        visitar(funcion)
+        _HUELLAS_CODIGO[funcion] = hashlib.sha256("\n".join(partes).encode()).hexdigest()
+    return _HUELLAS_CODIGO[funcion]
+
+def huella_valor(valor):
+    """Huella de un argumento: la clave de la etapa que lo produjo o, si es externo, un hash de su contenido."""
+    if id(valor) in _CLAVES and _CLAVES[id(valor)][0] is valor:
+        return _CLAVES[id(valor)][1]
+    if isinstance(valor, pd.DataFrame):
+        contenido = pd.util.hash_pandas_object(valor, index=True).to_numpy().tobytes()
+        return hashlib.sha256(contenido + repr(list(valor.columns)).encode()).hexdigest()
+    if isinstance(valor, np.ndarray):
+        return hashlib.sha256(valor.tobytes() + str(valor.dtype).encode()).hexdigest()
+    if isinstance(valor, TIPOS_CONSTANTE) and not isinstance(valor, (dict, list, set)):
+        return repr(valor)
+    return hashlib.sha256(pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+def _registrar_resultado(resultado, clave):
+    """Asocia la clave al resultado (y a cada elemento si es una tupla) para encadenar las etapas."""
+    _CLAVES[id(resultado)] = (resultado, clave)
+    if isinstance(resultado, tuple):
+        for i, elemento in enumerate(resultado):
+            _CLAVES[id(elemento)] = (elemento, f"{clave}[{i}]")
+
+def _sembrar(semilla, nombre):
+    """Resiembra random y np.random por etapa para que reutilizar una etapa no altere las posteriores."""
+    derivada = int.from_bytes(hashlib.sha256(f"{semilla}:{nombre}".encode()).digest()[:4], "little")
+    random.seed(derivada)
+    np.random.seed(derivada)
+
+def _clave_etapa(nombre, funcion, args, kwargs):
+    """Clave de una etapa y ruta de su entrada en disco."""
+    componentes = [
+        f"v{VERSION_CACHE}", nombre, str(_CONFIG["semilla"]), pd.__version__, np.__version__,
+        huella_codigo(funcion),
+        *(huella_valor(a) for a in args),
+        *(f"{k}={huella_valor(v)}" for k, v in sorted(kwargs.items())),
+    ]
+    clave = hashlib.sha256("\x1f".join(componentes).encode()).hexdigest()
+    return clave, os.path.join(_CONFIG["ruta"], f"{nombre}-{clave[:24]}.pkl")
+
+def en_cache(nombre, funcion, *args, **kwargs):
+    """Indica si etapa(nombre, funcion, *args, **kwargs) se recuperaría de la caché sin ejecutarse."""
+    return _CONFIG["activa"] and os.path.exists(_clave_etapa(nombre, funcion, args, kwargs)[1])
+
+def etapa(nombre, funcion, *args, **kwargs):
+    """
+    Ejecuta una etapa del DAG del pipeline. Sin caché equivale a instrumentacion.ejecutar_etapa (tras
+    resembrar la etapa si hay semilla). Con caché, la clave es un hash de las claves de sus entradas, sus parámetros, la semilla y la
+    versión del código; si ya existe en disco se carga en lugar de recalcularla.
+    """
+    if not _CONFIG["activa"]:
+        if _CONFIG["semilla"] is not None:
+            _sembrar(_CONFIG["semilla"], nombre)
+        return ejecutar_etapa(nombre, funcion, *args, **kwargs)
+
+    clave, ruta = _clave_etapa(nombre, funcion, args, kwargs)
+    if os.path.exists(ruta):
+        def cargar():
+            with open(ruta, "rb") as f:
+                return pickle.load(f)
+        print(f"♻️ Etapa '{nombre}' recuperada de la caché")
+        resultado = ejecutar_etapa(nombre, cargar, metadatos={"cache": True})
+    else:
+        _sembrar(_CONFIG["semilla"], nombre)
+        resultado = ejecutar_etapa(nombre, funcion, *args, metadatos={"cache": False}, **kwargs)
+        os.makedirs(_CONFIG["ruta"], exist_ok=True)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as f:
+            pickle.dump(resultado, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporal, ruta)  # Escritura atómica: nunca se lee una entrada a medio escribir
+
+    _registrar_resultado(resultado, clave)
+    return resultado
@@ -0,0 +1,138 @@
+import random
+
+import numpy as np
+
+import generate_data as gd
+from adjudicacion_diferida import NUM_PREFERENCIAS, ejecutar_rondas, generar_preferencias, preparar_preferencias
+
+# ---- Objetivos de calibración ----
+OCUPACION_OBJETIVO = 85.0      # % de plazas ocupadas (banda realista 70-95%)
+PARTICIPACION_OBJETIVO = 60.0  # % de estudiantes que finalmente van de Erasmus
+TOLERANCIA = 1.0               # Puntos porcentuales admitidos en cada objetivo
+MAX_ITERACIONES = 12           # Iteraciones de bisección por inclinación
+INCLINACIONES = (0.0, -0.5, 0.5, -1.0, 1.0)  # Desplazamiento de los pesos hacia tramos pequeños (<0) o grandes (>0)
+
+def inclinar_tramos(tramos_plazas, inclinacion):
+    """Reponderamos los tramos exponencialmente según su tamaño medio (0 = tramos originales)."""
+    medios = np.array([(minimo + maximo) / 2 for minimo, maximo, _ in tramos_plazas])
+    pesos = np.array([p for _, _, p in tramos_plazas], dtype=float)
+    z = (medios - medios.mean()) / (medios.std() or 1.0)
+    pesos = pesos * np.exp(inclinacion * z)
+    pesos /= pesos.sum()
+    return [(minimo, maximo, round(float(p), 4)) for (minimo, maximo, _), p in zip(tramos_plazas, pesos)]
+
+def muestrear_plazas(u, v, activos, tramos_plazas, factor_plazas):
+    """
+    Versión vectorizada de elegir_plazas con números aleatorios comunes (u elige tramo, v el valor
+    dentro del tramo), de modo que cada evaluación solo difiere por los parámetros calibrados.
+    """
+    minimos = np.array([minimo for minimo, _, _ in tramos_plazas])
+    maximos = np.array([maximo for _, maximo, _ in tramos_plazas])
+    pesos = np.array([p for _, _, p in tramos_plazas], dtype=float)
+    acumulado = np.cumsum(pesos / pesos.sum())
+    tramo = np.minimum(np.searchsorted(acumulado, u, side='right'), len(tramos_plazas) - 1)
+    plazas = minimos[tramo] + np.floor(v * (maximos[tramo] - minimos[tramo] + 1)).astype(np.int64)
+    plazas = np.maximum(1, np.round(plazas * factor_plazas)).astype(np.int64)
+    return np.where(activos, plazas, 0)
+
+def calibrar_plazas(destinos_df, estudiantes_df, ocupacion_objetivo=OCUPACION_OBJETIVO,
+                    participacion_objetivo=PARTICIPACION_OBJETIVO, tolerancia=TOLERANCIA,
+                    max_iteraciones=MAX_ITERACIONES, inclinaciones=INCLINACIONES, preferencias=None,
+                    num_preferencias=None, semilla=0):
+    """
+    Busca un factor de escala y unos pesos de tramos para NúmeroPlazas que alcancen la ocupación y
+    la participación objetivo. Para cada inclinación de los tramos se biseca el factor sobre la
+    participación (monótona en el número de plazas) ejecutando el núcleo de aceptación diferida,
+    y se detiene en cuanto ambos objetivos quedan dentro de la tolerancia.
+    Las evaluaciones usan `semilla`, pero el estado de random y np.random se restaura al terminar para
+    que las etapas posteriores sigan la semilla de la ejecución.
+    Devuelve un diccionario con los parámetros, las métricas y una copia de destinos_df recalibrada.
+    """
+    estado_random, estado_numpy = random.getstate(), np.random.get_state()
+    try:
+        return _calibrar_plazas(destinos_df, estudiantes_df, ocupacion_objetivo, participacion_objetivo, tolerancia,
+                                max_iteraciones, inclinaciones, preferencias, num_preferencias, semilla)
+    finally:
+        random.setstate(estado_random)
+        np.random.set_state(estado_numpy)
+
+def _calibrar_plazas(destinos_df, estudiantes_df, ocupacion_objetivo, participacion_objetivo, tolerancia,
+                     max_iteraciones, inclinaciones, preferencias, num_preferencias, semilla):
+    print(f"🎚️ Calibrando plazas: ocupación {ocupacion_objetivo}% y participación {participacion_objetivo}%...")
+
+    rng = np.random.default_rng(semilla)
+    u = rng.random(len(destinos_df))
+    v = rng.random(len(destinos_df))
+    activos = (destinos_df['Cancelado'] != 'Sí').to_numpy()
+
+    # Preferencias, idioma y estados se fijan una vez: solo cambian las plazas entre evaluaciones
+    np.random.seed(semilla)
+    if preferencias is None:
+        # En modo clásico cada estudiante solo compite por su DestinoSolicitado
+        if num_preferencias is None:
+            num_preferencias = 1 if gd.MODO_ADJUDICACION == "clasico" else NUM_PREFERENCIAS
+        preferencias = generar_preferencias(estudiantes_df, destinos_df, num_preferencias)
+    preferencias_pos = preparar_preferencias(estudiantes_df, destinos_df, preferencias)
+    expedientes = estudiantes_df['Expediente'].to_numpy(dtype=float)
+    estudiante_ids = estudiantes_df['EstudianteID'].to_numpy(dtype=np.int64)
+    estados = estudiantes_df['EstadoFinal'].to_numpy()
+    num_estudiantes = len(estudiantes_df)
+    evaluaciones = []
+
+    def evaluar(plazas):
+        random.seed(semilla)
+        _, con_plaza = ejecutar_rondas(preferencias_pos, expedientes, estudiante_ids, estados, plazas)
+        aceptados = int(con_plaza.sum())
+        ocupacion = aceptados / plazas.sum() * 100 if plazas.sum() > 0 else 0.0
+        participacion = aceptados / num_estudiantes * 100
+        evaluaciones.append((ocupacion, participacion))
+        return ocupacion, participacion
+
+    mejor = None
+    for inclinacion in inclinaciones:
+        tramos = inclinar_tramos(gd.TRAMOS_PLAZAS, inclinacion)
+
+        # Acotamos el factor: duplicamos el extremo superior hasta superar la participación objetivo
+        factor_bajo, factor_alto = 0.0, 1.0
+        ocupacion, participacion = evaluar(muestrear_plazas(u, v, activos, tramos, factor_alto))
+        while participacion < participacion_objetivo and factor_alto < 64:
+            factor_bajo, factor_alto = factor_alto, factor_alto * 2
+            ocupacion, participacion = evaluar(muestrear_plazas(u, v, activos, tramos, factor_alto))
+        factor = factor_alto
+
+        for _ in range(max_iteraciones):
+            if abs(participacion - participacion_objetivo) <= tolerancia / 2:
+                break
+            factor = (factor_bajo + factor_alto) / 2
+            ocupacion, participacion = evaluar(muestrear_plazas(u, v, activos, tramos, factor))
+            if participacion < participacion_objetivo:
+                factor_bajo = factor
+            else:
+                factor_alto = factor
+
+        error = abs(ocupacion - ocupacion_objetivo) + abs(participacion - participacion_objetivo)
+        print(f"   📋 Inclinación {inclinacion:+.1f}: factor {factor:.3f} → ocupación {ocupacion:.1f}%, participación {participacion:.1f}%")
+        if mejor is None or error < mejor['error']:
+            mejor = {'inclinacion': inclinacion, 'tramos': tramos, 'factor': factor,
+                     'ocupacion': ocupacion, 'participacion': participacion, 'error': error}
+        if abs(ocupacion - ocupacion_objetivo) <= tolerancia and abs(participacion - participacion_objetivo) <= tolerancia:
+            break  # Parada temprana: ambos objetivos alcanzados
+
+    if mejor['error'] > 2 * tolerancia:
+        print(f"⚠️ No se alcanzaron ambos objetivos con la tolerancia {tolerancia}; se usa la mejor combinación encontrada.")
+
+    destinos_calibrados = destinos_df.copy()
+    plazas = muestrear_plazas(u, v, activos, mejor['tramos'], mejor['factor'])
+    destinos_calibrados['NúmeroPlazas'] = plazas.astype(destinos_df['NúmeroPlazas'].dtype)  # Conserva el esquema compacto
+    print(f"✅ Calibración: factor {mejor['factor']:.3f}, {destinos_calibrados['NúmeroPlazas'].sum()} plazas, "
+          f"ocupación {mejor['ocupacion']:.1f}%, participación {mejor['participacion']:.1f}% "
+          f"({len(evaluaciones)} evaluaciones)")
+
+    return {
+        'destinos': destinos_calibrados,
+        'factor_plazas': mejor['factor'],
+        'tramos_plazas': mejor['tramos'],
+        'ocupacion': mejor['ocupacion'],
+        'participacion': mejor['participacion'],
+        'evaluaciones': len(evaluaciones)
+    }
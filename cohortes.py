@@ -0,0 +1,141 @@
+import contextlib
+import io
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+
+import generate_data as gd
+
+# ---- Configuración de cohortes ----
+CURSO_INICIAL = 2022       # Año de inicio del primer curso generado
+NUM_COHORTES = 5           # Cursos consecutivos
+VARIACION_PLAZAS = 0.20    # Variación anual máxima (±) de las plazas de cada destino
+PROB_CANCELACION = 0.05    # Probabilidad anual de cancelación de un destino
+
+# Columnas con identificadores que deben ser únicos entre cohortes
+COLUMNAS_ID_SECUENCIALES = {
+    "eventlog": "EventID",
+    "alegaciones": "AlegacionID",
+    "historico": "AsignacionID",
+}
+TABLAS_CON_ESTUDIANTE = ("estudiantes", "eventlog", "alegaciones", "historico")
+
+def nombre_curso(anio_inicio):
+    """Devuelve el nombre del curso, p. ej. 2022 -> '2022-23'."""
+    return f"{anio_inicio}-{str(anio_inicio + 1)[-2:]}"
+
+def destinos_para_curso(destinos_base, semilla):
+    """
+    Deriva el catálogo de un curso a partir del catálogo persistente: mismos DestinoID, nombres,
+    países e idioma, pero plazas con variación anual y cancelaciones sorteadas de nuevo dentro del
+    calendario vigente (dentro de un bloque `with gd.aplicar_curso(anio)`).
+    """
+    rng = np.random.default_rng(semilla)
+    destinos = destinos_base.copy()
+    num_destinos = len(destinos)
+
+    # Los destinos cancelados en el catálogo base recuperan un tamaño propio cuando vuelven a ofertarse
+    plazas_base = destinos['NúmeroPlazas'].to_numpy(dtype=np.int64)
+    plazas_base = np.where(plazas_base > 0, plazas_base, rng.integers(1, 6, size=num_destinos))
+    variacion = 1 + rng.uniform(-VARIACION_PLAZAS, VARIACION_PLAZAS, size=num_destinos)
+    plazas = np.maximum(1, np.round(plazas_base * variacion)).astype(np.int64)
+
+    # Cancelación antes del listado provisional del curso (misma regla que generar_destinos)
+    cancelado = rng.random(num_destinos) < PROB_CANCELACION
+    inicio_solicitudes = gd.PLAZOS[4][0]
+    dias_hasta_provisional = (gd.FECHAS_PUBLICACION[6].date() - inicio_solicitudes.date()).days
+    dias_cancelacion = rng.integers(15, max(16, dias_hasta_provisional), size=num_destinos)
+
+    destinos['NúmeroPlazas'] = np.where(cancelado, 0, plazas)
+    destinos['Cancelado'] = np.where(cancelado, "Sí", "No")
+    destinos['FechaCancelación'] = [
+        (inicio_solicitudes + timedelta(days=int(dias))).strftime('%Y-%m-%d') if c else ""
+        for c, dias in zip(cancelado, dias_cancelacion)
+    ]
+    return destinos
+
+def _generar_cohorte(indice, anio_inicio, destinos_base, num_estudiantes, semilla, modo_adjudicacion, calibrar_plazas):
+    """Genera el dataset completo de un curso en un proceso del pool (sin escribir en disco)."""
+    random.seed(semilla + indice)
+    np.random.seed((semilla + indice) % (2**32))
+
+    # El catálogo ya viene resuelto; las cohortes no llaman al LLM
+    with contextlib.redirect_stdout(io.StringIO()), gd.aplicar_curso(anio_inicio), gd.configuracion_temporal(
+            USE_LLM=False, MODO_ADJUDICACION=modo_adjudicacion, CALIBRAR_PLAZAS=calibrar_plazas):
+        destinos = destinos_para_curso(destinos_base, semilla + indice)
+        dataset = gd.generar_dataset(num_estudiantes, destinos=destinos)
+    return dataset
+
+def generar_cohortes(num_cohortes=NUM_COHORTES, curso_inicial=CURSO_INICIAL, num_estudiantes=None,
+                     num_destinos=None, ruta_data=None, num_workers=1, semilla=0, formato="csv",
+                     compresion=None, particiones=None, eventlog_binario=None, calibrar_plazas=None):
+    """
+    Genera `num_cohortes` cursos consecutivos en paralelo sobre un catálogo de destinos persistente.
+    Cada curso se escribe en su propia partición (ruta_data/curso=AAAA-AA/) en cuanto está listo,
+    con EstudianteID, EventID, AlegacionID y AsignacionID únicos en todo el conjunto.
+    Con `calibrar_plazas` (por defecto CALIBRAR_PLAZAS) se recalibran las plazas de cada curso.
+    Devuelve un resumen por curso.
+    """
+    num_estudiantes = gd.NUM_ESTUDIANTES if num_estudiantes is None else num_estudiantes
+    num_destinos = gd.NUM_DESTINOS if num_destinos is None else num_destinos
+    ruta_data = gd.RUTA_DATA if ruta_data is None else ruta_data
+    calibrar_plazas = gd.CALIBRAR_PLAZAS if calibrar_plazas is None else calibrar_plazas
+
+    print(f"📅 Generando {num_cohortes} cohortes desde {nombre_curso(curso_inicial)} con {num_workers} procesos...")
+    random.seed(semilla)
+    np.random.seed(semilla % (2**32))
+    destinos_base = gd.generar_destinos(num_destinos)  # Catálogo persistente (una única llamada al LLM)
+    gd.guardar_tablas({"Actividades": gd.generar_actividades()}, ruta_data, formato=formato,
+                      compresion=gd.COMPRESION_SALIDA if compresion is None else compresion)
+
+    anios = [curso_inicial + i for i in range(num_cohortes)]
+    argumentos = [
+        (i, anio, destinos_base, num_estudiantes, semilla, gd.MODO_ADJUDICACION, calibrar_plazas)
+        for i, anio in enumerate(anios)
+    ]
+
+    # Los desplazamientos de IDs se acumulan en orden de curso, por lo que el resultado es determinista
+    desplazamientos = {columna: 0 for columna in COLUMNAS_ID_SECUENCIALES.values()}
+    resumen = []
+
+    def escribir(indice, anio, dataset):
+        curso = nombre_curso(anio)
+        desplazamiento_estudiante = indice * num_estudiantes
+        for clave in TABLAS_CON_ESTUDIANTE:
+            dataset[clave]['EstudianteID'] += desplazamiento_estudiante
+        for clave, columna in COLUMNAS_ID_SECUENCIALES.items():
+            tabla = dataset[clave]
+            tabla[columna] += desplazamientos[columna]
+            desplazamientos[columna] += len(tabla)
+        dataset.pop("actividades")
+        for clave in gd.TABLAS_DATASET:
+            if clave in dataset:
+                dataset[clave].insert(0, 'Curso', curso)
+
+        with gd.aplicar_curso(anio):  # El estado del dataset guarda el año del curso
+            gd.guardar_dataset(dataset, os.path.join(ruta_data, f"curso={curso}"), formato=formato,
+                               compresion=compresion, particiones=particiones, eventlog_binario=eventlog_binario)
+        aceptados = int((dataset['estudiantes']['EstadoFinal'] == 'Aceptado').sum())
+        resumen.append({'Curso': curso, 'Estudiantes': num_estudiantes, 'Eventos': len(dataset['eventlog']),
+                        'Plazas': int(dataset['destinos']['NúmeroPlazas'].sum()), 'Aceptados': aceptados,
+                        'Inconsistencias': len(dataset['inconsistencias'])})
+        print(f"   ✅ Curso {curso}: {len(dataset['eventlog'])} eventos, {aceptados} aceptados")
+
+    if num_workers <= 1:
+        for args in argumentos:
+            escribir(args[0], args[1], _generar_cohorte(*args))
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            # map devuelve los cursos en orden: cada uno se escribe y se libera antes de recibir el siguiente
+            for args, dataset in zip(argumentos, pool.map(_generar_cohorte, *zip(*argumentos))):
+                escribir(args[0], args[1], dataset)
+
+    print(f"✅ {num_cohortes} cohortes escritas en {ruta_data}/curso=*/")
+    return resumen
+
+# ---- Ejecución principal ----
+if __name__ == "__main__":
+    generar_cohortes()
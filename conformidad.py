@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+
+# ---- Modelo de proceso como autómata finito ----
+# El estado es la última actividad registrada del caso (INICIO antes de la primera). Con este estado el
+# autómata es determinista y la comprobación de un EventLog completo se reduce a consultar una matriz
+# de transiciones por cada par (actividad previa, actividad) del caso, sin bucles en Python.
+INICIO = 0
+# El modelo se deriva del catálogo de generar_actividades: cada actividad puede ir seguida de las del
+# siguiente OrdenSecuencial (y el caso empieza por las del primero). Sobre esa secuencia se aplican las
+# reglas explícitas de abajo, que recogen las opciones, saltos y reintentos del proceso real.
+FASES_FUERA_DE_SECUENCIA = {"Cancelación"}  # Su OrdenSecuencial es orientativo: solo entra por las reglas
+TRANSICIONES_ANADIDAS = {
+    INICIO: {4},             # La convalidación de idioma es opcional: se puede empezar por la inscripción
+    2: {1, 33},              # Rechazo de idioma: reintento (1 -> 2 -> 1 -> 3), cancelación o exclusión
+    4: {33},
+    6: {10, 33},             # Las alegaciones (7-9) son opcionales tras la publicación provisional (6)
+    10: {13, 33},            # 1ª adjudicación: sin plaza pasa directamente a actualizar preferencias
+    11: {14},                # Tras aceptar/reservar se espera la siguiente publicación
+    14: {17, 18},            # 2ª adjudicación (18 directamente si ya aceptó en la 1ª)
+    15: {18},
+    18: {21, 22},            # 3ª adjudicación
+    19: {22},
+    26: {23, 32},            # Rechazo del LA por el responsable: reintento (26 -> 23) o cierre sin formalizar
+    30: {27, 32},            # Rechazo por la subdirectora de RRII: reintento o cierre
+}
+TRANSICIONES_ELIMINADAS = {
+    2: {4},                  # Un rechazo no avanza a la siguiente actividad de la secuencia
+    11: {13},                # Quien acepta no actualiza sus preferencias
+    15: {17},
+    19: {21},
+    26: {27},
+    30: {31},
+}
+# Además de las actividades sin sucesores: exclusión, renuncia, sin plaza o listado definitivo sin LA
+FINALES_ANTICIPADOS = {2, 5, 6, 9, 12, 13, 16, 17, 20, 21, 22}
+
+MOTIVOS = {1: "actividad desconocida", 2: "transición no permitida", 3: "final no permitido"}
+
+_AUTOMATA = {}
+
+def derivar_modelo(actividades_df):
+    """
+    Devuelve (sucesores, finales) a partir del catálogo de actividades y de las reglas explícitas.
+    Falla si una regla usa actividades inexistentes o elimina una transición que la secuencia no tiene,
+    para que un cambio en generar_actividades no deje reglas obsoletas sin avisar.
+    """
+    ids = set(actividades_df["ActividadID"].astype(int))
+    en_reglas = set(TRANSICIONES_ANADIDAS) | set(TRANSICIONES_ELIMINADAS) | FINALES_ANTICIPADOS
+    en_reglas |= {a for reglas in (TRANSICIONES_ANADIDAS, TRANSICIONES_ELIMINADAS) for s in reglas.values() for a in s}
+    desconocidas = en_reglas - ids - {INICIO}
+    if desconocidas:
+        raise ValueError(f"El modelo de proceso usa actividades inexistentes: {sorted(desconocidas)}")
+
+    en_secuencia = actividades_df[~actividades_df["Fase"].astype(str).isin(FASES_FUERA_DE_SECUENCIA)]
+    por_orden = {}
+    for actividad, orden in zip(en_secuencia["ActividadID"].astype(int), en_secuencia["OrdenSecuencial"].astype(int)):
+        por_orden.setdefault(orden, set()).add(actividad)
+    ordenes = sorted(por_orden)
+    sucesores = {actividad: set() for actividad in ids}
+    sucesores[INICIO] = set(por_orden[ordenes[0]])
+    for actual, siguiente in zip(ordenes, ordenes[1:]):
+        for actividad in por_orden[actual]:
+            sucesores[actividad] = set(por_orden[siguiente])
+
+    for origen, destinos in TRANSICIONES_ELIMINADAS.items():
+        if not destinos <= sucesores[origen]:
+            raise ValueError(f"Regla obsoleta: la secuencia no tiene las transiciones {origen} -> {sorted(destinos - sucesores[origen])}")
+        sucesores[origen] -= destinos
+    for origen, destinos in TRANSICIONES_ANADIDAS.items():
+        sucesores[origen] |= destinos
+    finales = {actividad for actividad in ids if not sucesores[actividad]} | FINALES_ANTICIPADOS
+    return sucesores, finales
+
+def compilar_automata(actividades_df=None):
+    """
+    Compila el modelo derivado del catálogo de actividades (por defecto, el de generar_actividades) en
+    matrices booleanas indexadas por ActividadID.
+    """
+    if actividades_df is None:
+        from generate_data import generar_actividades  # Importación diferida: generate_data importa este módulo
+        actividades_df = generar_actividades()
+    sucesores, finales_modelo = derivar_modelo(actividades_df)
+    ids = sorted(set(actividades_df["ActividadID"].astype(int)))
+
+    tamano = max(ids) + 1
+    transiciones = np.zeros((tamano, tamano), dtype=bool)
+    for origen, destinos in sucesores.items():
+        transiciones[origen, sorted(destinos)] = True
+    finales = np.zeros(tamano, dtype=bool)
+    finales[sorted(finales_modelo)] = True
+    return {"transiciones": transiciones, "finales": finales, "conocidas": np.isin(np.arange(tamano), ids)}
+
+def _automata_por_defecto():
+    if not _AUTOMATA:
+        _AUTOMATA.update(compilar_automata())
+    return _AUTOMATA
+
+def validar_patron(patron, automata=None):
+    """Recorre un patrón (lista de ActividadID) y devuelve None si es conforme o el motivo del primer fallo."""
+    automata = automata or _automata_por_defecto()
+    transiciones, conocidas = automata["transiciones"], automata["conocidas"]
+    if not patron:
+        return "patrón vacío"
+    estado = INICIO
+    for posicion, actividad in enumerate(patron):
+        if not (0 < actividad < len(conocidas) and conocidas[actividad]):
+            return f"actividad desconocida {actividad} en la posición {posicion}"
+        if not transiciones[estado, actividad]:
+            return f"transición no permitida {estado or 'inicio'} -> {actividad} en la posición {posicion}"
+        estado = actividad
+    if not automata["finales"][estado]:
+        return f"final no permitido en {estado}"
+    return None
+
+def filtrar_patrones(patrones, automata=None):
+    """Devuelve solo los patrones conformes con el modelo, avisando de los descartados."""
+    conformes = []
+    for patron in patrones:
+        motivo = validar_patron(patron, automata)
+        if motivo is None:
+            conformes.append(patron)
+        else:
+            print(f"Advertencia: patrón descartado por no ser conforme ({motivo}): {patron}")
+    return conformes
+
+def verificar_conformidad_eventlog(eventlog_df, actividades_df=None):
+    """
+    Comprueba de forma vectorizada que la ruta de cada caso del EventLog (ordenada por Timestamp y
+    EventID) es aceptada por el autómata. Devuelve un DataFrame con el primer fallo de cada caso no
+    conforme: EstudianteID, Posicion, ActividadPrevia, ActividadID y Motivo.
+    """
+    print("🔍 Verificando conformidad del EventLog con el modelo de proceso...")
+    automata = compilar_automata(actividades_df) if actividades_df is not None else _automata_por_defecto()
+    transiciones, finales, conocidas = automata["transiciones"], automata["finales"], automata["conocidas"]
+    if eventlog_df.empty:
+        return pd.DataFrame(columns=["EstudianteID", "Posicion", "ActividadPrevia", "ActividadID", "Motivo"])
+
+    casos = eventlog_df["EstudianteID"].to_numpy()
+    instantes = pd.to_datetime(eventlog_df["Timestamp"], format="%Y-%m-%d %H:%M:%S").to_numpy().view("i8")
+    orden = np.lexsort((eventlog_df["EventID"].to_numpy(), instantes, casos))
+    casos = casos[orden]
+    actividades = eventlog_df["ActividadID"].to_numpy(dtype=np.int64)[orden]
+
+    inicio_caso = np.r_[True, casos[1:] != casos[:-1]]
+    fin_caso = np.r_[inicio_caso[1:], True]
+    posiciones = np.arange(len(casos)) - np.maximum.accumulate(np.where(inicio_caso, np.arange(len(casos)), 0))
+
+    # Las actividades desconocidas se llevan al índice INICIO, que nunca es destino de una transición
+    validas = (actividades > 0) & (actividades < len(conocidas))
+    validas[validas] = conocidas[actividades[validas]]
+    indices = np.where(validas, actividades, INICIO)
+    previas = np.r_[INICIO, indices[:-1]]
+    previas[inicio_caso] = INICIO
+
+    motivos = np.zeros(len(casos), dtype=np.int8)
+    motivos[fin_caso & ~finales[indices]] = 3
+    motivos[~transiciones[previas, indices]] = 2
+    motivos[~validas] = 1
+
+    fallos = np.flatnonzero(motivos)
+    _, primeros = np.unique(casos[fallos], return_index=True)  # Orden por caso: el primer fallo de cada uno
+    fallos = fallos[primeros]
+    no_conformes = pd.DataFrame({
+        "EstudianteID": casos[fallos],
+        "Posicion": posiciones[fallos],
+        "ActividadPrevia": np.r_[INICIO, actividades[:-1]][fallos] * ~inicio_caso[fallos],
+        "ActividadID": actividades[fallos],
+        "Motivo": [MOTIVOS[m] for m in motivos[fallos]],
+    })
+
+    total_casos = int(inicio_caso.sum())
+    if len(no_conformes):
+        print(f"⚠️ {len(no_conformes)} de {total_casos} casos no son conformes con el modelo de proceso.")
+    else:
+        print(f"✅ Los {total_casos} casos del EventLog son conformes con el modelo de proceso.")
+    return no_conformes
@@ -0,0 +1,283 @@
+"""
+Punto de entrada de línea de comandos del generador Erasmus.
+
+Uso:
+    python -m erasmus_gen generate --scale medium --seed 42 --output-dir data_100k
+    python -m erasmus_gen generate --compression gzip --partition EventLog=Fase --partition HistoricoAdjudicaciones=Ronda
+    python -m erasmus_gen sweep --scale small --replicas 50 --workers 8
+    python -m erasmus_gen cohorts --cohorts 5 --start-year 2022 --workers 5
+    python -m erasmus_gen llm-batch write --destinations 5000
+    python -m erasmus_gen export --to xes --to ocel --data-dir data
+    python -m erasmus_gen generate --format sqlite && python -m erasmus_gen validate-db data/erasmus.sqlite
+    python -m erasmus_gen append --students 5000 --data-dir data
+    python -m erasmus_gen analyze --data-dir data --output-dir data/analitica
+"""
+import argparse
+import os
+import random
+import sys
+
+import numpy as np
+
+# ---- Presets de escala ----
+# Los destinos crecen menos que los estudiantes; FACTOR_PLAZAS mantiene ~62% de plazas por estudiante
+PRESETS_ESCALA = {
+    "small": {"estudiantes": 3231, "destinos": 400, "factor_plazas": 1.0},
+    "medium": {"estudiantes": 100_000, "destinos": 5000, "factor_plazas": 2.5},
+    "large": {"estudiantes": 1_000_000, "destinos": 10_000, "factor_plazas": 12.3},
+}
+
+def crear_parser():
+    """Construye el parser de argumentos con los subcomandos disponibles."""
+    parser = argparse.ArgumentParser(
+        prog="erasmus_gen",
+        description="Generador de datos sintéticos Erasmus para Process Mining."
+    )
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    comun = argparse.ArgumentParser(add_help=False)
+    comun.add_argument("--scale", choices=sorted(PRESETS_ESCALA), default="small",
+                       help="Preset de tamaño: small=3k, medium=100k, large=1M estudiantes (por defecto: small)")
+    comun.add_argument("--students", type=int, help="Número de estudiantes (sobrescribe el preset)")
+    comun.add_argument("--destinations", type=int, help="Número de destinos (sobrescribe el preset)")
+    comun.add_argument("--seed", type=int, default=None, help="Semilla aleatoria para resultados reproducibles")
+    comun.add_argument("--workers", type=int, default=1, help="Número de procesos/hilos en paralelo")
+    comun.add_argument("--mode", choices=["clasico", "diferida"], default=None,
+                       help="Modo de adjudicación (por defecto: MODO_ADJUDICACION)")
+    comun.add_argument("--llm", dest="use_llm", action="store_true", default=False,
+                       help="Usar el LLM para universidades, motivos y patrones (por defecto: desactivado)")
+    comun.add_argument("--refresh-llm-cache", action="store_true",
+                       help="Ignorar la caché de respuestas del LLM y volver a llamar al modelo")
+    comun.add_argument("--llm-offline", action="store_true",
+                       help="Usar el LLM solo desde la caché (p. ej. tras 'llm-batch ingest'), sin llamadas a la red")
+    comun.add_argument("--output-dir", default=None, help="Directorio de salida (por defecto: RUTA_DATA)")
+
+    salida = argparse.ArgumentParser(add_help=False)
+    salida.add_argument("--format", dest="formato", choices=["csv", "parquet", "sqlite", "duckdb"], default="csv",
+                        help="Formato de salida: CSV/Parquet por tabla o un único fichero SQLite/DuckDB "
+                             "(parquet requiere pyarrow y duckdb el paquete duckdb)")
+    salida.add_argument("--compression", dest="compresion", choices=["gzip", "zstd"], default=None,
+                        help="Comprimir las tablas (zstd requiere zstandard para CSV)")
+    salida.add_argument("--partition", dest="particiones", action="append", default=None, metavar="TABLA=COLUMNA",
+                        help="Particionar una tabla al estilo Hive, p. ej. EventLog=Fase o HistoricoAdjudicaciones=Ronda (repetible)")
+    salida.add_argument("--binary-eventlog", dest="eventlog_binario", action="store_true", default=None,
+                        help="Escribir también EventLog.evlog (binario de ancho fijo, legible con np.memmap)")
+    calibracion = argparse.ArgumentParser(add_help=False)
+    calibracion.add_argument("--calibrate", dest="calibrar_plazas", action="store_true", default=None,
+                             help="Recalibrar NúmeroPlazas hacia la ocupación y participación objetivo "
+                                  "(por defecto: CALIBRAR_PLAZAS; ver calibracion_plazas.py)")
+
+    generate = subparsers.add_parser("generate", parents=[comun, salida, calibracion], help="Genera el dataset completo")
+    generate.add_argument("--trace-memory", dest="medir_memoria", action="store_true", default=None,
+                          help="Medir el pico de memoria Python por etapa con tracemalloc (más lento)")
+    generate.add_argument("--cache", dest="usar_cache", action="store_true", default=None,
+                          help="Reutilizar las etapas sin cambios desde la caché en disco (requiere --seed; "
+                               "el dataset es el mismo que sin --cache)")
+    generate.add_argument("--cache-dir", default=None, help="Directorio de la caché de etapas (por defecto: RUTA_CACHE)")
+
+    sweep = subparsers.add_parser("sweep", parents=[comun],
+                                  help="Barrido Monte Carlo de la adjudicación (solo escribe el resumen)")
+    sweep.add_argument("--replicas", type=int, default=None, help="Número de réplicas (por defecto: NUM_REPLICAS)")
+
+    cohorts = subparsers.add_parser("cohorts", parents=[comun, salida, calibracion],
+                                    help="Genera varios cursos consecutivos, cada uno en su partición")
+    cohorts.add_argument("--cohorts", type=int, default=None, help="Número de cursos (por defecto: NUM_COHORTES)")
+    cohorts.add_argument("--start-year", type=int, default=None,
+                         help="Año de inicio del primer curso (por defecto: CURSO_INICIAL)")
+
+    lote = subparsers.add_parser("llm-batch", parents=[comun],
+                                 help="Prepara o ingiere un lote de peticiones al LLM para trabajar sin conexión")
+    lote.add_argument("accion", choices=["write", "simulate", "ingest"],
+                      help="write: anota las peticiones pendientes; simulate: genera resultados locales; "
+                           "ingest: carga los resultados en la caché del LLM")
+    lote.add_argument("--requests-file", default=None, help="Fichero JSONL de peticiones (por defecto: RUTA_LOTE_LLM)")
+    lote.add_argument("--results-file", default=None,
+                      help="Fichero JSONL de resultados de la Batch API (por defecto: RUTA_RESULTADOS_LOTE)")
+
+    validar = subparsers.add_parser("validate-db", help="Ejecuta las validaciones de coherencia como SQL sobre la base de datos")
+    validar.add_argument("db", help="Fichero .sqlite o .duckdb generado con --format sqlite|duckdb")
+
+    exportar = subparsers.add_parser("export", help="Exporta un dataset ya generado a XES y/u OCEL 2.0 en streaming")
+    exportar.add_argument("--to", dest="formatos", choices=["xes", "ocel"], action="append", default=None,
+                          help="Formato de exportación (repetible; por defecto: xes y ocel)")
+    exportar.add_argument("--data-dir", default=None, help="Directorio del dataset en CSV (por defecto: RUTA_DATA)")
+    exportar.add_argument("--output-dir", default=None, help="Directorio de salida (por defecto: el del dataset)")
+    exportar.add_argument("--chunk-size", type=int, default=None,
+                          help="Eventos por bloque (por defecto: TAMANO_BLOQUE_EXPORTACION)")
+
+    ampliar = subparsers.add_parser("append", help="Añade estudiantes nuevos a un dataset ya generado, continuando sus IDs")
+    ampliar.add_argument("--students", type=int, required=True, help="Número de estudiantes nuevos")
+    ampliar.add_argument("--data-dir", default=None, help="Directorio del dataset (por defecto: RUTA_DATA)")
+    ampliar.add_argument("--seed", type=int, default=None, help="Semilla aleatoria para resultados reproducibles")
+    ampliar.add_argument("--workers", type=int, default=1, help="Hilos de escritura")
+    ampliar.add_argument("--mode", choices=["clasico", "diferida"], default=None,
+                         help="Modo de adjudicación (por defecto: el guardado en estado_dataset.json)")
+    ampliar.add_argument("--llm", dest="use_llm", action="store_true", default=False,
+                         help="Usar el LLM para los motivos y patrones de los casos nuevos")
+    ampliar.add_argument("--llm-offline", action="store_true", help="Usar el LLM solo desde la caché")
+
+    analizar = subparsers.add_parser("analyze", help="Variantes, grafo de sucesión directa, tiempos por caso y embudos del EventLog")
+    analizar.add_argument("--data-dir", default=None, help="Directorio del dataset (por defecto: RUTA_DATA)")
+    analizar.add_argument("--output-dir", default=None, help="Guarda las tablas de analítica en CSV en este directorio")
+
+    return parser
+
+def resolver_escala(args):
+    """Combina el preset elegido con los valores sobrescritos por argumentos."""
+    preset = dict(PRESETS_ESCALA[args.scale])
+    if args.students is not None:
+        preset["estudiantes"] = args.students
+    if args.destinations is not None:
+        preset["destinos"] = args.destinations
+    return preset
+
+def resolver_particiones(args):
+    """Convierte los --partition TABLA=COLUMNA en el diccionario que espera guardar_tablas."""
+    if args.particiones is None:
+        return None
+    particiones = {}
+    for particion in args.particiones:
+        tabla, separador, columna = particion.partition("=")
+        if not separador or not tabla or not columna:
+            raise SystemExit(f"--partition debe tener la forma TABLA=COLUMNA: {particion}")
+        particiones[tabla] = columna
+    return particiones
+
+def comando_generate(args):
+    import generate_data as gd
+
+    escala = resolver_escala(args)
+    gd.ejecutar_pipeline(
+        num_estudiantes=escala["estudiantes"],
+        num_destinos=escala["destinos"],
+        factor_plazas=escala["factor_plazas"],
+        ruta_data=args.output_dir,
+        semilla=args.seed,
+        formato=args.formato,
+        num_workers=args.workers,
+        use_llm=args.use_llm,
+        modo_adjudicacion=args.mode,
+        medir_memoria=args.medir_memoria,
+        usar_cache=args.usar_cache,
+        ruta_cache=args.cache_dir,
+        compresion=args.compresion,
+        particiones=resolver_particiones(args),
+        eventlog_binario=args.eventlog_binario,
+        calibrar_plazas=args.calibrar_plazas,
+    )
+
+def comando_sweep(args):
+    import generate_data as gd
+    import barrido_montecarlo as bm
+
+    escala = resolver_escala(args)
+    semilla = args.seed if args.seed is not None else 0
+    random.seed(semilla)
+    np.random.seed(semilla)
+
+    with gd.configuracion_temporal(USE_LLM=args.use_llm, FACTOR_PLAZAS=escala["factor_plazas"]):
+        destinos = gd.generar_destinos(escala["destinos"])
+        estudiantes = gd.generar_estudiantes(escala["estudiantes"], destinos)
+        resumen = bm.ejecutar_barrido(
+            destinos, estudiantes,
+            num_replicas=args.replicas or bm.NUM_REPLICAS,
+            num_workers=args.workers,
+            semilla=semilla,
+            modo=args.mode or gd.MODO_ADJUDICACION,
+        )
+    ruta_data = args.output_dir or gd.RUTA_DATA
+    os.makedirs(ruta_data, exist_ok=True)
+    resumen.to_csv(os.path.join(ruta_data, "ResumenMonteCarlo.csv"), index=False)
+    print(f"💾 Resumen guardado en {ruta_data}/ResumenMonteCarlo.csv")
+
+def comando_cohorts(args):
+    import generate_data as gd
+    import cohortes
+
+    escala = resolver_escala(args)
+    with gd.configuracion_temporal(USE_LLM=args.use_llm, FACTOR_PLAZAS=escala["factor_plazas"],
+                                   MODO_ADJUDICACION=args.mode):
+        cohortes.generar_cohortes(
+            num_cohortes=args.cohorts or cohortes.NUM_COHORTES,
+            curso_inicial=args.start_year or cohortes.CURSO_INICIAL,
+            num_estudiantes=escala["estudiantes"],
+            num_destinos=escala["destinos"],
+            ruta_data=args.output_dir,
+            num_workers=args.workers,
+            semilla=args.seed if args.seed is not None else 0,
+            formato=args.formato,
+            compresion=args.compresion,
+            particiones=resolver_particiones(args),
+            eventlog_binario=args.eventlog_binario,
+            calibrar_plazas=args.calibrar_plazas,
+        )
+
+def comando_llm_batch(args):
+    import lote_llm
+
+    ruta_resultados = args.results_file or lote_llm.RUTA_RESULTADOS_LOTE
+    if args.accion == "write":
+        lote_llm.escribir_lote(resolver_escala(args)["destinos"], ruta=args.requests_file)
+    elif args.accion == "simulate":
+        lote_llm.simular_resultados(args.requests_file, ruta_resultados)
+    else:
+        lote_llm.ingerir_resultados(ruta_resultados)
+
+def comando_export(args):
+    import exportacion_eventlog as ex
+    import generate_data as gd
+
+    ex.exportar_dataset(
+        args.data_dir or gd.RUTA_DATA,
+        formatos=args.formatos or ("xes", "ocel"),
+        ruta_salida=args.output_dir,
+        tamano_bloque=args.chunk_size or ex.TAMANO_BLOQUE_EXPORTACION,
+    )
+
+def comando_append(args):
+    import ampliacion
+    ampliacion.ampliar_dataset(
+        ruta_data=args.data_dir,
+        num_estudiantes=args.students,
+        semilla=args.seed,
+        num_workers=args.workers,
+        use_llm=args.use_llm,
+        modo_adjudicacion=args.mode,
+    )
+
+def comando_analyze(args):
+    import analitica
+    import generate_data as gd
+
+    analitica.analizar_dataset(args.data_dir or gd.RUTA_DATA, ruta_salida=args.output_dir)
+
+def comando_validate_db(args):
+    import base_datos
+
+    inconsistencias = base_datos.validar_en_bd(args.db)
+    return 1 if inconsistencias else 0
+
+COMANDOS = {
+    "generate": comando_generate,
+    "sweep": comando_sweep,
+    "cohorts": comando_cohorts,
+    "llm-batch": comando_llm_batch,
+    "export": comando_export,
+    "validate-db": comando_validate_db,
+    "append": comando_append,
+    "analyze": comando_analyze,
+}
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    if getattr(args, "refresh_llm_cache", False):
+        import llm_helpers
+        llm_helpers.REFRESCAR_CACHE_LLM = True
+    if getattr(args, "llm_offline", False):
+        import llm_helpers
+        llm_helpers.MODO_LOTE_LLM = "offline"
+        args.use_llm = True
+    return COMANDOS[args.comando](args) or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+# ---- Esquema de tipos compactos de las tablas generadas ----
+# Se aplica al construir cada tabla: enteros del ancho justo, categóricas para los textos repetidos,
+# Int nullable para los identificadores con huecos y bool para las marcas. Las categóricas de dominio
+# cerrado fijan sus categorías para que las actualizaciones posteriores (p. ej. EstadoFinal) siempre
+# asignen valores válidos; las de dominio abierto (países o motivos del LLM) se infieren de los datos.
+# Las fechas se mantienen como texto 'AAAA-MM-DD[ HH:MM:SS]', que es lo que se escribe en disco.
+ESTADOS_FINALES = ["Aceptado", "Renuncia", "No asignado", "Excluido"]
+
+CATEGORIA = "category"
+ESQUEMA_TABLAS = {
+    "Destinos": {
+        "DestinoID": "int32", "País": CATEGORIA, "NúmeroPlazas": "int16",
+        "Cancelado": pd.CategoricalDtype(["No", "Sí"]), "RequiereIdioma": "bool",
+    },
+    "Estudiantes": {
+        "EstudianteID": "int32", "Grado": CATEGORIA, "Sexo": pd.CategoricalDtype(["F", "M"]),
+        "DestinoSolicitado": "int32", "DestinoAsignado": "Int32",
+        "EstadoFinal": pd.CategoricalDtype(ESTADOS_FINALES),
+    },
+    "Actividades": {
+        "ActividadID": "int8", "Fase": CATEGORIA, "TipoActividad": CATEGORIA,
+        "ActorDefecto": CATEGORIA, "OrdenSecuencial": "int8",
+    },
+    "EventLog": {
+        "EventID": "int32", "EstudianteID": "int32", "ActividadID": "int8", "DestinoID": "int32",
+        "Detalle": CATEGORIA, "Actor": CATEGORIA,
+    },
+    "Alegaciones": {
+        "AlegacionID": "int32", "EstudianteID": "int32", "MotivoAlegacion": CATEGORIA,
+        "ResultadoAlegacion": pd.CategoricalDtype(["Aceptada", "Rechazada"]),
+        "AccionTrasResolucion": pd.CategoricalDtype(["Reasignación", "Confirmación destino inicial", "No cambio"]),
+    },
+    "HistoricoAdjudicaciones": {
+        "AsignacionID": "int32", "EstudianteID": "int32", "DestinoID": "int32",
+        "Ronda": CATEGORIA, "EstadoEnRonda": pd.CategoricalDtype(["Titular", "Suplente"]),
+    },
+    "ReporteGestionPlazas": {
+        "DestinoID": "int32", "NombreDestino": CATEGORIA, "Ronda": CATEGORIA,
+        "PlazasTotales": "int16", "PlazasDisponibles": "int16", "NumTitulares": "int32",
+        "NumSuplentes": "int32", "NumRenuncias": "int32", "TotalCandidatos": "int32",
+        "Competitividad": pd.CategoricalDtype(["Baja", "Media", "Alta"]),
+    },
+}
+VALORES_VERDADEROS = {"True", "true", "Sí", "Si", "1"}
+
+def a_booleano(serie):
+    """Convierte una marca a bool aceptando tanto bool como texto ('Sí'/'No', 'True'/'False')."""
+    if pd.api.types.is_bool_dtype(serie.dtype):
+        return serie
+    return serie.astype(str).str.strip().isin(VALORES_VERDADEROS)
+
+def aplicar_esquema(df, tabla):
+    """
+    Convierte las columnas de `df` presentes en ESQUEMA_TABLAS[tabla] a su tipo compacto. Las columnas
+    que ya lo tienen no se tocan, así que se puede volver a aplicar tras modificar la tabla.
+    """
+    tipos = {
+        columna: tipo for columna, tipo in ESQUEMA_TABLAS[tabla].items()
+        if columna in df.columns and df[columna].dtype != tipo
+    }
+    if not tipos:
+        return df
+    df = df.copy()
+    for columna, tipo in tipos.items():
+        df[columna] = a_booleano(df[columna]) if tipo == "bool" else df[columna].astype(tipo)
+    return df
+
+def _bytes_por_defecto(serie):
+    """
+    Bytes que ocuparía la columna con los tipos por defecto de pandas (int64, float64 con NaN, objetos
+    str), calculados sin materializarla: para una categórica basta contar cuántas veces aparece cada valor.
+    """
+    dtype = serie.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        codigos = serie.cat.codes.to_numpy()
+        tamanos = np.array([sys.getsizeof(c) for c in dtype.categories], dtype=np.int64)
+        conteos = np.bincount(codigos[codigos >= 0], minlength=len(tamanos))
+        return 8 * len(serie) + int(conteos @ tamanos) + int((codigos < 0).sum()) * sys.getsizeof(np.nan)
+    if pd.api.types.is_integer_dtype(dtype):
+        return 8 * len(serie)
+    return int(serie.memory_usage(deep=True, index=False))
+
+def memoria_mb(df, por_defecto=False):
+    """Memoria de `df` en MB con sus tipos actuales o, con `por_defecto`, con los tipos por defecto."""
+    if por_defecto:
+        total = df.index.memory_usage() + sum(_bytes_por_defecto(df[c]) for c in df.columns)
+    else:
+        total = df.memory_usage(deep=True).sum()
+    return total / (1024 * 1024)
+
+def informe_memoria(tablas):
+    """
+    Compara la memoria de cada tabla {nombre: DataFrame} con el esquema compacto y con los tipos por
+    defecto. Devuelve {tabla: {"antes_mb", "despues_mb"}} más el total.
+    """
+    informe = {}
+    for nombre, df in tablas.items():
+        informe[nombre] = {"antes_mb": round(memoria_mb(df, por_defecto=True), 2), "despues_mb": round(memoria_mb(df), 2)}
+    informe["Total"] = {clave: round(sum(t[clave] for t in informe.values()), 2) for clave in ("antes_mb", "despues_mb")}
+
+    print("📉 Memoria de las tablas (tipos por defecto -> esquema compacto):")
+    for nombre, valores in informe.items():
+        antes, despues = valores["antes_mb"], valores["despues_mb"]
+        factor = f" ({antes / despues:.1f}x)" if despues else ""
+        print(f"   📋 {nombre}: {antes:.2f} MB -> {despues:.2f} MB{factor}")
+    return informe
@@ -0,0 +1,113 @@
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+
+# ---- Formato binario del EventLog (.evlog) ----
+# [MAGIA (8 bytes)][versión uint32][longitud de la cabecera uint32][cabecera JSON][relleno][columnas]
+# Cada columna es un array de ancho fijo, little-endian y alineado a ALINEACION bytes, de modo que el
+# lector puede mapearla con np.memmap sin copiarla. Detalle y Actor se guardan como códigos de diccionario.
+MAGIA = b"ERASEVLG"
+VERSION_FORMATO = 1
+ALINEACION = 64
+EXTENSION_BINARIA = "evlog"
+COLUMNAS_NUMERICAS = ["EventID", "EstudianteID", "ActividadID", "DestinoID"]
+COLUMNAS_DICCIONARIO = ["Detalle", "Actor"]
+COLUMNAS_EVENTLOG = ["EventID", "EstudianteID", "ActividadID", "Timestamp", "DestinoID", "Detalle", "Actor"]
+FORMATO_TIMESTAMP = "%Y-%m-%d %H:%M:%S"
+
+def _dtype_minimo(valores):
+    """Entero sin signo más pequeño que representa todos los valores (con signo si hay negativos)."""
+    if len(valores) == 0:
+        return np.dtype("<u1")
+    minimo, maximo = int(valores.min()), int(valores.max())
+    candidatos = ("<u1", "<u2", "<u4", "<u8") if minimo >= 0 else ("<i1", "<i2", "<i4", "<i8")
+    for candidato in candidatos:
+        limites = np.iinfo(candidato)
+        if limites.min <= minimo and maximo <= limites.max:
+            return np.dtype(candidato)
+    raise ValueError(f"Valores fuera de rango para un entero de 64 bits: {minimo}..{maximo}")
+
+def _alinear(posicion):
+    return -(-posicion // ALINEACION) * ALINEACION
+
+def escribir_eventlog_binario(eventlog_df, ruta):
+    """
+    Escribe el EventLog en formato .evlog: EventID, EstudianteID, ActividadID y DestinoID con el ancho
+    mínimo necesario, Timestamp como segundos desde epoch (int64) y Detalle/Actor codificados con
+    diccionario. Devuelve la ruta escrita.
+    """
+    columnas = {}
+    for columna in COLUMNAS_NUMERICAS:
+        valores = eventlog_df[columna].to_numpy(dtype=np.int64)
+        columnas[columna] = valores.astype(_dtype_minimo(valores))
+    instantes = pd.to_datetime(eventlog_df["Timestamp"], format=FORMATO_TIMESTAMP)
+    columnas["Timestamp"] = (instantes.to_numpy().astype("datetime64[s]").view("<i8"))
+
+    diccionarios = {}
+    for columna in COLUMNAS_DICCIONARIO:
+        codigos, valores = pd.factorize(eventlog_df[columna].astype(str), sort=True)
+        diccionarios[columna] = valores.tolist()
+        columnas[columna] = codigos.astype(_dtype_minimo(np.array([0, max(len(valores) - 1, 0)])))
+
+    # La cabecera necesita los offsets y estos dependen de su longitud: se reserva un tamaño fijo por columna
+    descripcion = {c: {"dtype": v.dtype.str, "offset": 0} for c, v in columnas.items()}
+    cabecera = {"eventos": len(eventlog_df), "columnas": descripcion, "diccionarios": diccionarios}
+    longitud = len(json.dumps(cabecera, ensure_ascii=False).encode()) + 32 * len(columnas)
+    posicion = _alinear(len(MAGIA) + 8 + longitud)
+    for columna, valores in columnas.items():
+        descripcion[columna]["offset"] = posicion
+        posicion = _alinear(posicion + valores.nbytes)
+    texto = json.dumps(cabecera, ensure_ascii=False).encode().ljust(longitud)
+
+    with open(ruta, "wb") as f:
+        f.write(MAGIA + struct.pack("<II", VERSION_FORMATO, longitud) + texto)
+        for columna, valores in columnas.items():
+            f.seek(descripcion[columna]["offset"])
+            f.write(np.ascontiguousarray(valores).tobytes())
+        f.truncate(posicion)
+    return ruta
+
+def leer_eventlog_binario(ruta):
+    """
+    Abre un .evlog sin leer sus datos: devuelve {"eventos": n, "diccionarios": {...}, columna: np.memmap}.
+    Cada columna es una vista de solo lectura del fichero; el sistema carga solo las páginas que se usan.
+    """
+    with open(ruta, "rb") as f:
+        magia = f.read(len(MAGIA))
+        if magia != MAGIA:
+            raise ValueError(f"{ruta} no es un EventLog binario (.{EXTENSION_BINARIA})")
+        version, longitud = struct.unpack("<II", f.read(8))
+        if version != VERSION_FORMATO:
+            raise ValueError(f"Versión de formato no soportada: {version} (se esperaba {VERSION_FORMATO})")
+        cabecera = json.loads(f.read(longitud).decode())
+
+    eventlog = {"eventos": cabecera["eventos"], "diccionarios": cabecera["diccionarios"]}
+    for columna, descripcion in cabecera["columnas"].items():
+        eventlog[columna] = np.memmap(ruta, dtype=np.dtype(descripcion["dtype"]), mode="r",
+                                      offset=descripcion["offset"], shape=(cabecera["eventos"],))
+    return eventlog
+
+def instantes(eventlog):
+    """Timestamp del .evlog como datetime64[s], sin copiar los datos."""
+    return eventlog["Timestamp"].view("datetime64[s]")
+
+def a_dataframe(eventlog, columnas=None, inicio=0, fin=None):
+    """
+    Materializa (parte de) un .evlog como DataFrame con las mismas columnas que EventLog.csv. Detalle y
+    Actor se devuelven como categóricas sobre su diccionario y Timestamp como datetime64.
+    """
+    columnas = columnas or COLUMNAS_EVENTLOG
+    tramo = slice(inicio, fin)
+    datos = {}
+    for columna in columnas:
+        if columna == "Timestamp":
+            datos[columna] = pd.to_datetime(instantes(eventlog)[tramo])
+        elif columna in COLUMNAS_DICCIONARIO:
+            datos[columna] = pd.Categorical.from_codes(
+                np.asarray(eventlog[columna][tramo], dtype=np.int64), categories=eventlog["diccionarios"][columna]
+            )
+        else:
+            datos[columna] = np.asarray(eventlog[columna][tramo])
+    return pd.DataFrame(datos)
@@ -0,0 +1,269 @@
+import glob
+import gzip
+import json
+import os
+
+import pandas as pd
+
+from eventlog_binario import EXTENSION_BINARIA, a_dataframe, leer_eventlog_binario
+
+# ---- Configuración de la exportación ----
+TAMANO_BLOQUE_EXPORTACION = 500_000  # Eventos por bloque al leer o recorrer el EventLog
+TIEMPO_ATRIBUTOS_ESTATICOS = "1970-01-01T00:00:00"  # Convención OCEL 2.0 para atributos sin evolución temporal
+ACTIVIDADES_ALEGACION = {7, 8, 9}
+
+# Las exportaciones se escriben evento a evento sobre el fichero (sin DOM ni lista de eventos en memoria):
+# la memoria depende del tamaño de bloque y de las tablas de objetos, no del número de eventos.
+
+def _abrir_salida(ruta):
+    """Abre el fichero de salida en texto, comprimido con gzip si termina en .gz."""
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    if ruta.endswith(".gz"):
+        return gzip.open(ruta, "wt", encoding="utf-8", compresslevel=6)
+    return open(ruta, "w", encoding="utf-8")
+
+def _leer_tabla(fuente):
+    """Acepta un DataFrame o la ruta de un CSV (comprimido o no)."""
+    return fuente if isinstance(fuente, pd.DataFrame) else pd.read_csv(fuente)
+
+def bloques_eventlog(fuente, tamano_bloque=TAMANO_BLOQUE_EXPORTACION):
+    """
+    Recorre el EventLog por bloques, desde el DataFrame generado, desde un EventLog.evlog (mapeado en
+    memoria) o desde un CSV sin cargarlo entero.
+    """
+    if isinstance(fuente, pd.DataFrame):
+        for inicio in range(0, len(fuente), tamano_bloque):
+            yield fuente.iloc[inicio:inicio + tamano_bloque]
+    elif str(fuente).endswith(f".{EXTENSION_BINARIA}"):
+        eventlog = leer_eventlog_binario(fuente)
+        for inicio in range(0, eventlog["eventos"], tamano_bloque):
+            yield a_dataframe(eventlog, inicio=inicio, fin=inicio + tamano_bloque)
+    else:
+        yield from pd.read_csv(fuente, chunksize=tamano_bloque)
+
+def ruta_tabla(ruta_data, nombre):
+    """
+    Ruta del CSV de una tabla en un dataset (EventLog.csv, EventLog.csv.gz...). Falla si hay varias
+    versiones de la tabla (p. ej. .csv y .csv.gz, o además un directorio particionado).
+    """
+    candidatas = sorted(glob.glob(os.path.join(ruta_data, f"{nombre}.csv*")))
+    particionada = os.path.isdir(os.path.join(ruta_data, nombre))
+    if not candidatas:
+        if particionada:
+            raise ValueError(f"{nombre} está particionada; la exportación necesita la tabla sin particionar")
+        raise FileNotFoundError(f"No se encontró {nombre}.csv en {ruta_data}")
+    if len(candidatas) > 1 or particionada:
+        versiones = [os.path.basename(c) for c in candidatas] + ([f"{nombre}/"] if particionada else [])
+        raise ValueError(f"Hay varias versiones de {nombre} en {ruta_data} ({', '.join(versiones)}); "
+                         "borra las obsoletas o vuelve a generar el dataset")
+    return candidatas[0]
+
+def _escapar_xml(serie):
+    """Escapa una columna de texto para usarla como valor de atributo XML."""
+    return (
+        serie.astype(str)
+        .str.replace("&", "&amp;", regex=False)
+        .str.replace("<", "&lt;", regex=False)
+        .str.replace(">", "&gt;", regex=False)
+        .str.replace('"', "&quot;", regex=False)
+    )
+
+def _instantes_iso(serie):
+    """'2022-11-01 23:52:00' -> '2022-11-01T23:52:00' (xs:dateTime / ISO 8601)."""
+    return serie.astype(str).str.replace(" ", "T", n=1, regex=False)
+
+def _texto_json(serie):
+    """Serializa una columna de texto a literales JSON, una vez por valor distinto (Detalle y Actor se repiten mucho)."""
+    literales = {valor: json.dumps(str(valor), ensure_ascii=False) for valor in serie.unique()}
+    return serie.map(literales)
+
+def _comprobar_orden(caso, caso_anterior):
+    if caso_anterior is not None and caso < caso_anterior:
+        raise ValueError(f"El EventLog debe estar agrupado por EstudianteID en orden creciente (caso {caso} tras {caso_anterior})")
+
+CABECERA_XES = """<?xml version="1.0" encoding="UTF-8"?>
+<log xes.version="1849-2016" xes.features="nested-attributes" xmlns="http://www.xes-standard.org/">
+\t<extension name="Concept" prefix="concept" uri="http://www.xes-standard.org/concept.xesext"/>
+\t<extension name="Time" prefix="time" uri="http://www.xes-standard.org/time.xesext"/>
+\t<extension name="Organizational" prefix="org" uri="http://www.xes-standard.org/org.xesext"/>
+\t<extension name="Lifecycle" prefix="lifecycle" uri="http://www.xes-standard.org/lifecycle.xesext"/>
+\t<global scope="trace">
+\t\t<string key="concept:name" value="__INVALID__"/>
+\t</global>
+\t<global scope="event">
+\t\t<string key="concept:name" value="__INVALID__"/>
+\t\t<date key="time:timestamp" value="1970-01-01T00:00:00"/>
+\t\t<string key="lifecycle:transition" value="complete"/>
+\t</global>
+\t<classifier name="Actividad" keys="concept:name"/>
+\t<string key="concept:name" value="Proceso Erasmus"/>
+"""
+
+def exportar_xes(eventlog, actividades, ruta, tamano_bloque=TAMANO_BLOQUE_EXPORTACION):
+    """
+    Escribe el EventLog en XES con una traza por EstudianteID, en streaming. `eventlog` puede ser el
+    DataFrame generado o la ruta de EventLog.csv; debe estar agrupado por estudiante (como lo genera
+    generar_eventlog). Devuelve (trazas, eventos) escritos.
+    """
+    actividades = _leer_tabla(actividades)
+    nombres = dict(zip(actividades["ActividadID"], _escapar_xml(actividades["NombreActividad"])))
+    fases = dict(zip(actividades["ActividadID"], _escapar_xml(actividades["Fase"])))
+    trazas, eventos, caso_anterior = 0, 0, None
+
+    with _abrir_salida(ruta) as f:
+        f.write(CABECERA_XES)
+        for bloque in bloques_eventlog(eventlog, tamano_bloque):
+            columnas = zip(
+                bloque["EstudianteID"].to_numpy(), bloque["EventID"].to_numpy(), bloque["ActividadID"].to_numpy(),
+                _instantes_iso(bloque["Timestamp"]), bloque["DestinoID"].to_numpy(),
+                _escapar_xml(bloque["Detalle"]), _escapar_xml(bloque["Actor"]),
+            )
+            lineas = []
+            for caso, evento_id, actividad, instante, destino, detalle, actor in columnas:
+                if caso != caso_anterior:
+                    _comprobar_orden(caso, caso_anterior)
+                    if caso_anterior is not None:
+                        lineas.append("\t</trace>\n")
+                    lineas.append(f'\t<trace>\n\t\t<string key="concept:name" value="{caso}"/>\n')
+                    caso_anterior = caso
+                    trazas += 1
+                lineas.append(
+                    f'\t\t<event>\n'
+                    f'\t\t\t<string key="concept:name" value="{nombres.get(actividad, actividad)}"/>\n'
+                    f'\t\t\t<date key="time:timestamp" value="{instante}"/>\n'
+                    f'\t\t\t<string key="org:resource" value="{actor}"/>\n'
+                    f'\t\t\t<string key="lifecycle:transition" value="complete"/>\n'
+                    f'\t\t\t<int key="EventID" value="{evento_id}"/>\n'
+                    f'\t\t\t<int key="ActividadID" value="{actividad}"/>\n'
+                    f'\t\t\t<string key="Fase" value="{fases.get(actividad, "")}"/>\n'
+                    f'\t\t\t<int key="DestinoID" value="{destino}"/>\n'
+                    f'\t\t\t<string key="Detalle" value="{detalle}"/>\n'
+                    f'\t\t</event>\n'
+                )
+            eventos += len(bloque)
+            f.write("".join(lineas))
+        if caso_anterior is not None:
+            f.write("\t</trace>\n")
+        f.write("</log>\n")
+
+    print(f"📤 XES exportado en {ruta}: {trazas} trazas, {eventos} eventos")
+    return trazas, eventos
+
+def _atributos_estaticos(fila, columnas):
+    return [
+        {"name": columna, "time": TIEMPO_ATRIBUTOS_ESTATICOS, "value": fila[columna]}
+        for columna in columnas if not pd.isna(fila[columna])
+    ]
+
+def _objetos_ocel(estudiantes, destinos, alegaciones):
+    """Objetos OCEL (estudiantes, destinos y alegaciones) con sus atributos y relaciones entre objetos."""
+    for fila in destinos.to_dict("records"):
+        yield {
+            "id": f"dest-{fila['DestinoID']}", "type": "Destino",
+            "attributes": _atributos_estaticos(fila, ["NombreDestino", "País", "NúmeroPlazas", "Cancelado", "RequiereIdioma"]),
+        }
+    for fila in estudiantes.to_dict("records"):
+        relaciones = [{"objectId": f"dest-{int(fila['DestinoSolicitado'])}", "qualifier": "solicita"}]
+        if not pd.isna(fila["DestinoAsignado"]):
+            relaciones.append({"objectId": f"dest-{int(fila['DestinoAsignado'])}", "qualifier": "asignado"})
+        yield {
+            "id": f"est-{fila['EstudianteID']}", "type": "Estudiante",
+            "attributes": _atributos_estaticos(fila, ["Grado", "Sexo", "Expediente", "EstadoFinal"]),
+            "relationships": relaciones,
+        }
+    for fila in alegaciones.to_dict("records"):
+        yield {
+            "id": f"aleg-{fila['AlegacionID']}", "type": "Alegacion",
+            "attributes": _atributos_estaticos(fila, ["MotivoAlegacion", "ResultadoAlegacion", "AccionTrasResolucion"]),
+            "relationships": [{"objectId": f"est-{fila['EstudianteID']}", "qualifier": "presentada_por"}],
+        }
+
+def exportar_ocel(eventlog, actividades, estudiantes, destinos, alegaciones, ruta,
+                  tamano_bloque=TAMANO_BLOQUE_EXPORTACION):
+    """
+    Escribe un OCEL 2.0 (JSON) con estudiantes, destinos y alegaciones como objetos. Las tablas de
+    objetos se cargan enteras; los eventos se recorren por bloques y se escriben uno a uno.
+    Devuelve (objetos, eventos) escritos.
+    """
+    actividades, estudiantes = _leer_tabla(actividades), _leer_tabla(estudiantes)
+    destinos, alegaciones = _leer_tabla(destinos), _leer_tabla(alegaciones)
+    nombres = dict(zip(actividades["ActividadID"], actividades["NombreActividad"]))
+    alegacion_por_estudiante = dict(zip(alegaciones["EstudianteID"], alegaciones["AlegacionID"]))
+
+    tipos_objeto = [
+        {"name": "Estudiante", "attributes": [{"name": c, "type": t} for c, t in
+                                              [("Grado", "string"), ("Sexo", "string"), ("Expediente", "float"), ("EstadoFinal", "string")]]},
+        {"name": "Destino", "attributes": [{"name": c, "type": t} for c, t in
+                                           [("NombreDestino", "string"), ("País", "string"), ("NúmeroPlazas", "integer"),
+                                            ("Cancelado", "string"), ("RequiereIdioma", "boolean")]]},
+        {"name": "Alegacion", "attributes": [{"name": c, "type": "string"} for c in
+                                             ["MotivoAlegacion", "ResultadoAlegacion", "AccionTrasResolucion"]]},
+    ]
+    tipos_evento = [
+        {"name": nombre, "attributes": [{"name": "Detalle", "type": "string"}, {"name": "Actor", "type": "string"},
+                                        {"name": "ActividadID", "type": "integer"}]}
+        for nombre in actividades["NombreActividad"]
+    ]
+
+    def volcar(valor):
+        return json.dumps(valor, ensure_ascii=False, default=lambda v: v.item() if hasattr(v, "item") else str(v))
+
+    objetos, eventos = 0, 0
+    with _abrir_salida(ruta) as f:
+        f.write(f'{{\n"objectTypes": {volcar(tipos_objeto)},\n"eventTypes": {volcar(tipos_evento)},\n"objects": [\n')
+        for objeto in _objetos_ocel(estudiantes, destinos, alegaciones):
+            f.write((",\n" if objetos else "") + volcar(objeto))
+            objetos += 1
+        f.write('\n],\n"events": [\n')
+
+        tipos_json = {actividad: volcar(nombre) for actividad, nombre in nombres.items()}
+        for bloque in bloques_eventlog(eventlog, tamano_bloque):
+            columnas = zip(
+                bloque["EventID"].to_numpy(), bloque["EstudianteID"].to_numpy(), bloque["ActividadID"].to_numpy(),
+                _instantes_iso(bloque["Timestamp"]), bloque["DestinoID"].to_numpy(),
+                _texto_json(bloque["Detalle"]), _texto_json(bloque["Actor"]),
+            )
+            lineas = []
+            for evento_id, caso, actividad, instante, destino, detalle, actor in columnas:
+                # Plantilla en lugar de json.dumps por evento: los textos ya vienen serializados
+                alegacion = (
+                    f', {{"objectId": "aleg-{alegacion_por_estudiante[caso]}", "qualifier": "alegacion"}}'
+                    if actividad in ACTIVIDADES_ALEGACION and caso in alegacion_por_estudiante else ""
+                )
+                lineas.append(
+                    f'{{"id": "e{evento_id}", "type": {tipos_json.get(actividad) or volcar(str(actividad))}, "time": "{instante}", '
+                    f'"attributes": [{{"name": "Detalle", "value": {detalle}}}, {{"name": "Actor", "value": {actor}}}, '
+                    f'{{"name": "ActividadID", "value": {actividad}}}], '
+                    f'"relationships": [{{"objectId": "est-{caso}", "qualifier": "estudiante"}}, '
+                    f'{{"objectId": "dest-{destino}", "qualifier": "destino"}}{alegacion}]}}'
+                )
+            if lineas:
+                f.write((",\n" if eventos else "") + ",\n".join(lineas))
+            eventos += len(lineas)
+        f.write("\n]\n}\n")
+
+    print(f"📤 OCEL 2.0 exportado en {ruta}: {objetos} objetos, {eventos} eventos")
+    return objetos, eventos
+
+def exportar_dataset(ruta_data, formatos=("xes", "ocel"), ruta_salida=None, tamano_bloque=TAMANO_BLOQUE_EXPORTACION):
+    """
+    Exporta un dataset ya escrito en CSV a XES y/u OCEL 2.0, leyendo el EventLog por bloques (de
+    EventLog.evlog si está al día con la tabla).
+    """
+    from ampliacion import ruta_eventlog_binario
+    ruta_salida = ruta_salida or ruta_data
+    eventlog = ruta_eventlog_binario(ruta_data) or ruta_tabla(ruta_data, "EventLog")
+    actividades = ruta_tabla(ruta_data, "Actividades")
+    rutas = []
+    if "xes" in formatos:
+        ruta = os.path.join(ruta_salida, "EventLog.xes.gz")
+        exportar_xes(eventlog, actividades, ruta, tamano_bloque)
+        rutas.append(ruta)
+    if "ocel" in formatos:
+        ruta = os.path.join(ruta_salida, "EventLog.ocel.json")
+        exportar_ocel(eventlog, actividades, ruta_tabla(ruta_data, "Estudiantes"), ruta_tabla(ruta_data, "Destinos"),
+                      ruta_tabla(ruta_data, "Alegaciones"), ruta, tamano_bloque)
+        rutas.append(ruta)
+    return rutas
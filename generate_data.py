@@ -1,22 +1,53 @@
+from time import perf_counter
+_INICIO_CARGA = perf_counter()  # Tiempo de arranque (importaciones) que se incluye en el informe de ejecución
 import os
+import glob
+import json
+import bisect
+import heapq
+from collections import Counter
+from contextlib import contextmanager
+import shutil
 import random
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta, time
 
-from llm_helpers import get_universities, get_alegation_motives, get_process_patterns
+from analitica import analizar_eventlog, imprimir_resumen
+from base_datos import MOTORES_BD, NOMBRE_BD, anexar_en_bd, guardar_en_bd
+from cache_etapas import activar_cache, cache_activa, desactivar_cache, en_cache, etapa
+from conformidad import verificar_conformidad_eventlog
+from esquema import aplicar_esquema, informe_memoria
+from eventlog_binario import EXTENSION_BINARIA, escribir_eventlog_binario
+from instrumentacion import anotar_informe, ejecutar_etapa, guardar_informe, iniciar_ejecucion
+from llm_helpers import avisar_relleno, fallback_universities, iniciar_precarga, limpiar_nombres, obtener_llm
+SEGUNDOS_CARGA = perf_counter() - _INICIO_CARGA
 
 # ---- Configuración general ----
 NUM_ESTUDIANTES = 3231
 NUM_DESTINOS = 400  # Aumentamos destinos para tener ~2000 plazas (400 destinos * ~5 plazas promedio)
 PCT_ESTUDIANTES_CON_ALEGACIONES = 0.175
 RUTA_DATA = "data"
+RUTA_CACHE = ".cache_etapas"
 USE_LLM = True  # <<--- Activamos o desactivamos llamadas a LLM
-
-# Creamos carpeta data si no existe
-os.makedirs(RUTA_DATA, exist_ok=True)
+MODO_ADJUDICACION = "clasico"  # "clasico" (destino único + reasignación) o "diferida" (preferencias + aceptación diferida)
+CALIBRAR_PLAZAS = False  # Ajusta FACTOR_PLAZAS/TRAMOS_PLAZAS a una ocupación y participación objetivo (ver calibracion_plazas.py)
+USAR_CACHE = False  # Reutiliza en disco las etapas cuyo código, parámetros, entradas y semilla no han cambiado (ver cache_etapas.py)
+
+# ---- Distribución de plazas por destino activo: (mínimo, máximo, probabilidad) ----
+# Con 400 destinos activos (~95%) y ~5.3 plazas promedio aproximamos 2000 plazas totales
+TRAMOS_PLAZAS = [
+    (1, 2, 0.15),   # Destinos pequeños
+    (3, 3, 0.20),   # Destinos medianos
+    (4, 5, 0.25),   # Destinos grandes
+    (6, 7, 0.25),   # Destinos muy grandes
+    (8, 10, 0.15),  # Destinos excepcionales
+]
+FACTOR_PLAZAS = 1.0  # Escala aplicada al número de plazas de cada tramo
 
 # ---- Plazos Clave (Curso 23-24) ----
+ANIO_CURSO_BASE = 2022  # Año de inicio del calendario plantilla (PLAZOS y FECHAS_PUBLICACION)
 PLAZOS = {
     4: (datetime(2022, 11, 2), datetime(2022, 11, 30)),    # Inscripción
     7: (datetime(2022, 12, 12), datetime(2022, 12, 27)),   # Alegación
@@ -92,11 +123,35 @@ def generar_timestamp_en_plazo(inicio_plazo, fin_plazo, fecha_evento_anterior):
 
 # ---- Funciones para generar datos ----
 
-def generar_destinos(num_destinos):
+def elegir_plazas(tramos_plazas=None, factor_plazas=None):
+    """Elegimos el número de plazas de un destino activo según los tramos y el factor de escala."""
+    tramos_plazas = TRAMOS_PLAZAS if tramos_plazas is None else tramos_plazas
+    factor_plazas = FACTOR_PLAZAS if factor_plazas is None else factor_plazas
+
+    rand_plazas = random.random()
+    peso_total = sum(p for _, _, p in tramos_plazas)
+    acumulado = 0.0
+    for minimo, maximo, probabilidad in tramos_plazas:
+        acumulado += probabilidad / peso_total
+        if rand_plazas < acumulado:
+            break
+    plazas = minimo if minimo == maximo else random.randint(minimo, maximo)
+
+    if factor_plazas != 1.0:
+        plazas = max(1, int(round(plazas * factor_plazas)))
+    return plazas
+
+def generar_destinos(num_destinos, tramos_plazas=None, factor_plazas=None):
     if USE_LLM:
         print("🔄 Obteniendo universidades y países desde el LLM...")
-        universidades_con_pais = get_universities(num_destinos) # [(nombre, pais), ...]
+        universidades_con_pais = obtener_llm("universidades", num_destinos) # [(nombre, pais), ...]
         print(f"✅ LLM generó {len(universidades_con_pais)} universidades.")
+        if len(universidades_con_pais) < num_destinos:
+            # Completamos con nombres genéricos en lugar de reducir el catálogo
+            faltan = num_destinos - len(universidades_con_pais)
+            avisar_relleno("universidades", faltan, num_destinos)
+            anotar_informe("universidades_genericas", faltan)
+            universidades_con_pais = universidades_con_pais + fallback_universities(faltan)
     else:
         # Mantenemos la generación genérica si no se usa LLM
         paises_fallback = ["Italia", "Alemania", "Francia", "Polonia", "Portugal", "Países Bajos", "Suecia", "Noruega", "Austria", "Suiza", "Dinamarca"]
@@ -120,25 +175,14 @@ def generar_destinos(num_destinos):
         if cancelado_bool:
             plazas = 0  # Destinos cancelados no tienen plazas disponibles
         else:
-            # Distribución más controlada de plazas para aproximar 2000 plazas totales
-            # Con 400 destinos activos (~95%), necesitamos ~5.3 plazas promedio
-            rand_plazas = random.random()
-            if rand_plazas < 0.15:      # 15% con 1-2 plazas (destinos pequeños)
-                plazas = random.randint(1, 2)
-            elif rand_plazas < 0.35:    # 20% con 3 plazas (destinos medianos)
-                plazas = 3
-            elif rand_plazas < 0.60:    # 25% con 4-5 plazas (destinos grandes)
-                plazas = random.randint(4, 5)
-            elif rand_plazas < 0.85:    # 25% con 6-7 plazas (destinos muy grandes)
-                plazas = random.randint(6, 7)
-            else:                       # 15% con 8-10 plazas (destinos excepcionales)
-                plazas = random.randint(8, 10)
+            # Distribución controlada de plazas por tramos (ver TRAMOS_PLAZAS)
+            plazas = elegir_plazas(tramos_plazas, factor_plazas)
         
         # Establecemos fecha de cancelación ANTES del listado provisional (si está cancelado)
         fecha_cancelacion = ""
         if cancelado_bool:
-            inicio_solicitudes = datetime(2022, 11, 2)
-            pub_provisional = datetime(2022, 12, 12)
+            inicio_solicitudes = PLAZOS[4][0]
+            pub_provisional = datetime.combine(FECHAS_PUBLICACION[6].date(), time())
             delta_cancelacion = pub_provisional - inicio_solicitudes
             # Nos aseguramos de que el rango para randint es válido
             if delta_cancelacion.days > 16:
@@ -154,17 +198,22 @@ def generar_destinos(num_destinos):
         
         destinos.append([i, nombre, pais, plazas, cancelado, fecha_cancelacion, requiere_idioma])
     
-    # Mostramos advertencia si el número generado es menor que el solicitado
-    if len(universidades_con_pais) < num_destinos:
-        print(f"⚠️ Advertencia: Se solicitaron {num_destinos} destinos, pero solo se generaron {len(universidades_con_pais)}. Usaremos solo los generados.")
-        
-    return pd.DataFrame(
+    return aplicar_esquema(pd.DataFrame(
         destinos,
         columns=[
             "DestinoID", "NombreDestino", "País", "NúmeroPlazas",
             "Cancelado", "FechaCancelación", "RequiereIdioma"
         ]
-    )
+    ), "Destinos")
+
+def normalizar_nombres_destinos(destinos_df):
+    """
+    Quita la numeración ("1. ", "2) ", "- ") y los espacios sobrantes de NombreDestino (ver
+    llm_helpers.limpiar_nombres), antes de que el catálogo se use en reportes o se escriba en disco.
+    """
+    destinos_df = destinos_df.copy()
+    destinos_df['NombreDestino'] = limpiar_nombres(destinos_df['NombreDestino'].astype(str))
+    return destinos_df
 
 def generar_estudiantes(num_estudiantes, destinos_df):
     estudiantes = []
@@ -199,6 +248,10 @@ def generar_estudiantes(num_estudiantes, destinos_df):
         else:
             # Destino no cancelado, siempre disponible
             destinos_disponibles_por_fecha[destino_id] = None
+    # La lista de destinos disponibles solo cambia en cada fecha de cancelación: se calcula una vez por
+    # tramo entre fechas (clave = cancelaciones ya ocurridas) en lugar de recorrer los destinos por estudiante
+    fechas_cancelacion = sorted({f for f in destinos_disponibles_por_fecha.values() if f is not None})
+    disponibles_por_tramo = {}
 
     for i in range(1, num_estudiantes + 1):
         # Elegimos grado según la ponderación
@@ -212,10 +265,13 @@ def generar_estudiantes(num_estudiantes, destinos_df):
         fecha_solicitud = fecha_solicitud_dt.strftime('%Y-%m-%d')
         
         # CORRECCIÓN: Seleccionar destino que esté disponible en la fecha de solicitud
-        destinos_disponibles = []
-        for destino_id, fecha_cancelacion in destinos_disponibles_por_fecha.items():
-            if fecha_cancelacion is None or fecha_solicitud_dt < fecha_cancelacion:
-                destinos_disponibles.append(destino_id)
+        tramo = bisect.bisect_right(fechas_cancelacion, fecha_solicitud_dt)
+        if tramo not in disponibles_por_tramo:
+            disponibles_por_tramo[tramo] = [
+                destino_id for destino_id, fecha_cancelacion in destinos_disponibles_por_fecha.items()
+                if fecha_cancelacion is None or fecha_solicitud_dt < fecha_cancelacion
+            ]
+        destinos_disponibles = disponibles_por_tramo[tramo]
         
         if not destinos_disponibles:
             # Fallback: usar todos los destinos si no hay disponibles
@@ -233,7 +289,8 @@ def generar_estudiantes(num_estudiantes, destinos_df):
             destino_asignado = destino_solicitado if random.random() < 0.85 else random.choice(destinos_disponibles)
 
         estudiantes.append([i, grado, sexo, expediente, fecha_solicitud, destino_solicitado, destino_asignado, estado_final])
-    return pd.DataFrame(estudiantes, columns=["EstudianteID", "Grado", "Sexo", "Expediente", "FechaSolicitud", "DestinoSolicitado", "DestinoAsignado", "EstadoFinal"])
+    estudiantes_df = pd.DataFrame(estudiantes, columns=["EstudianteID", "Grado", "Sexo", "Expediente", "FechaSolicitud", "DestinoSolicitado", "DestinoAsignado", "EstadoFinal"])
+    return aplicar_esquema(estudiantes_df, "Estudiantes")
 
 def generar_actividades():
     actividades = [
@@ -291,7 +348,8 @@ def generar_actividades():
         # (Original 34 -> Nuevo 33). El orden 9 indica que puede ocurrir alrededor de las adjudicaciones.
         (33, "Cancelación Plaza (Admin)", "Cancelación", "Automática", "SEVIUS", 9)
     ]
-    return pd.DataFrame(actividades, columns=["ActividadID", "NombreActividad", "Fase", "TipoActividad", "ActorDefecto", "OrdenSecuencial"])
+    actividades_df = pd.DataFrame(actividades, columns=["ActividadID", "NombreActividad", "Fase", "TipoActividad", "ActorDefecto", "OrdenSecuencial"])
+    return aplicar_esquema(actividades_df, "Actividades")
 
 def generar_bucles_la_dinamicos():
     """
@@ -374,8 +432,65 @@ def aplicar_bucles_la_a_ruta(ruta_base):
         # Si hay error, devolver ruta original
         return ruta_base
 
+# ---- Estadísticas de rutas recogidas durante la generación del EventLog ----
+ACTIVIDADES_RECHAZO_LA = (26, 30)
+COLUMNAS_RESUMEN_RUTAS = [
+    "VarianteID", "Casos", "Porcentaje", "Longitud", "CasosBucleLA", "RechazosLA",
+    "DuracionMediaDias", "DuracionMinDias", "DuracionMaxDias", "Secuencia",
+]
+
+def resumir_rutas(variantes_ruta, rutas_base, duraciones):
+    """
+    Construye la tabla de variantes y el resumen de rutas a partir de lo acumulado en generar_eventlog:
+    {ruta: [casos, casos con bucles LA, suma, mínimo y máximo de segundos]}, el contador de rutas base y
+    la duración de cada caso. Las variantes se ordenan por frecuencia y, a igualdad, por primera
+    aparición, igual que en analitica.variantes.
+    """
+    total_casos = sum(acumulado[0] for acumulado in variantes_ruta.values())
+    filas = sorted(
+        (
+            {
+                "Casos": casos, "Porcentaje": round(casos / total_casos * 100, 2), "Longitud": len(ruta),
+                "CasosBucleLA": casos_bucle, "RechazosLA": sum(ruta.count(a) for a in ACTIVIDADES_RECHAZO_LA),
+                "DuracionMediaDias": round(suma / casos / 86400, 2), "DuracionMinDias": round(minimo / 86400, 2),
+                "DuracionMaxDias": round(maximo / 86400, 2), "Secuencia": ">".join(map(str, ruta)),
+            }
+            for ruta, (casos, casos_bucle, suma, minimo, maximo) in variantes_ruta.items()
+        ),
+        key=lambda fila: -fila["Casos"],  # sorted es estable: a igualdad se conserva el orden de aparición
+    )
+    tabla = pd.DataFrame(filas, columns=COLUMNAS_RESUMEN_RUTAS[1:])
+    tabla.insert(0, "VarianteID", range(1, len(tabla) + 1))
+
+    dias = np.asarray(duraciones, dtype=float) / 86400
+    resumen = {
+        "casos": total_casos,
+        "variantes": len(tabla),
+        "rutas_base": len(rutas_base),
+        "casos_bucle_la": int(tabla["CasosBucleLA"].sum()),
+        "casos_retrabajo_la": int(tabla.loc[tabla["RechazosLA"] > 0, "Casos"].sum()),
+        "rechazos_la": int((tabla["Casos"] * tabla["RechazosLA"]).sum()),
+        "duracion_dias": {
+            "media": round(float(dias.mean()), 2) if len(dias) else 0.0,
+            "mediana": round(float(np.median(dias)), 2) if len(dias) else 0.0,
+            "p90": round(float(np.percentile(dias, 90)), 2) if len(dias) else 0.0,
+            "max": round(float(dias.max()), 2) if len(dias) else 0.0,
+        },
+    }
+    return tabla, resumen
+
 def generar_eventlog(estudiantes_df, actividades_df, destinos_df, estudiantes_con_alegaciones_ids):
+    """
+    Genera el EventLog recorriendo la ruta de cada estudiante. Devuelve (eventlog, rutas), donde rutas
+    es {"tabla", "resumen"} de resumir_rutas: variantes, bucles del LA y duraciones contados al generar,
+    sin volver a recorrer el EventLog.
+    """
     eventos = []
+    nombre_actividad_map = dict(zip(actividades_df["ActividadID"], actividades_df["NombreActividad"]))
+    requiere_idioma_map = dict(zip(destinos_df["DestinoID"], destinos_df["RequiereIdioma"]))
+    variantes_ruta = {}  # {tuple(ruta): [casos, casos con bucles LA, suma, mínimo y máximo de segundos]}
+    contador_rutas_base = Counter()
+    duraciones = []
     actividad_actor_map = dict(zip(actividades_df["ActividadID"], actividades_df["ActorDefecto"]))
 
     # Procesar destinos cancelados tempranamente
@@ -518,7 +633,7 @@ def generar_eventlog(estudiantes_df, actividades_df, destinos_df, estudiantes_co
     if USE_LLM:
         print("🔄 Obteniendo patrones de proceso desde el LLM...")
         try:
-            patrones_llm = get_process_patterns(n=20)
+            patrones_llm = obtener_llm("patrones", 20)
             print(f"✅ LLM generó {len(patrones_llm)} patrones.")
             # Simplificado: Añadir a todos los estados principales
             for estado in ["Aceptado", "Renuncia", "No asignado"]:
@@ -554,10 +669,9 @@ def generar_eventlog(estudiantes_df, actividades_df, destinos_df, estudiantes_co
         requiere_idioma = False # Valor por defecto
 
         # Obtener si el destino requiere idioma
-        try:
-            destino_info = destinos_df.loc[destinos_df['DestinoID'] == destino_solicitado].iloc[0]
-            requiere_idioma = destino_info['RequiereIdioma']
-        except IndexError:
+        if destino_solicitado in requiere_idioma_map:
+            requiere_idioma = requiere_idioma_map[destino_solicitado]
+        else:
             print(f"⚠️ Destino {destino_solicitado} no encontrado para Estudiante {estudiante_id}. Asumiendo sin idioma.")
             requiere_idioma = False
 
@@ -566,7 +680,7 @@ def generar_eventlog(estudiantes_df, actividades_df, destinos_df, estudiantes_co
             fecha_cancelacion_destino = mapa_fechas_cancelacion[destino_solicitado]
             # Seleccionar ruta de cancelación
             if requiere_idioma:
-                pub_provisional = datetime(2022, 12, 12)
+                pub_provisional = datetime.combine(FECHAS_PUBLICACION[6].date(), time())
                 if fecha_cancelacion_destino < pub_provisional:
                     ruta_seleccionada = rutas_cancelacion["idioma_rechazo"]
                 else:
@@ -578,6 +692,8 @@ def generar_eventlog(estudiantes_df, actividades_df, destinos_df, estudiantes_co
                 ruta_seleccionada = rutas_cancelacion["sin_idioma"]
 
         # Selección de ruta normal si no hay cancelación
+        rutas_filtradas_idioma = []
+        rutas_filtradas_final = []
         if ruta_seleccionada is None:
             lista_rutas_estado = rutas_completas_por_estado.get(estado_final, rutas_default)
             if not lista_rutas_estado: 
@@ -596,21 +712,24 @@ def generar_eventlog(estudiantes_df, actividades_df, destinos_df, estudiantes_co
             else:
                 rutas_filtradas_final = [r for r in rutas_filtradas_idioma if not (7 in r and 8 in r and 9 in r)]
 
-                    # Selección con fallbacks
-        if rutas_filtradas_final:
-            ruta_seleccionada = random.choice(rutas_filtradas_final)
-        elif rutas_filtradas_idioma:
-            ruta_seleccionada = random.choice(rutas_filtradas_idioma)
-        elif lista_rutas_estado:
-            ruta_seleccionada = random.choice(lista_rutas_estado)
-        else:
-            ruta_seleccionada = random.choice(rutas_default)
+            # Selección con fallbacks
+            if rutas_filtradas_final:
+                ruta_seleccionada = random.choice(rutas_filtradas_final)
+            elif rutas_filtradas_idioma:
+                ruta_seleccionada = random.choice(rutas_filtradas_idioma)
+            elif lista_rutas_estado:
+                ruta_seleccionada = random.choice(lista_rutas_estado)
+            else:
+                ruta_seleccionada = random.choice(rutas_default)
         
         # NUEVA FUNCIONALIDAD: Aplicar bucles de LA dinámicos si la ruta llega al LA
         if estado_final == "Aceptado" and 23 in ruta_seleccionada:
             ruta = aplicar_bucles_la_a_ruta(ruta_seleccionada)
         else:
             ruta = ruta_seleccionada
+        # aplicar_bucles_la_a_ruta siempre construye una ruta nueva: solo cuenta si hubo algún rechazo 26/30
+        bucle_la = ruta is not ruta_seleccionada and any(a in ACTIVIDADES_RECHAZO_LA for a in ruta)
+        inicio_caso = None
 
         # Generar eventos de la ruta
         for actividad_id in ruta:
@@ -654,14 +773,18 @@ def generar_eventlog(estudiantes_df, actividades_df, destinos_df, estudiantes_co
                     fecha_actual = fecha_evento_anterior + timedelta(hours=random.randint(1,3))
                     if fecha_actual >= proximo_plazo_inicio:
                        fecha_actual = proximo_plazo_inicio - timedelta(minutes=random.randint(1,30))
+                    # Nunca antes del evento previo: el orden por Timestamp debe coincidir con el de la ruta
+                    fecha_actual = max(fecha_actual, fecha_evento_anterior + timedelta(seconds=1))
                 else:
                     fecha_actual = fecha_propuesta
 
             fecha_evento_anterior = fecha_actual            
+            if inicio_caso is None:
+                inicio_caso = fecha_actual
             
             # Generar detalle del evento
             actor = actividad_actor_map.get(actividad_id, "Desconocido")
-            detalle = actividades_df.loc[actividades_df['ActividadID'] == actividad_id, 'NombreActividad'].iloc[0]
+            detalle = nombre_actividad_map[actividad_id]
             
             # Detalles específicos para respuestas y cancelaciones
             if actividad_id in [11, 15, 19]: 
@@ -678,9 +801,25 @@ def generar_eventlog(estudiantes_df, actividades_df, destinos_df, estudiantes_co
                 int(id_destino_log), detalle, actor
             ])
 
+        # Estadísticas de la ruta del caso (ver resumir_rutas)
+        if ruta:
+            segundos = (fecha_evento_anterior - inicio_caso).total_seconds()
+            acumulado = variantes_ruta.get(tuple(ruta))
+            if acumulado is None:
+                variantes_ruta[tuple(ruta)] = [1, int(bucle_la), segundos, segundos, segundos]
+            else:
+                acumulado[0] += 1
+                acumulado[1] += bucle_la
+                acumulado[2] += segundos
+                acumulado[3] = min(acumulado[3], segundos)
+                acumulado[4] = max(acumulado[4], segundos)
+            contador_rutas_base[tuple(ruta_seleccionada)] += 1
+            duraciones.append(segundos)
+
     eventos_df = pd.DataFrame(eventos, columns=["EstudianteID", "ActividadID", "Timestamp", "DestinoID", "Detalle", "Actor"])
     eventos_df.insert(0, "EventID", range(1, len(eventos_df) + 1))
-    return eventos_df
+    tabla_rutas, resumen_rutas = resumir_rutas(variantes_ruta, contador_rutas_base, duraciones)
+    return aplicar_esquema(eventos_df, "EventLog"), {"tabla": tabla_rutas, "resumen": resumen_rutas}
 
 def generar_alegaciones(estudiantes_df):
     """
@@ -688,7 +827,7 @@ def generar_alegaciones(estudiantes_df):
     NOTA: Las fechas se generan inicialmente de forma aproximada y se sincronizarán 
     después con las fechas reales del EventLog.
     """
-    motivos = get_alegation_motives(20) if USE_LLM else [
+    motivos = obtener_llm("motivos", 20) if USE_LLM else [
         "Error en nota media", "Cambio de destino no solicitado", "Fallo administrativo", 
         "Revisión de expediente", "Problemas médicos", "No contabilización de créditos",
         "Error en fecha límite de entrega", "Destino cancelado sin aviso", "Falta de actualización de notas",
@@ -728,10 +867,10 @@ def generar_alegaciones(estudiantes_df):
             accion
         ])
 
-    alegaciones_df = pd.DataFrame(alegaciones, columns=[
+    alegaciones_df = aplicar_esquema(pd.DataFrame(alegaciones, columns=[
         "AlegacionID", "EstudianteID", "FechaAlegacion", "MotivoAlegacion", 
         "ResultadoAlegacion", "FechaResolucion", "AccionTrasResolucion"
-    ])
+    ]), "Alegaciones")
     
     # Obtenemos el conjunto de IDs de estudiantes con alegaciones
     estudiantes_con_alegaciones_ids = set(alegaciones_df["EstudianteID"].unique())
@@ -739,27 +878,30 @@ def generar_alegaciones(estudiantes_df):
     # Devolvemos tanto el DataFrame como el conjunto de IDs
     return alegaciones_df, estudiantes_con_alegaciones_ids
 
+def primeros_eventos(eventlog_df, claves, actividades=None):
+    """
+    Timestamp del primer evento (en el orden del EventLog) de cada combinación de `claves`, p. ej.
+    (EstudianteID, ActividadID). Se agrupa una sola vez en lugar de filtrar el EventLog por cada fila.
+    """
+    eventos = eventlog_df if actividades is None else eventlog_df[eventlog_df['ActividadID'].isin(list(actividades))]
+    return eventos.groupby(claves, observed=True, sort=False)['Timestamp'].first()
+
+def _buscar_fechas(instantes_por_clave, claves):
+    """Fecha 'AAAA-MM-DD' de `instantes_por_clave` para cada fila de `claves` (NaN si no hay evento)."""
+    instantes = instantes_por_clave.reindex(pd.MultiIndex.from_arrays(claves)).to_numpy()
+    return pd.to_datetime(pd.Series(instantes)).dt.strftime('%Y-%m-%d').to_numpy()
+
 def sincronizar_fechas_historico_eventlog(historico_df, eventlog_df):
     """Sincroniza las fechas del histórico con las fechas reales del EventLog."""
     print("🕐 Sincronizando fechas entre Histórico y EventLog...")
     
     historico_sincronizado = historico_df.copy()
-    
-    for idx, row in historico_sincronizado.iterrows():
-        estudiante_id = row['EstudianteID']
-        ronda = row['Ronda']
-        
-        if ronda in RONDA_A_ACTIVIDAD:
-            actividad_id = RONDA_A_ACTIVIDAD[ronda]
-            evento_publicacion = eventlog_df[
-                (eventlog_df['EstudianteID'] == estudiante_id) & 
-                (eventlog_df['ActividadID'] == actividad_id)
-            ]
-            
-            if len(evento_publicacion) > 0:
-                fecha_real = pd.to_datetime(evento_publicacion.iloc[0]['Timestamp']).strftime('%Y-%m-%d')
-                historico_sincronizado.at[idx, 'FechaAsignacion'] = fecha_real
-    
+    actividades = historico_sincronizado['Ronda'].astype(str).map(RONDA_A_ACTIVIDAD).fillna(-1).astype(int)
+    primeros = primeros_eventos(eventlog_df, ['EstudianteID', 'ActividadID'], RONDA_A_ACTIVIDAD.values())
+    fechas = _buscar_fechas(primeros, [historico_sincronizado['EstudianteID'].to_numpy(), actividades.to_numpy()])
+
+    encontradas = pd.notna(fechas)
+    historico_sincronizado.loc[encontradas, 'FechaAsignacion'] = fechas[encontradas]
     return historico_sincronizado
 
 def sincronizar_alegaciones_eventlog(alegaciones_df, eventlog_df):
@@ -767,27 +909,14 @@ def sincronizar_alegaciones_eventlog(alegaciones_df, eventlog_df):
     print("🕐 Sincronizando fechas de alegaciones con EventLog...")
     
     alegaciones_sincronizadas = alegaciones_df.copy()
-    
-    for idx, row in alegaciones_sincronizadas.iterrows():
-        estudiante_id = row['EstudianteID']
-        
-        eventos_alegacion = eventlog_df[
-            (eventlog_df['EstudianteID'] == estudiante_id) & 
-            (eventlog_df['ActividadID'].isin([7, 8, 9]))
-        ].sort_values('Timestamp')
-        
-        if len(eventos_alegacion) > 0:
-            # Fecha de presentación (ActividadID 7)
-            evento_presentacion = eventos_alegacion[eventos_alegacion['ActividadID'] == 7]
-            if len(evento_presentacion) > 0:
-                fecha_real_alegacion = pd.to_datetime(evento_presentacion.iloc[0]['Timestamp']).strftime('%Y-%m-%d')
-                alegaciones_sincronizadas.at[idx, 'FechaAlegacion'] = fecha_real_alegacion
-            
-            # Fecha de resolución (ActividadID 9)
-            evento_resolucion = eventos_alegacion[eventos_alegacion['ActividadID'] == 9]
-            if len(evento_resolucion) > 0:
-                fecha_real_resolucion = pd.to_datetime(evento_resolucion.iloc[0]['Timestamp']).strftime('%Y-%m-%d')
-                alegaciones_sincronizadas.at[idx, 'FechaResolucion'] = fecha_real_resolucion
+    # Presentación (7) y resolución (9): el evento más temprano de cada estudiante
+    eventos = eventlog_df[eventlog_df['ActividadID'].isin([7, 9])]
+    primeros = eventos.groupby(['EstudianteID', 'ActividadID'], observed=True, sort=False)['Timestamp'].min()
+    estudiantes = alegaciones_sincronizadas['EstudianteID'].to_numpy()
+    for actividad_id, columna in [(7, 'FechaAlegacion'), (9, 'FechaResolucion')]:
+        fechas = _buscar_fechas(primeros, [estudiantes, np.full(len(estudiantes), actividad_id)])
+        encontradas = pd.notna(fechas)
+        alegaciones_sincronizadas.loc[encontradas, columna] = fechas[encontradas]
     
     return alegaciones_sincronizadas
 
@@ -797,24 +926,19 @@ def extraer_historico_desde_gestion_plazas(gestion_plazas, eventlog_df):
     asignacion_id_counter = 1
     
     fechas_fallback = {
-        "1ª Adjudicación": "2023-01-11",
-        "2ª Adjudicación": "2023-01-19", 
-        "3ª Adjudicación": "2023-01-25",
-        "Adjudicación Final": "2023-02-01"
+        ronda: FECHAS_PUBLICACION[actividad_id].strftime('%Y-%m-%d')
+        for ronda, actividad_id in RONDA_A_ACTIVIDAD.items()
+    }
+    
+    primeras_publicaciones = {
+        clave: pd.to_datetime(instante).strftime('%Y-%m-%d')
+        for clave, instante in primeros_eventos(eventlog_df, ['ActividadID', 'DestinoID'], RONDA_A_ACTIVIDAD.values()).items()
     }
     
     for destino_id in gestion_plazas['asignaciones_titulares']:
         for ronda in RONDAS:
             actividad_id = RONDA_A_ACTIVIDAD[ronda]
-            eventos_publicacion = eventlog_df[
-                (eventlog_df['ActividadID'] == actividad_id) & 
-                (eventlog_df['DestinoID'] == destino_id)
-            ]
-            
-            if len(eventos_publicacion) > 0:
-                fecha_publicacion = pd.to_datetime(eventos_publicacion.iloc[0]['Timestamp']).strftime('%Y-%m-%d')
-            else:
-                fecha_publicacion = fechas_fallback[ronda]
+            fecha_publicacion = primeras_publicaciones.get((actividad_id, destino_id), fechas_fallback[ronda])
             
             # Registrar titulares y suplentes
             for tipo, lista in [("Titular", gestion_plazas['asignaciones_titulares'][destino_id][ronda]),
@@ -826,9 +950,9 @@ def extraer_historico_desde_gestion_plazas(gestion_plazas, eventlog_df):
                     ])
                     asignacion_id_counter += 1
 
-    return pd.DataFrame(historico, columns=[
+    return aplicar_esquema(pd.DataFrame(historico, columns=[
         "AsignacionID", "EstudianteID", "DestinoID", "FechaAsignacion", "Ronda", "EstadoEnRonda"
-    ])
+    ]), "HistoricoAdjudicaciones")
 
 def validar_coherencia_datos(estudiantes_df, eventlog_df, historico_df):
     """
@@ -840,17 +964,24 @@ def validar_coherencia_datos(estudiantes_df, eventlog_df, historico_df):
     
     print("🔍 Validando coherencia de datos...")
     
-    for _, estudiante in estudiantes_df.iterrows():
-        estudiante_id = estudiante['EstudianteID']
-        estado_final = estudiante['EstadoFinal']
-        destino_asignado = estudiante['DestinoAsignado']
-        destino_solicitado = estudiante['DestinoSolicitado']
-        
-        # Obtener eventos del estudiante
-        eventos = eventlog_df[eventlog_df['EstudianteID'] == estudiante_id].sort_values('Timestamp')
-        historico_est = historico_df[historico_df['EstudianteID'] == estudiante_id]
-        
-        if len(eventos) == 0:
+    # Se agrupan una vez el EventLog y el histórico por estudiante en lugar de filtrarlos por cada uno
+    con_eventos = set(eventlog_df['EstudianteID'].unique())
+    publicaciones = eventlog_df[eventlog_df['ActividadID'].isin(list(RONDA_A_ACTIVIDAD.values()))].groupby(
+        ['EstudianteID', 'ActividadID'], observed=True, sort=False)['Timestamp'].min()
+    fechas_publicacion = dict(zip(publicaciones.index, pd.to_datetime(publicaciones.to_numpy()).date))
+    historico_por_estudiante = {}
+    for estudiante_id, destino_id, fecha_adj, ronda in zip(
+        historico_df['EstudianteID'], historico_df['DestinoID'],
+        pd.to_datetime(historico_df['FechaAsignacion']).dt.date, historico_df['Ronda'].astype(str)
+    ):
+        historico_por_estudiante.setdefault(estudiante_id, []).append((destino_id, fecha_adj, ronda))
+    
+    for estudiante_id, estado_final, destino_asignado in zip(
+        estudiantes_df['EstudianteID'], estudiantes_df['EstadoFinal'], estudiantes_df['DestinoAsignado']
+    ):
+        historico_est = historico_por_estudiante.get(estudiante_id, [])
+        
+        if estudiante_id not in con_eventos:
             inconsistencias.append(f"Estudiante {estudiante_id}: Sin eventos en EventLog")
             continue
         
@@ -868,31 +999,17 @@ def validar_coherencia_datos(estudiantes_df, eventlog_df, historico_df):
         
         # Validación 3: Destino asignado vs histórico
         if not pd.isna(destino_asignado) and len(historico_est) > 0:
-            destinos_historico = set(historico_est['DestinoID'].tolist())
+            destinos_historico = {destino_id for destino_id, _, _ in historico_est}
             if destino_asignado not in destinos_historico:
                 inconsistencias.append(f"Estudiante {estudiante_id}: Destino asignado {destino_asignado} no aparece en histórico")
         
-        # Validación 4: Fechas de adjudicación vs eventos (sincronización)
-        for _, adj in historico_est.iterrows():
-            fecha_adj = pd.to_datetime(adj['FechaAsignacion'])
-            ronda = adj['Ronda']
-            
-            # Buscar evento de publicación correspondiente
-            if "1ª" in ronda:
-                eventos_pub = eventos[eventos['ActividadID'] == 10]
-            elif "2ª" in ronda:
-                eventos_pub = eventos[eventos['ActividadID'] == 14]
-            elif "3ª" in ronda:
-                eventos_pub = eventos[eventos['ActividadID'] == 18]
-            elif "Final" in ronda:
-                eventos_pub = eventos[eventos['ActividadID'] == 22]
-            else:
+        # Validación 4: Fechas de adjudicación vs eventos de publicación (sincronización)
+        for _, fecha_adj, ronda in historico_est:
+            if ronda not in RONDA_A_ACTIVIDAD:
                 continue
-                
-            if len(eventos_pub) > 0:
-                fecha_evento = pd.to_datetime(eventos_pub.iloc[0]['Timestamp']).date()
-                if fecha_adj.date() != fecha_evento:
-                    inconsistencias.append(f"Estudiante {estudiante_id}: Fecha adjudicación {ronda} no coincide (Histórico: {fecha_adj.date()}, EventLog: {fecha_evento})")
+            fecha_evento = fechas_publicacion.get((estudiante_id, RONDA_A_ACTIVIDAD[ronda]))
+            if fecha_evento is not None and fecha_adj != fecha_evento:
+                inconsistencias.append(f"Estudiante {estudiante_id}: Fecha adjudicación {ronda} no coincide (Histórico: {fecha_adj}, EventLog: {fecha_evento})")
         
         # Validación 5: Estudiantes excluidos no deberían tener histórico de adjudicaciones
         if estado_final == "Excluido" and len(historico_est) > 0:
@@ -919,9 +1036,40 @@ def gestionar_plazas_por_destino_y_ronda():
         'plazas_disponibles': {},  # {destino_id: {ronda: plazas_restantes}}
         'asignaciones_titulares': {},  # {destino_id: {ronda: [estudiante_ids]}}
         'asignaciones_suplentes': {},  # {destino_id: {ronda: [estudiante_ids]}}
-        'renuncias': {}  # {destino_id: {ronda: [estudiante_ids_que_renunciaron]}}
+        'renuncias': {},  # {destino_id: {ronda: [estudiante_ids_que_renunciaron]}}
+        'historial_estudiantes': {}  # {estudiante_id: [(ronda, destino_id, rol, renuncio)]} (índice inverso)
     }
 
+def registrar_asignacion(gestion_plazas, estudiante_id, ronda, destino_id, rol):
+    """Registra en el índice inverso que el estudiante fue asignado como 'Titular' o 'Suplente'."""
+    gestion_plazas['historial_estudiantes'].setdefault(estudiante_id, []).append((ronda, destino_id, rol, False))
+
+def registrar_renuncia(gestion_plazas, estudiante_id, ronda, destino_id):
+    """Marca como renunciada la titularidad del estudiante en el destino y ronda indicados."""
+    historial = gestion_plazas['historial_estudiantes'].get(estudiante_id, [])
+    for i, (ronda_h, destino_h, rol_h, _) in enumerate(historial):
+        if ronda_h == ronda and destino_h == destino_id and rol_h == 'Titular':
+            historial[i] = (ronda_h, destino_h, rol_h, True)
+
+def eliminar_del_historial(gestion_plazas, estudiante_id, destino_id, ronda=None, rol=None):
+    """Elimina del índice inverso las entradas del estudiante en un destino (opcionalmente por ronda/rol)."""
+    historial = gestion_plazas['historial_estudiantes'].get(estudiante_id)
+    if historial:
+        historial[:] = [
+            h for h in historial
+            if not (h[1] == destino_id and (ronda is None or h[0] == ronda) and (rol is None or h[2] == rol))
+        ]
+
+# Países que se consideran compatibles al reasignar a un destino alternativo (además del mismo país)
+GRUPOS_PAISES = {
+    "Francia": "Francia/Bélgica", "Bélgica": "Francia/Bélgica",
+    "Alemania": "Alemania/Austria", "Austria": "Alemania/Austria",
+    "Italia": "Italia/Malta", "Malta": "Italia/Malta",
+}
+
+def grupo_pais(pais):
+    return GRUPOS_PAISES.get(pais, pais)
+
 def simular_adjudicacion_con_plazas(estudiantes_df, destinos_df):
     """
     Simula el proceso de adjudicación considerando el número real de plazas disponibles.
@@ -968,6 +1116,10 @@ def simular_adjudicacion_con_plazas(estudiantes_df, destinos_df):
             'Adjudicación Final': []
         }
     
+    # Búsquedas por ID en diccionarios: extraer filas del DataFrame por máscara en cada plaza es muy lento
+    pais_por_destino = dict(zip(destinos_df['DestinoID'], destinos_df['País']))
+    estado_por_estudiante = dict(zip(estudiantes_df['EstudianteID'], estudiantes_df['EstadoFinal']))
+
     # Simular cada ronda de adjudicación
     rondas = ['1ª Adjudicación', '2ª Adjudicación', '3ª Adjudicación', 'Adjudicación Final']
     
@@ -976,11 +1128,10 @@ def simular_adjudicacion_con_plazas(estudiantes_df, destinos_df):
         
         # Obtener estudiantes elegibles para esta ronda
         estudiantes_elegibles = []
-        for _, estudiante in estudiantes_df.iterrows():
-            estudiante_id = estudiante['EstudianteID']
-            destino_solicitado = estudiante['DestinoSolicitado']
-            estado_final = estudiante['EstadoFinal']
-            
+        for estudiante_id, destino_solicitado, estado_final, expediente in zip(
+            estudiantes_df['EstudianteID'], estudiantes_df['DestinoSolicitado'],
+            estudiantes_df['EstadoFinal'], estudiantes_df['Expediente']
+        ):
             # Lógica para determinar si el estudiante participa en esta ronda
             participa = False
             if ronda == '1ª Adjudicación':
@@ -988,34 +1139,22 @@ def simular_adjudicacion_con_plazas(estudiantes_df, destinos_df):
                 participa = estado_final != 'Excluido'
             elif ronda == '2ª Adjudicación':
                 # Solo los que no fueron asignados como titulares en 1ª EN CUALQUIER DESTINO o renunciaron
-                fue_titular_1ra = False
-                renuncio_1ra = False
-                
-                for destino_check in gestion_plazas['asignaciones_titulares']:
-                    if estudiante_id in gestion_plazas['asignaciones_titulares'][destino_check]['1ª Adjudicación']:
-                        fue_titular_1ra = True
-                        if estudiante_id in gestion_plazas['renuncias'][destino_check]['1ª Adjudicación']:
-                            renuncio_1ra = True
-                        break
+                titularidades = [
+                    h for h in gestion_plazas['historial_estudiantes'].get(estudiante_id, [])
+                    if h[0] == '1ª Adjudicación' and h[2] == 'Titular'
+                ]
+                fue_titular_1ra = bool(titularidades)
+                renuncio_1ra = fue_titular_1ra and min(titularidades, key=lambda h: h[1])[3]
                 
                 participa = (not fue_titular_1ra or renuncio_1ra) and estado_final != 'Excluido'
             elif ronda == '3ª Adjudicación':
                 # Solo los que no fueron asignados como titulares en 1ª/2ª EN CUALQUIER DESTINO o renunciaron
-                fue_titular_1ra_2da = False
-                renuncio_1ra_2da = False
-                
-                for destino_check in gestion_plazas['asignaciones_titulares']:
-                    # Verificar 1ª adjudicación
-                    if estudiante_id in gestion_plazas['asignaciones_titulares'][destino_check]['1ª Adjudicación']:
-                        fue_titular_1ra_2da = True
-                        if estudiante_id in gestion_plazas['renuncias'][destino_check]['1ª Adjudicación']:
-                            renuncio_1ra_2da = True
-                    
-                    # Verificar 2ª adjudicación
-                    if estudiante_id in gestion_plazas['asignaciones_titulares'][destino_check]['2ª Adjudicación']:
-                        fue_titular_1ra_2da = True
-                        if estudiante_id in gestion_plazas['renuncias'][destino_check]['2ª Adjudicación']:
-                            renuncio_1ra_2da = True
+                titularidades = [
+                    h for h in gestion_plazas['historial_estudiantes'].get(estudiante_id, [])
+                    if h[0] in ('1ª Adjudicación', '2ª Adjudicación') and h[2] == 'Titular'
+                ]
+                fue_titular_1ra_2da = bool(titularidades)
+                renuncio_1ra_2da = any(h[3] for h in titularidades)
                 
                 participa = (not fue_titular_1ra_2da or renuncio_1ra_2da) and estado_final != 'Excluido'
             else:  # Adjudicación Final
@@ -1026,7 +1165,7 @@ def simular_adjudicacion_con_plazas(estudiantes_df, destinos_df):
                 estudiantes_elegibles.append({
                     'estudiante_id': estudiante_id,
                     'destino_solicitado': destino_solicitado,
-                    'expediente': estudiante['Expediente'],
+                    'expediente': expediente,
                     'estado_final': estado_final
                 })
         
@@ -1059,11 +1198,13 @@ def simular_adjudicacion_con_plazas(estudiantes_df, destinos_df):
                     # Verificar que el estudiante no esté ya asignado en este destino en esta ronda
                     if candidato['estudiante_id'] not in gestion_plazas['asignaciones_titulares'][destino_id][ronda]:
                         gestion_plazas['asignaciones_titulares'][destino_id][ronda].append(candidato['estudiante_id'])
+                        registrar_asignacion(gestion_plazas, candidato['estudiante_id'], ronda, destino_id, 'Titular')
                         titulares_asignados += 1
                 else:
                     # Asignar como suplente
                     if candidato['estudiante_id'] not in gestion_plazas['asignaciones_suplentes'][destino_id][ronda]:
                         gestion_plazas['asignaciones_suplentes'][destino_id][ronda].append(candidato['estudiante_id'])
+                        registrar_asignacion(gestion_plazas, candidato['estudiante_id'], ronda, destino_id, 'Suplente')
         
         # NUEVA FUNCIONALIDAD: Reasignación a destinos alternativos
         # Buscar estudiantes que no obtuvieron plaza en su destino preferido
@@ -1078,57 +1219,54 @@ def simular_adjudicacion_con_plazas(estudiantes_df, destinos_df):
                 estudiantes_sin_plaza.append(est)
         
         # CORRECCIÓN: Buscar destinos con plazas realmente disponibles
-        destinos_con_plazas = []
-        for destino_id in gestion_plazas['plazas_disponibles']:
-            plazas_totales = gestion_plazas['plazas_disponibles'][destino_id][ronda]
-            asignaciones_actuales = len(gestion_plazas['asignaciones_titulares'][destino_id][ronda])
-            renuncias_actuales = len(gestion_plazas['renuncias'][destino_id][ronda])
-            plazas_restantes = max(0, plazas_totales - asignaciones_actuales + renuncias_actuales)
-            
-            # Añadir cada plaza disponible como una entrada separada
-            for _ in range(plazas_restantes):
-                destinos_con_plazas.append(destino_id)
+        # Cada plaza libre es una entrada de una lista ordenada por destino; se representa por el número de
+        # plazas restantes de cada destino y se elige la entrada k-ésima con una suma acumulada, lo que
+        # equivale a random.choice sobre la lista completa sin recorrerla por cada estudiante
+        orden_destinos = list(gestion_plazas['plazas_disponibles'])
+        plazas_restantes = np.array([
+            max(0, gestion_plazas['plazas_disponibles'][destino_id][ronda]
+                - len(gestion_plazas['asignaciones_titulares'][destino_id][ronda])
+                + len(gestion_plazas['renuncias'][destino_id][ronda]))
+            for destino_id in orden_destinos
+        ], dtype=np.int64)
+        total_plazas_restantes = int(plazas_restantes.sum())
+        posiciones_por_grupo = {}
+        for posicion, destino_id in enumerate(orden_destinos):
+            posiciones_por_grupo.setdefault(grupo_pais(pais_por_destino[destino_id]), []).append(posicion)
+        posiciones_por_grupo = {grupo: np.array(posiciones) for grupo, posiciones in posiciones_por_grupo.items()}
         
         # CORRECCIÓN: Reasignación más realista con menor probabilidad
-        if estudiantes_sin_plaza and destinos_con_plazas:
+        if estudiantes_sin_plaza and total_plazas_restantes:
             # Ordenar estudiantes sin plaza por expediente
             estudiantes_sin_plaza_ordenados = sorted(estudiantes_sin_plaza, 
                                                     key=lambda x: x['expediente'], reverse=True)
             
             for estudiante in estudiantes_sin_plaza_ordenados:
-                if not destinos_con_plazas:
+                if not total_plazas_restantes:
                     break
                     
                 # CORRECCIÓN: Reducir probabilidad a 15% (más realista)
                 # Solo los estudiantes más flexibles aceptan destinos alternativos
                 if random.random() < 0.15:
-                    # Filtrar destinos alternativos por compatibilidad (mismo país o región)
-                    destino_original_info = destinos_df[destinos_df['DestinoID'] == estudiante['destino_solicitado']].iloc[0]
-                    pais_original = destino_original_info['País']
-                    
-                    # Buscar destinos compatibles (mismo país o países vecinos)
-                    destinos_compatibles = []
-                    for destino_alt in destinos_con_plazas:
-                        destino_alt_info = destinos_df[destinos_df['DestinoID'] == destino_alt].iloc[0]
-                        pais_alt = destino_alt_info['País']
-                        
-                        # Compatibilidad: mismo país o países "similares" (simplificado)
-                        if (pais_alt == pais_original or 
-                            (pais_original in ['Francia', 'Bélgica'] and pais_alt in ['Francia', 'Bélgica']) or
-                            (pais_original in ['Alemania', 'Austria'] and pais_alt in ['Alemania', 'Austria']) or
-                            (pais_original in ['Italia', 'Malta'] and pais_alt in ['Italia', 'Malta'])):
-                            destinos_compatibles.append(destino_alt)
+                    # Destinos compatibles: mismo país o países "similares" (ver GRUPOS_PAISES)
+                    posiciones = posiciones_por_grupo.get(grupo_pais(pais_por_destino[estudiante['destino_solicitado']]))
+                    plazas_compatibles = plazas_restantes[posiciones] if posiciones is not None else plazas_restantes[:0]
                     
                     # Si hay destinos compatibles, usar esos; sino, cualquier disponible
-                    destinos_a_considerar = destinos_compatibles if destinos_compatibles else destinos_con_plazas
+                    if plazas_compatibles.sum():
+                        indice = random.choice(range(int(plazas_compatibles.sum())))
+                        posicion = posiciones[np.searchsorted(np.cumsum(plazas_compatibles), indice, side='right')]
+                    else:
+                        indice = random.choice(range(total_plazas_restantes))
+                        posicion = np.searchsorted(np.cumsum(plazas_restantes), indice, side='right')
+                    destino_alternativo = orden_destinos[posicion]
                     
-                    if destinos_a_considerar:
-                        destino_alternativo = random.choice(destinos_a_considerar)
-                        
-                        # CORRECCIÓN: Verificar que no esté ya asignado antes de añadir
-                        if estudiante['estudiante_id'] not in gestion_plazas['asignaciones_titulares'][destino_alternativo][ronda]:
-                            gestion_plazas['asignaciones_titulares'][destino_alternativo][ronda].append(estudiante['estudiante_id'])
-                            destinos_con_plazas.remove(destino_alternativo)  # Reducir plazas disponibles
+                    # CORRECCIÓN: Verificar que no esté ya asignado antes de añadir
+                    if estudiante['estudiante_id'] not in gestion_plazas['asignaciones_titulares'][destino_alternativo][ronda]:
+                        gestion_plazas['asignaciones_titulares'][destino_alternativo][ronda].append(estudiante['estudiante_id'])
+                        registrar_asignacion(gestion_plazas, estudiante['estudiante_id'], ronda, destino_alternativo, 'Titular')
+                        plazas_restantes[posicion] -= 1  # Reducir plazas disponibles
+                        total_plazas_restantes -= 1
         
         # Simular renuncias en esta ronda (libera plazas para la siguiente)
         for destino_id in gestion_plazas['asignaciones_titulares']:
@@ -1136,8 +1274,7 @@ def simular_adjudicacion_con_plazas(estudiantes_df, destinos_df):
             
             # Simular renuncias (probabilidad basada en el estado final del estudiante)
             for titular_id in titulares_ronda:
-                estudiante_info = estudiantes_df[estudiantes_df['EstudianteID'] == titular_id].iloc[0]
-                estado_final = estudiante_info['EstadoFinal']
+                estado_final = estado_por_estudiante[titular_id]
                 
                 # Probabilidad de renuncia basada en estado final y ronda
                 prob_renuncia = 0.0
@@ -1151,6 +1288,7 @@ def simular_adjudicacion_con_plazas(estudiantes_df, destinos_df):
                 
                 if random.random() < prob_renuncia:
                     gestion_plazas['renuncias'][destino_id][ronda].append(titular_id)
+                    registrar_renuncia(gestion_plazas, titular_id, ronda, destino_id)
                     
                     # CORRECCIÓN: Liberar plaza para todas las rondas siguientes
                     ronda_actual_idx = rondas.index(ronda)
@@ -1169,43 +1307,46 @@ def simular_adjudicacion_con_plazas(estudiantes_df, destinos_df):
                                 # Promover al primer suplente (mejor expediente)
                                 promovido = suplentes_disponibles.pop(0)
                                 gestion_plazas['asignaciones_titulares'][destino_id][siguiente_ronda].append(promovido)
+                                eliminar_del_historial(gestion_plazas, promovido, destino_id, ronda=ronda, rol='Suplente')
+                                registrar_asignacion(gestion_plazas, promovido, siguiente_ronda, destino_id, 'Titular')
                                 # Decrementar la plaza que acabamos de incrementar
                                 gestion_plazas['plazas_disponibles'][destino_id][siguiente_ronda] -= 1
     
     return gestion_plazas
 
-def ajustar_asignaciones_por_plazas(gestion_plazas, destinos_df):
+def ajustar_asignaciones_por_plazas(gestion_plazas, destinos_df, estudiantes_df=None):
     """
     Ajusta las asignaciones para que respeten estrictamente el número de plazas disponibles.
-    MEJORADO: Ahora elimina completamente todas las sobreasignaciones.
+    MEJORADO: Ordena por Expediente real (búsqueda en array) y recorta el exceso con un heap
+    por destino, eliminando a los sobrantes de todas las rondas en una sola pasada.
     """
     print("🔧 Ajustando asignaciones para respetar límites de plazas...")
     
     ajustes_realizados = 0
     destinos_con_problemas = 0
     
-    for _, destino in destinos_df.iterrows():
-        destino_id = destino['DestinoID']
-        plazas_totales = destino['NúmeroPlazas']
-        
+    # Array indexado por EstudianteID con el expediente (si no hay estudiantes, usamos el ID como proxy)
+    expedientes = None
+    if estudiantes_df is not None and len(estudiantes_df) > 0:
+        ids = estudiantes_df['EstudianteID'].to_numpy(dtype=np.int64)
+        expedientes = np.full(int(ids.max()) + 1, -np.inf)
+        expedientes[ids] = estudiantes_df['Expediente'].to_numpy(dtype=float)
+    
+    plazas_por_destino = dict(zip(destinos_df['DestinoID'], destinos_df['NúmeroPlazas']))
+    
+    def estudiantes_efectivos(destino_id):
+        """Estudiantes titulares sin renuncia en alguna ronda (conjunto indexado)."""
+        efectivos = set()
+        for ronda in RONDAS:
+            renuncias = set(gestion_plazas['renuncias'][destino_id][ronda])
+            efectivos.update(e for e in gestion_plazas['asignaciones_titulares'][destino_id][ronda] if e not in renuncias)
+        return efectivos
+    
+    for destino_id, plazas_totales in plazas_por_destino.items():
         if plazas_totales == 0:  # Destinos cancelados, no procesar
             continue
         
-        # MEJORADO: Recopilar todas las asignaciones por ronda y eliminar duplicados
-        estudiantes_por_ronda = {}
-        
-        for ronda in ['1ª Adjudicación', '2ª Adjudicación', '3ª Adjudicación', 'Adjudicación Final']:
-            titulares = set(gestion_plazas['asignaciones_titulares'][destino_id][ronda])
-            renuncias = set(gestion_plazas['renuncias'][destino_id][ronda])
-            efectivos_ronda = titulares - renuncias
-            estudiantes_por_ronda[ronda] = list(efectivos_ronda)
-        
-        # Calcular estudiantes únicos finales (última aparición)
-        estudiantes_finales = {}  # {estudiante_id: ultima_ronda}
-        for ronda in ['1ª Adjudicación', '2ª Adjudicación', '3ª Adjudicación', 'Adjudicación Final']:
-            for estudiante_id in estudiantes_por_ronda[ronda]:
-                estudiantes_finales[estudiante_id] = ronda
-        
+        estudiantes_finales = estudiantes_efectivos(destino_id)
         total_asignados_finales = len(estudiantes_finales)
         
         if total_asignados_finales > plazas_totales:
@@ -1213,60 +1354,43 @@ def ajustar_asignaciones_por_plazas(gestion_plazas, destinos_df):
             destinos_con_problemas += 1
             print(f"   ⚠️ Destino {destino_id}: {total_asignados_finales} asignados para {plazas_totales} plazas (exceso: {exceso})")
             
-            # MEJORADO: Ordenar estudiantes por expediente (mantener los mejores)
-            estudiantes_con_expediente = []
-            for estudiante_id in estudiantes_finales.keys():
-                # Buscar expediente del estudiante (simplificado: usar ID como proxy)
-                estudiantes_con_expediente.append((estudiante_id, estudiante_id))  # (id, expediente_proxy)
-            
-            # Ordenar por "expediente" (ID como proxy) y mantener los primeros
-            estudiantes_ordenados = sorted(estudiantes_con_expediente, key=lambda x: x[1])
-            estudiantes_a_mantener = set([est[0] for est in estudiantes_ordenados[:plazas_totales]])
-            estudiantes_a_remover = set([est[0] for est in estudiantes_ordenados[plazas_totales:]])
+            # Heap con (expediente, -id): la cima es el peor expediente (a igualdad, el ID más alto)
+            if expedientes is not None:
+                heap = [(expedientes[e] if e < len(expedientes) else -np.inf, -e) for e in estudiantes_finales]
+            else:
+                heap = [(-e, -e) for e in estudiantes_finales]  # ID como proxy: se mantienen los IDs más bajos
+            heapq.heapify(heap)
+            estudiantes_a_remover = {-heapq.heappop(heap)[1] for _ in range(exceso)}
             
-            # MEJORADO: Remover completamente a los estudiantes excesivos de TODAS las rondas
+            # Eliminamos a los sobrantes de TODAS las rondas reconstruyendo cada lista una sola vez
+            for ronda in RONDAS:
+                for clave in ('asignaciones_titulares', 'asignaciones_suplentes', 'renuncias'):
+                    lista = gestion_plazas[clave][destino_id][ronda]
+                    filtrada = [e for e in lista if e not in estudiantes_a_remover]
+                    if len(filtrada) != len(lista):
+                        if clave == 'asignaciones_titulares':
+                            ajustes_realizados += len(lista) - len(filtrada)
+                        lista[:] = filtrada
             for estudiante_id in estudiantes_a_remover:
-                for ronda in ['1ª Adjudicación', '2ª Adjudicación', '3ª Adjudicación', 'Adjudicación Final']:
-                    # Remover de titulares
-                    if estudiante_id in gestion_plazas['asignaciones_titulares'][destino_id][ronda]:
-                        gestion_plazas['asignaciones_titulares'][destino_id][ronda].remove(estudiante_id)
-                        ajustes_realizados += 1
-                    
-                    # Remover de suplentes
-                    if estudiante_id in gestion_plazas['asignaciones_suplentes'][destino_id][ronda]:
-                        gestion_plazas['asignaciones_suplentes'][destino_id][ronda].remove(estudiante_id)
-                    
-                    # Remover de renuncias (si estaba ahí)
-                    if estudiante_id in gestion_plazas['renuncias'][destino_id][ronda]:
-                        gestion_plazas['renuncias'][destino_id][ronda].remove(estudiante_id)
+                eliminar_del_historial(gestion_plazas, estudiante_id, destino_id)
     
     if ajustes_realizados > 0:
         print(f"   🔧 Se realizaron {ajustes_realizados} ajustes en {destinos_con_problemas} destinos")
     else:
         print(f"   ✅ No se requirieron ajustes")
     
-    # NUEVO: Verificación post-ajuste
+    # Verificación post-ajuste sobre los conjuntos indexados (sin recorrer destinos_df)
     print("🔍 Verificando ajustes realizados...")
     destinos_aun_problematicos = 0
     
-    for _, destino in destinos_df.iterrows():
-        destino_id = destino['DestinoID']
-        plazas_totales = destino['NúmeroPlazas']
-        
+    for destino_id, plazas_totales in plazas_por_destino.items():
         if plazas_totales == 0:
             continue
         
-        # Recalcular asignaciones finales
-        estudiantes_finales_post = set()
-        for ronda in ['1ª Adjudicación', '2ª Adjudicación', '3ª Adjudicación', 'Adjudicación Final']:
-            titulares = set(gestion_plazas['asignaciones_titulares'][destino_id][ronda])
-            renuncias = set(gestion_plazas['renuncias'][destino_id][ronda])
-            efectivos = titulares - renuncias
-            estudiantes_finales_post.update(efectivos)
-        
-        if len(estudiantes_finales_post) > plazas_totales:
+        total_post = len(estudiantes_efectivos(destino_id))
+        if total_post > plazas_totales:
             destinos_aun_problematicos += 1
-            print(f"   ❌ Destino {destino_id} AÚN tiene problemas: {len(estudiantes_finales_post)} > {plazas_totales}")
+            print(f"   ❌ Destino {destino_id} AÚN tiene problemas: {total_post} > {plazas_totales}")
     
     if destinos_aun_problematicos == 0:
         print(f"   ✅ Todos los destinos respetan ahora los límites de plazas")
@@ -1282,72 +1406,45 @@ def ajustar_asignaciones_por_plazas(gestion_plazas, destinos_df):
 def actualizar_estados_desde_gestion_plazas(estudiantes_df, gestion_plazas):
     """
     Actualiza los estados finales y destinos asignados basándose en la gestión real de plazas.
+    Usa el índice inverso estudiante -> [(ronda, destino, rol, renuncio)] registrado durante la
+    adjudicación y deriva EstadoFinal y DestinoAsignado de todos los estudiantes en una pasada vectorizada.
     """
     print("🔄 Actualizando estados finales desde gestión de plazas...")
     
     estudiantes_actualizado = estudiantes_df.copy()
+    orden_ronda = {ronda: i for i, ronda in enumerate(RONDAS)}
+    
+    # Aplanamos el índice inverso quedándonos solo con las titularidades
+    titularidades = [
+        (estudiante_id, orden_ronda[ronda], destino_id, renuncio)
+        for estudiante_id, historial in gestion_plazas['historial_estudiantes'].items()
+        for ronda, destino_id, rol, renuncio in historial
+        if rol == 'Titular'
+    ]
+    titularidades_df = pd.DataFrame(titularidades, columns=['EstudianteID', 'OrdenRonda', 'DestinoID', 'Renuncio'])
+    
+    # La primera titularidad (por ronda y destino) decide: si no renunció es su destino final;
+    # si renunció, el estudiante queda como Renuncia aunque reaparezca en rondas posteriores
+    primera_titularidad = (
+        titularidades_df.sort_values(['EstudianteID', 'OrdenRonda', 'DestinoID'], kind='stable')
+        .drop_duplicates('EstudianteID')
+        .set_index('EstudianteID')
+    )
+    ids = estudiantes_actualizado['EstudianteID']
+    fue_titular = ids.isin(primera_titularidad.index).to_numpy()
+    renuncio = ids.map(primera_titularidad['Renuncio']).fillna(False).astype(bool).to_numpy()
+    destino_final = ids.map(primera_titularidad['DestinoID']).astype(float).to_numpy()
+    excluido = (estudiantes_actualizado['EstadoFinal'] == 'Excluido').to_numpy()
+    
+    aceptado = ~excluido & fue_titular & ~renuncio
+    estudiantes_actualizado['EstadoFinal'] = np.select(
+        [excluido, aceptado, fue_titular & renuncio],
+        ['Excluido', 'Aceptado', 'Renuncia'],  # Los que renuncian NO mantienen destino asignado
+        default='No asignado'
+    )
+    estudiantes_actualizado['DestinoAsignado'] = np.where(aceptado, destino_final, np.nan)
     
-    for idx, row in estudiantes_actualizado.iterrows():
-        estudiante_id = row['EstudianteID']
-        destino_solicitado = row['DestinoSolicitado']
-        estado_original = row['EstadoFinal']
-        
-        # Verificar si el estudiante fue asignado como titular en alguna ronda EN CUALQUIER DESTINO
-        fue_titular = False
-        ronda_asignacion = None
-        destino_final = None
-        renuncio = False
-        
-        # CORRECCIÓN: Buscar en TODOS los destinos, no solo el solicitado
-        for ronda in ['1ª Adjudicación', '2ª Adjudicación', '3ª Adjudicación', 'Adjudicación Final']:
-            # Buscar en todos los destinos
-            for destino_id in gestion_plazas['asignaciones_titulares']:
-                titulares_ronda = gestion_plazas['asignaciones_titulares'][destino_id][ronda]
-                renuncias_ronda = gestion_plazas['renuncias'][destino_id][ronda]
-                
-                if estudiante_id in titulares_ronda:
-                    fue_titular = True
-                    ronda_asignacion = ronda
-                    destino_final = destino_id
-                    
-                    # Verificar si renunció
-                    if estudiante_id in renuncias_ronda:
-                        renuncio = True
-                        # Si renunció, continuar buscando en rondas posteriores
-                        # por si fue asignado de nuevo
-                        destino_final = None
-                    else:
-                        # Si no renunció, este es su destino final
-                        # Salir de ambos bucles
-                        break
-            
-            # Si encontró asignación sin renuncia, salir del bucle de rondas
-            if fue_titular and not renuncio:
-                break
-        
-        # Determinar estado final basándose en la gestión de plazas
-        if estado_original == 'Excluido':
-            # Los excluidos siguen siendo excluidos
-            nuevo_estado = 'Excluido'
-            nuevo_destino = np.nan
-        elif fue_titular and not renuncio:
-            # Fue titular y no renunció = Aceptado
-            nuevo_estado = 'Aceptado'
-            nuevo_destino = destino_final
-        elif fue_titular and renuncio:
-            # CORRECCIÓN: Fue titular pero renunció = Renuncia SIN destino asignado
-            nuevo_estado = 'Renuncia'
-            nuevo_destino = np.nan  # Los que renuncian NO mantienen destino asignado
-        else:
-            # Nunca fue titular = No asignado
-            nuevo_estado = 'No asignado'
-            nuevo_destino = np.nan
-        
-        # Actualizar el DataFrame
-        estudiantes_actualizado.at[idx, 'EstadoFinal'] = nuevo_estado
-        estudiantes_actualizado.at[idx, 'DestinoAsignado'] = nuevo_destino
-    
-    return estudiantes_actualizado
+    return aplicar_esquema(estudiantes_actualizado, "Estudiantes")
 
 def verificar_actualizacion_destinos(estudiantes_original, estudiantes_actualizado):
     """
@@ -1360,24 +1457,16 @@ def verificar_actualizacion_destinos(estudiantes_original, estudiantes_actualiza
     cambios_destino = 0
     destinos_asignados_nuevos = 0
     
-    for idx, (orig, act) in enumerate(zip(estudiantes_original.iterrows(), estudiantes_actualizado.iterrows())):
-        orig_row = orig[1]
-        act_row = act[1]
-        
-        # Verificar cambios de estado
-        if orig_row['EstadoFinal'] != act_row['EstadoFinal']:
-            cambios_estado += 1
-        
-        # Verificar cambios de destino
-        orig_destino = orig_row['DestinoAsignado']
-        act_destino = act_row['DestinoAsignado']
-        
-        if pd.isna(orig_destino) != pd.isna(act_destino):
-            if pd.isna(orig_destino) and not pd.isna(act_destino):
-                destinos_asignados_nuevos += 1
-            cambios_destino += 1
-        elif not pd.isna(orig_destino) and not pd.isna(act_destino) and orig_destino != act_destino:
-            cambios_destino += 1
+    cambios_estado = int((
+        estudiantes_original['EstadoFinal'].astype(str).to_numpy() != estudiantes_actualizado['EstadoFinal'].astype(str).to_numpy()
+    ).sum())
+    
+    # Cambios de destino: pasar de/a sin destino o cambiar entre dos destinos distintos
+    orig_destino = estudiantes_original['DestinoAsignado'].astype('Float64').to_numpy(dtype=float, na_value=np.nan)
+    act_destino = estudiantes_actualizado['DestinoAsignado'].astype('Float64').to_numpy(dtype=float, na_value=np.nan)
+    orig_nulo, act_nulo = np.isnan(orig_destino), np.isnan(act_destino)
+    cambios_destino = int(((orig_nulo != act_nulo) | (~orig_nulo & ~act_nulo & (orig_destino != act_destino))).sum())
+    destinos_asignados_nuevos = int((orig_nulo & ~act_nulo).sum())
     
     # Estadísticas finales
     total_aceptados = len(estudiantes_actualizado[estudiantes_actualizado['EstadoFinal'] == 'Aceptado'])
@@ -1480,9 +1569,10 @@ def generar_reporte_gestion_plazas(gestion_plazas, destinos_df, estudiantes_df):
     print("📊 Generando reporte de gestión de plazas...")
     
     reporte = []
+    destinos_por_id = destinos_df.drop_duplicates('DestinoID').set_index('DestinoID')[['NombreDestino', 'NúmeroPlazas']].to_dict('index')
     
     for destino_id in gestion_plazas['plazas_disponibles']:
-        destino_info = destinos_df[destinos_df['DestinoID'] == destino_id].iloc[0]
+        destino_info = destinos_por_id[destino_id]
         nombre_destino = destino_info['NombreDestino']
         plazas_totales = destino_info['NúmeroPlazas']
         
@@ -1516,7 +1606,7 @@ def generar_reporte_gestion_plazas(gestion_plazas, destinos_df, estudiantes_df):
             })
     
     reporte_df = pd.DataFrame(reporte)
-    return reporte_df
+    return aplicar_esquema(reporte_df, "ReporteGestionPlazas")
 
 def validar_coherencia_temporal_destinos(estudiantes_df, destinos_df):
     """
@@ -1526,19 +1616,17 @@ def validar_coherencia_temporal_destinos(estudiantes_df, destinos_df):
     print("🕐 Validando coherencia temporal entre solicitudes y cancelaciones...")
     
     inconsistencias_temporales = []
+    destinos_por_id = dict(zip(destinos_df['DestinoID'], zip(destinos_df['Cancelado'], destinos_df['FechaCancelación'])))
     
-    for _, estudiante in estudiantes_df.iterrows():
-        estudiante_id = estudiante['EstudianteID']
-        destino_solicitado = estudiante['DestinoSolicitado']
-        fecha_solicitud = datetime.strptime(estudiante['FechaSolicitud'], '%Y-%m-%d')
+    for estudiante_id, destino_solicitado, fecha_solicitud in zip(
+        estudiantes_df['EstudianteID'], estudiantes_df['DestinoSolicitado'], estudiantes_df['FechaSolicitud']
+    ):
+        fecha_solicitud = datetime.strptime(fecha_solicitud, '%Y-%m-%d')
         
         # Buscar información del destino solicitado
-        destino_info = destinos_df[destinos_df['DestinoID'] == destino_solicitado]
-        
-        if len(destino_info) > 0:
-            destino_info = destino_info.iloc[0]
-            cancelado = destino_info['Cancelado'] == 'Sí'
-            fecha_cancelacion_str = destino_info['FechaCancelación']
+        if destino_solicitado in destinos_por_id:
+            cancelado, fecha_cancelacion_str = destinos_por_id[destino_solicitado]
+            cancelado = cancelado == 'Sí'
             
             if cancelado and fecha_cancelacion_str:
                 try:
@@ -1573,7 +1661,7 @@ def validar_requisitos_idioma(estudiante_info, destino_info):
     """
     Valida si un estudiante cumple los requisitos de idioma para un destino específico.
     """
-    if destino_info['RequiereIdioma'] == 'No':
+    if not destino_info['RequiereIdioma']:
         return True  # No hay requisitos de idioma
     
     # Simular que el 85% de los estudiantes cumplen los requisitos de idioma
@@ -1585,10 +1673,11 @@ def aplicar_filtros_elegibilidad(estudiantes_elegibles, destinos_df):
     Aplica filtros de elegibilidad incluyendo requisitos de idioma.
     """
     estudiantes_filtrados = []
+    destinos_por_id = destinos_df.set_index('DestinoID')[['RequiereIdioma']].to_dict('index')
     
     for estudiante in estudiantes_elegibles:
         destino_id = estudiante['destino_solicitado']
-        destino_info = destinos_df[destinos_df['DestinoID'] == destino_id].iloc[0]
+        destino_info = destinos_por_id[destino_id]
         
         # Validar requisitos de idioma
         if validar_requisitos_idioma(estudiante, destino_info):
@@ -1610,6 +1699,46 @@ FECHAS_PUBLICACION = {
     18: datetime(2023, 1, 25, 0, 1, 0),   # Pub 3ª Adj
     22: datetime(2023, 2, 1, 0, 1, 0),    # Pub Definitiva
 }
+_CALENDARIO_PLANTILLA = (dict(PLAZOS), dict(FECHAS_PUBLICACION))
+
+def calendario_para_curso(anio_inicio):
+    """
+    Deriva PLAZOS y FECHAS_PUBLICACION de un curso desplazando el calendario plantilla
+    (curso que empieza en ANIO_CURSO_BASE) el número de años correspondiente.
+    """
+    desplazamiento = anio_inicio - ANIO_CURSO_BASE
+    plazos_plantilla, publicaciones_plantilla = _CALENDARIO_PLANTILLA
+    plazos = {
+        actividad_id: (inicio.replace(year=inicio.year + desplazamiento), fin.replace(year=fin.year + desplazamiento))
+        for actividad_id, (inicio, fin) in plazos_plantilla.items()
+    }
+    publicaciones = {
+        actividad_id: fecha.replace(year=fecha.year + desplazamiento)
+        for actividad_id, fecha in publicaciones_plantilla.items()
+    }
+    return plazos, publicaciones
+
+@contextmanager
+def configuracion_temporal(**valores):
+    """
+    Sustituye constantes del módulo (p. ej. USE_LLM=False) mientras dura el bloque `with` y restaura
+    los valores anteriores al salir, aunque haya una excepción. Los valores None se ignoran.
+    """
+    valores = {nombre: valor for nombre, valor in valores.items() if valor is not None}
+    anteriores = {nombre: globals()[nombre] for nombre in valores}
+    globals().update(valores)
+    try:
+        yield
+    finally:
+        globals().update(anteriores)
+
+def aplicar_curso(anio_inicio):
+    """
+    Fija el calendario del módulo (PLAZOS y FECHAS_PUBLICACION) al curso indicado mientras dura el
+    bloque `with aplicar_curso(anio):` y restaura el anterior al salir (ver configuracion_temporal).
+    """
+    plazos, fechas_publicacion = calendario_para_curso(anio_inicio)
+    return configuracion_temporal(PLAZOS=plazos, FECHAS_PUBLICACION=fechas_publicacion)
 
 def verificar_coherencia_final_plazas_estudiantes(destinos_df, estudiantes_df, gestion_plazas):
     """
@@ -1643,7 +1772,8 @@ def verificar_coherencia_final_plazas_estudiantes(destinos_df, estudiantes_df, g
     
     # Calcular tasas
     tasa_ocupacion = (estudiantes_aceptados / total_plazas_disponibles * 100) if total_plazas_disponibles > 0 else 0
-    tasa_participacion = (estudiantes_aceptados / NUM_ESTUDIANTES * 100)
+    total_estudiantes = len(estudiantes_df)
+    tasa_participacion = (estudiantes_aceptados / total_estudiantes * 100) if total_estudiantes > 0 else 0
     
     # Mostrar estadísticas
     print(f"   📊 PLAZAS DISPONIBLES:")
@@ -1652,7 +1782,7 @@ def verificar_coherencia_final_plazas_estudiantes(destinos_df, estudiantes_df, g
     print(f"      • Destinos cancelados: {destinos_cancelados}")
     
     print(f"   📊 ESTUDIANTES FINALES:")
-    print(f"      • Total estudiantes: {NUM_ESTUDIANTES}")
+    print(f"      • Total estudiantes: {total_estudiantes}")
     print(f"      • Aceptados: {estudiantes_aceptados}")
     print(f"      • Con destino asignado: {estudiantes_con_destino}")
     print(f"      • Renuncias: {estudiantes_renuncias}")
@@ -1661,7 +1791,7 @@ def verificar_coherencia_final_plazas_estudiantes(destinos_df, estudiantes_df, g
     
     print(f"   📊 COHERENCIA:")
     print(f"      • Tasa de ocupación: {tasa_ocupacion:.1f}% ({estudiantes_aceptados}/{total_plazas_disponibles})")
-    print(f"      • Tasa de participación: {tasa_participacion:.1f}% ({estudiantes_aceptados}/{NUM_ESTUDIANTES})")
+    print(f"      • Tasa de participación: {tasa_participacion:.1f}% ({estudiantes_aceptados}/{total_estudiantes})")
     print(f"      • Asignaciones reales (gestión): {asignaciones_reales_finales}")
     
     # Verificar coherencias
@@ -1701,89 +1831,408 @@ def verificar_coherencia_final_plazas_estudiantes(destinos_df, estudiantes_df, g
         'coherencias': coherencias
     }
 
+# ---- Escritura de resultados ----
+FORMATOS_SALIDA = ("csv", "parquet", "sqlite", "duckdb")  # sqlite/duckdb: un único fichero con todas las tablas
+COMPRESIONES_SALIDA = {None: "", "gzip": ".gz", "zstd": ".zst"}  # Extensión añadida a los CSV (zstd requiere zstandard)
+COMPRESION_SALIDA = None
+# Particionado estilo Hive por tabla: {"EventLog": "Fase", "HistoricoAdjudicaciones": "Ronda"} escribe
+# EventLog/Fase=<valor>/part-0.csv (las cohortes ya se escriben por curso en ruta_data/curso=AAAA-AA/)
+PARTICIONES_SALIDA = {}
+EVENTLOG_BINARIO = False  # Escribe además EventLog.evlog, legible con np.memmap (ver eventlog_binario.py)
+HILOS_ESCRITURA = 4  # Hilos de escritura cuando no se indica num_workers > 1
+NOMBRE_ESTADO = "estado_dataset.json"  # IDs máximos y plazas ocupadas, para ampliar el dataset sin releerlo (ver ampliacion.py)
+NOMBRE_RESUMEN_RUTAS = "ResumenRutas"  # Variantes y duraciones contadas al generar el EventLog (ver resumir_rutas)
+PARTICION_NULA = "__HIVE_DEFAULT_PARTITION__"
+
+def _escapar_particion(valor):
+    """Escapa un valor de partición como Hive/Spark (solo los caracteres no válidos en una ruta)."""
+    if pd.isna(valor):
+        return PARTICION_NULA
+    return "".join(
+        f"%{ord(c):02X}" if c in '"#%\'*/:=?\\{[]^' or ord(c) < 32 or ord(c) == 127 else c
+        for c in str(valor)
+    )
+
+def guardar_tablas(tablas, ruta_data, formato="csv", num_workers=1, compresion=None, particiones=None):
+    """
+    Guarda cada tabla {nombre: DataFrame} en ruta_data con el formato y la compresión indicados.
+    Las tablas de `particiones` ({nombre: columna}) se escriben en un directorio por valor de la columna
+    (nombre/columna=valor/part-0.ext). Todos los ficheros, incluidas las particiones, se escriben en
+    paralelo en un pool de hilos. Se borran las demás variantes de cada tabla en disco (otro formato,
+    compresión o particionado) para que los lectores no encuentren dos versiones. Devuelve las rutas escritas.
+    """
+    if formato not in FORMATOS_SALIDA:
+        raise ValueError(f"Formato de salida no soportado: {formato} (opciones: {', '.join(FORMATOS_SALIDA)})")
+    if compresion not in COMPRESIONES_SALIDA:
+        raise ValueError(f"Compresión no soportada: {compresion} (opciones: {', '.join(c for c in COMPRESIONES_SALIDA if c)})")
+    particiones = particiones or {}
+    if formato in MOTORES_BD:
+        if compresion or particiones:
+            raise ValueError(f"La salida {formato} no admite compresión ni particiones")
+        print(f"💾 Cargando {len(tablas)} tablas en una base de datos {formato}...")
+        return [guardar_en_bd(tablas, ruta_data, motor=formato)]
+    for nombre, columna in particiones.items():
+        if nombre in tablas and columna not in tablas[nombre].columns:
+            raise ValueError(f"La tabla {nombre} no tiene la columna de partición {columna}")
+    os.makedirs(ruta_data, exist_ok=True)
+    extension = _extension_salida(formato, compresion)
+    print(f"💾 Guardando {len(tablas)} tablas en formato {formato.upper()}{f' ({compresion})' if compresion else ''}...")
+
+    # Una escritura por fichero: las particiones de una tabla grande también se reparten entre hilos
+    escrituras = []
+    for nombre, df in tablas.items():
+        _eliminar_variantes(ruta_data, nombre, None if nombre in particiones else f"{nombre}.{extension}")
+        if nombre not in particiones:
+            escrituras.append((os.path.join(ruta_data, f"{nombre}.{extension}"), df))
+            continue
+        columna = particiones[nombre]
+        for valor, grupo in df.groupby(columna, dropna=False, sort=True):
+            directorio = os.path.join(ruta_data, nombre, f"{columna}={_escapar_particion(valor)}")
+            os.makedirs(directorio, exist_ok=True)
+            escrituras.append((os.path.join(directorio, f"part-0.{extension}"), grupo.drop(columns=columna)))
+
+    with ThreadPoolExecutor(max_workers=num_workers if num_workers > 1 else HILOS_ESCRITURA) as pool:
+        return list(pool.map(lambda item: _guardar_fichero(*item, formato, compresion), escrituras))
+
+def anexar_tablas(tablas, ruta_data, formato="csv", num_workers=1, compresion=None, particiones=None, reemplazar=()):
+    """
+    Añade las filas de cada tabla {nombre: DataFrame} a la misma tabla ya escrita por guardar_tablas, sin
+    reescribirla: al final del CSV (también comprimido: gzip y zstd admiten concatenar bloques), como un
+    nuevo part-N en cada partición o con INSERT en la base de datos. Las tablas de `reemplazar` se
+    sobrescriben enteras. Un Parquet sin particionar no se puede ampliar sin reescribirlo.
+    """
+    particiones = particiones or {}
+    nuevas = {nombre: df for nombre, df in tablas.items() if nombre not in reemplazar}
+    if formato in MOTORES_BD:
+        print(f"💾 Añadiendo filas a {len(nuevas)} tablas de la base de datos {formato}...")
+        ruta_bd = os.path.join(ruta_data, f"{NOMBRE_BD}.{MOTORES_BD[formato]}")
+        return [anexar_en_bd(tablas, ruta_bd, motor=formato, reemplazar=reemplazar)]
+    extension = _extension_salida(formato, compresion)
+    print(f"💾 Añadiendo filas a {len(nuevas)} tablas en formato {formato.upper()}{f' ({compresion})' if compresion else ''}...")
+
+    escrituras = []
+    for nombre, df in nuevas.items():
+        if nombre in particiones:
+            columna = particiones[nombre]
+            for valor, grupo in df.groupby(columna, dropna=False, sort=True, observed=True):
+                directorio = os.path.join(ruta_data, nombre, f"{columna}={_escapar_particion(valor)}")
+                os.makedirs(directorio, exist_ok=True)
+                parte = len(glob.glob(os.path.join(directorio, "part-*")))
+                escrituras.append((os.path.join(directorio, f"part-{parte}.{extension}"), grupo.drop(columns=columna), False))
+            continue
+        if formato == "parquet":
+            raise ValueError(f"No se pueden añadir filas a {nombre}.parquet sin reescribirlo; particiona la tabla (--partition)")
+        ruta = os.path.join(ruta_data, f"{nombre}.{extension}")
+        columnas = list(pd.read_csv(ruta, nrows=0).columns)
+        if sorted(columnas) != sorted(df.columns):
+            raise ValueError(f"Las columnas nuevas de {nombre} no coinciden con las de {ruta}: {list(df.columns)} != {columnas}")
+        escrituras.append((ruta, df[columnas], True))
+
+    with ThreadPoolExecutor(max_workers=num_workers if num_workers > 1 else HILOS_ESCRITURA) as pool:
+        rutas = list(pool.map(lambda item: _guardar_fichero(item[0], item[1], formato, compresion, anexar=item[2]), escrituras))
+    reemplazadas = {nombre: tablas[nombre] for nombre in reemplazar if nombre in tablas}
+    if reemplazadas:
+        rutas += guardar_tablas(reemplazadas, ruta_data, formato=formato, num_workers=num_workers,
+                                compresion=compresion, particiones=particiones)
+    return rutas
+
+def _eliminar_variantes(ruta_data, nombre, conservar=None):
+    """
+    Borra las versiones de una tabla escritas por otra ejecución: ficheros nombre.ext de cualquier formato
+    y compresión salvo `conservar`, y el directorio de particiones (siempre: también se vacía al volver
+    a particionar, para no dejar particiones obsoletas).
+    """
+    for formato in FORMATOS_SALIDA:
+        if formato in MOTORES_BD:
+            continue
+        for compresion in (COMPRESIONES_SALIDA if formato == "csv" else (None,)):
+            fichero = f"{nombre}.{_extension_salida(formato, compresion)}"
+            if fichero != conservar and os.path.exists(os.path.join(ruta_data, fichero)):
+                os.remove(os.path.join(ruta_data, fichero))
+    shutil.rmtree(os.path.join(ruta_data, nombre), ignore_errors=True)
+
+def _extension_salida(formato, compresion):
+    return formato + (COMPRESIONES_SALIDA[compresion] if formato == "csv" else "")
+
+def _guardar_fichero(ruta, df, formato, compresion, anexar=False):
+    if formato == "parquet":
+        # Requiere pyarrow o fastparquet; sin compresión explícita se usa la de pandas (snappy)
+        df.to_parquet(ruta, index=False, **({"compression": compresion} if compresion else {}))
+    else:
+        df.to_csv(ruta, index=False, compression=compresion, mode="a" if anexar else "w", header=not anexar)
+    return ruta
+
 # ---- Ejecución principal ----
-if __name__ == "__main__":
+def ejecutar_pipeline(num_estudiantes=None, num_destinos=None, ruta_data=None, semilla=None,
+                      formato="csv", num_workers=1, use_llm=None, modo_adjudicacion=None, factor_plazas=None,
+                      medir_memoria=None, usar_cache=None, ruta_cache=None, compresion=None, particiones=None,
+                      eventlog_binario=None, calibrar_plazas=None):
+    """
+    Ejecuta el pipeline completo de generación y guarda las tablas en ruta_data, junto con un
+    informe JSON de tiempos y memoria por etapa (ver instrumentacion.py). Con caché, solo se
+    recalculan las etapas afectadas por un cambio (requiere semilla).
+    `compresion` ("gzip"/"zstd") y `particiones` ({tabla: columna}) se pasan a guardar_tablas y
+    `eventlog_binario` añade EventLog.evlog.
+    Los parámetros no indicados toman el valor de las constantes del módulo; use_llm, modo_adjudicacion,
+    factor_plazas y calibrar_plazas solo se aplican durante la ejecución (ver configuracion_temporal).
+    Devuelve un diccionario con los DataFrames generados y el resultado de las validaciones.
+    """
+    num_estudiantes = NUM_ESTUDIANTES if num_estudiantes is None else num_estudiantes
+    num_destinos = NUM_DESTINOS if num_destinos is None else num_destinos
+    ruta_data = RUTA_DATA if ruta_data is None else ruta_data
+    with configuracion_temporal(USE_LLM=use_llm, MODO_ADJUDICACION=modo_adjudicacion, FACTOR_PLAZAS=factor_plazas,
+                                CALIBRAR_PLAZAS=calibrar_plazas):
+        try:
+            return _ejecutar_pipeline(num_estudiantes, num_destinos, ruta_data, semilla, formato, num_workers,
+                                      medir_memoria, usar_cache, ruta_cache, compresion, particiones, eventlog_binario)
+        finally:
+            desactivar_cache()  # La semilla por etapa no debe afectar a llamadas posteriores (cohortes, ampliación)
+
+def _ejecutar_pipeline(num_estudiantes, num_destinos, ruta_data, semilla, formato, num_workers,
+                       medir_memoria, usar_cache, ruta_cache, compresion, particiones, eventlog_binario):
+    if semilla is not None:
+        random.seed(semilla)
+        np.random.seed(semilla)
+
+    usar_cache = USAR_CACHE if usar_cache is None else usar_cache
+    if usar_cache and semilla is None:
+        print("⚠️ La caché de etapas requiere una semilla fija; se ejecuta sin caché.")
+        usar_cache = False
+    if usar_cache:
+        activar_cache(semilla, ruta_cache or RUTA_CACHE)
+    else:
+        desactivar_cache(semilla)
+
     print("🚀 Iniciando generación de datos Erasmus con coordinación mejorada...")
+    iniciar_ejecucion({
+        "num_estudiantes": num_estudiantes, "num_destinos": num_destinos, "semilla": semilla,
+        "formato": formato, "num_workers": num_workers, "use_llm": USE_LLM,
+        "modo_adjudicacion": MODO_ADJUDICACION, "factor_plazas": FACTOR_PLAZAS,
+        "calibrar_plazas": CALIBRAR_PLAZAS, "cache": usar_cache,
+        "compresion": compresion, "particiones": particiones,
+    }, medir_memoria=medir_memoria, segundos_arranque=SEGUNDOS_CARGA)
+    print(f"⏱️ Arranque (importación de módulos): {SEGUNDOS_CARGA:.3f} s")
+
+    dataset = generar_dataset(num_estudiantes, num_destinos)
+    guardar_dataset(dataset, ruta_data, formato=formato, num_workers=num_workers,
+                    compresion=compresion, particiones=particiones, eventlog_binario=eventlog_binario)
+    analitica = ejecutar_etapa("analitica", analizar_eventlog, dataset["eventlog"])
+    ruta_informe = guardar_informe(ruta_data)
+    print(f"⏱️ Informe de ejecución guardado en {ruta_informe}")
+
+    print(f"\n✅ Generación de CSVs Erasmus COMPLETADA con coordinación mejorada.")
+    print(f"📈 Resumen: {len(dataset['inconsistencias'])} inconsistencias detectadas y reportadas.")
+    imprimir_resumen(analitica["resumen"])
+    return dataset
+
+def generar_dataset(num_estudiantes, num_destinos=None, destinos=None):
+    """
+    Ejecuta todas las etapas de generación, sincronización y validación sin escribir en disco.
+    Si se pasa `destinos` se reutiliza ese catálogo en lugar de generar uno nuevo.
+    Devuelve un diccionario con los DataFrames, las inconsistencias y la coherencia final.
+    """
+    if USE_LLM:
+        # Las tres peticiones al LLM se lanzan a la vez y cada etapa espera solo la suya cuando la necesita.
+        # Con la caché de etapas no se precarga lo que usan etapas que se van a recuperar de ella: los
+        # motivos se piden al ejecutar las alegaciones y los patrones cuando se conocen las entradas del EventLog.
+        peticiones = {} if cache_activa() else {"motivos": 20, "patrones": 20}
+        if destinos is None and not en_cache("destinos", generar_destinos, num_destinos):
+            peticiones["universidades"] = num_destinos
+        if peticiones:
+            iniciar_precarga(peticiones)
+
+    if destinos is None:
+        destinos = etapa("destinos", generar_destinos, num_destinos)
+    else:
+        destinos = aplicar_esquema(destinos, "Destinos")
+    destinos = etapa("normalizacion_nombres", normalizar_nombres_destinos, destinos)
+    estudiantes = etapa("estudiantes", generar_estudiantes, num_estudiantes, destinos)
+    actividades = etapa("actividades", generar_actividades)
 
-    destinos = generar_destinos(NUM_DESTINOS)
-    estudiantes = generar_estudiantes(NUM_ESTUDIANTES, destinos)
-    actividades = generar_actividades()
+    if CALIBRAR_PLAZAS:
+        from calibracion_plazas import calibrar_plazas
+        destinos = etapa("calibracion", calibrar_plazas, destinos, estudiantes)['destinos']
 
     # Generamos alegaciones PRIMERO para obtener los IDs correspondientes
-    alegaciones, estudiantes_con_alegaciones_ids = generar_alegaciones(estudiantes)
+    alegaciones, estudiantes_con_alegaciones_ids = etapa("alegaciones", generar_alegaciones, estudiantes)
+    if USE_LLM and cache_activa() and not en_cache(
+            "eventlog", generar_eventlog, estudiantes, actividades, destinos, estudiantes_con_alegaciones_ids):
+        iniciar_precarga({"patrones": 20})  # Se solapa con la adjudicación y el ajuste
 
     # PASO 1: Simular adjudicación con control de plazas
     print("🎯 Simulando proceso de adjudicación con control de plazas...")
-    gestion_plazas = simular_adjudicacion_con_plazas(estudiantes, destinos)
+    if MODO_ADJUDICACION == "diferida":
+        from adjudicacion_diferida import generar_preferencias, preferencias_a_texto, simular_adjudicacion_aceptacion_diferida
+        preferencias = etapa("preferencias", generar_preferencias, estudiantes, destinos)
+        estudiantes['Preferencias'] = preferencias_a_texto(preferencias)
+        gestion_plazas = etapa("adjudicacion", simular_adjudicacion_aceptacion_diferida, estudiantes, destinos, preferencias)
+    else:
+        gestion_plazas = etapa("adjudicacion", simular_adjudicacion_con_plazas, estudiantes, destinos)
     
     # PASO 1.5: Ajustar asignaciones para respetar límites de plazas
-    gestion_plazas = ajustar_asignaciones_por_plazas(gestion_plazas, destinos)
+    gestion_plazas = etapa("ajuste", ajustar_asignaciones_por_plazas, gestion_plazas, destinos, estudiantes)
 
     # PASO 2: Generar EventLog como fuente de verdad (CORREGIDO: usar función original)
     print("📊 Generando EventLog como fuente de verdad...")
-    eventlog = generar_eventlog(estudiantes, actividades, destinos, estudiantes_con_alegaciones_ids)
+    eventlog, rutas = etapa("eventlog", generar_eventlog, estudiantes, actividades, destinos, estudiantes_con_alegaciones_ids)
+    anotar_informe("rutas_eventlog", rutas["resumen"])
+    print(f"🧭 Rutas: {rutas['resumen']['variantes']} variantes en {rutas['resumen']['casos']} casos, "
+          f"{rutas['resumen']['casos_bucle_la']} con bucles de LA, duración media {rutas['resumen']['duracion_dias']['media']} días")
 
     # PASO 2.5: Actualizar estados finales basándose en gestión de plazas
     print("🔄 Actualizando estados finales desde gestión de plazas...")
     estudiantes_original = estudiantes.copy()  # Guardar copia para verificación
-    estudiantes = actualizar_estados_desde_gestion_plazas(estudiantes, gestion_plazas)
+    estudiantes = etapa("estados", actualizar_estados_desde_gestion_plazas, estudiantes, gestion_plazas)
     
     # Verificar que la actualización funcionó correctamente
-    verificar_actualizacion_destinos(estudiantes_original, estudiantes)
+    etapa("verificacion_destinos", verificar_actualizacion_destinos, estudiantes_original, estudiantes)
     
     # Verificar coherencia entre plazas y asignaciones
-    verificar_coherencia_plazas(destinos, gestion_plazas, estudiantes)
+    etapa("verificacion_plazas", verificar_coherencia_plazas, destinos, gestion_plazas, estudiantes)
 
     # PASO 3: Extraer histórico coherente desde gestión de plazas
     print("📋 Extrayendo histórico de adjudicaciones desde gestión de plazas...")
-    historico = extraer_historico_desde_gestion_plazas(gestion_plazas, eventlog)
+    historico = etapa("historico", extraer_historico_desde_gestion_plazas, gestion_plazas, eventlog)
 
     # PASO 3.5: Sincronizar fechas entre histórico y EventLog
-    historico = sincronizar_fechas_historico_eventlog(historico, eventlog)
+    historico = etapa("sincronizacion_historico", sincronizar_fechas_historico_eventlog, historico, eventlog)
 
     # PASO 3.6: Sincronizar fechas de alegaciones con EventLog
     print("🔄 Sincronizando fechas de alegaciones con EventLog...")
-    alegaciones = sincronizar_alegaciones_eventlog(alegaciones, eventlog)
+    alegaciones = etapa("sincronizacion_alegaciones", sincronizar_alegaciones_eventlog, alegaciones, eventlog)
 
     # PASO 4: Generar reporte de gestión de plazas
     print("📊 Generando reporte de gestión de plazas...")
-    reporte_plazas = generar_reporte_gestion_plazas(gestion_plazas, destinos, estudiantes)
+    reporte_plazas = etapa("reporte", generar_reporte_gestion_plazas, gestion_plazas, destinos, estudiantes)
 
     # PASO 5: Validar coherencia entre todas las fuentes
     print("✅ Validando coherencia entre fuentes de datos...")
-    inconsistencias = validar_coherencia_datos(estudiantes, eventlog, historico)
+    inconsistencias = etapa("validacion_datos", validar_coherencia_datos, estudiantes, eventlog, historico)
     
     # PASO 5.5: Validar coherencia temporal de destinos
-    inconsistencias_temporales = validar_coherencia_temporal_destinos(estudiantes, destinos)
+    inconsistencias_temporales = etapa("validacion_temporal", validar_coherencia_temporal_destinos, estudiantes, destinos)
     inconsistencias.extend(inconsistencias_temporales)
 
+    # PASO 5.6: Comprobar que cada ruta del EventLog es aceptada por el modelo de proceso
+    no_conformes = etapa("conformidad", verificar_conformidad_eventlog, eventlog, actividades)
+    inconsistencias.extend(
+        f"Estudiante {fila.EstudianteID}: ruta no conforme ({fila.Motivo}: {fila.ActividadPrevia} -> {fila.ActividadID} en la posición {fila.Posicion})"
+        for fila in no_conformes.itertuples()
+    )
+
     # PASO 6: Verificar coherencia final entre plazas y estudiantes
     print("🔍 Verificando coherencia final del sistema...")
-    coherencia_final = verificar_coherencia_final_plazas_estudiantes(destinos, estudiantes, gestion_plazas)
-
-    # --- Corrección de Tipos de Datos antes de Guardar ---
-    # Convertir DestinoAsignado a tipo Int64 nullable de pandas para permitir NaN pero ser entero
-    estudiantes['DestinoAsignado'] = estudiantes['DestinoAsignado'].astype(pd.Int64Dtype())
-    historico['DestinoID'] = historico['DestinoID'].astype(pd.Int64Dtype()) # También en histórico por consistencia
-
-    # Guardar todos los CSVs
-    print("💾 Guardando archivos CSV...")
-    destinos.to_csv(f"{RUTA_DATA}/Destinos.csv", index=False)
-    estudiantes.to_csv(f"{RUTA_DATA}/Estudiantes.csv", index=False)
-    actividades.to_csv(f"{RUTA_DATA}/Actividades.csv", index=False)
-    eventlog.to_csv(f"{RUTA_DATA}/EventLog.csv", index=False)
-    alegaciones.to_csv(f"{RUTA_DATA}/Alegaciones.csv", index=False)
-    historico.to_csv(f"{RUTA_DATA}/HistoricoAdjudicaciones.csv", index=False)
-    reporte_plazas.to_csv(f"{RUTA_DATA}/ReporteGestionPlazas.csv", index=False)
+    coherencia_final = etapa("coherencia_final", verificar_coherencia_final_plazas_estudiantes, destinos, estudiantes, gestion_plazas)
+
+    dataset = {
+        "destinos": destinos,
+        "estudiantes": estudiantes,
+        "actividades": actividades,
+        "eventlog": eventlog,
+        "alegaciones": alegaciones,
+        "historico": historico,
+        "reporte_plazas": reporte_plazas,
+        "resumen_rutas": rutas["tabla"],
+        "inconsistencias": inconsistencias,
+        "coherencia_final": coherencia_final,
+    }
+
+    # Las tablas ya se construyen con el esquema compacto (ver esquema.py); se informa del ahorro de memoria
+    memoria = ejecutar_etapa(
+        "memoria", informe_memoria, {nombre: dataset[clave] for clave, nombre in TABLAS_DATASET.items()}
+    )
+    anotar_informe("memoria_tablas", memoria)
+    return dataset
+
+# Nombre de fichero de cada tabla del dataset
+TABLAS_DATASET = {
+    "destinos": "Destinos",
+    "estudiantes": "Estudiantes",
+    "actividades": "Actividades",
+    "eventlog": "EventLog",
+    "alegaciones": "Alegaciones",
+    "historico": "HistoricoAdjudicaciones",
+    "reporte_plazas": "ReporteGestionPlazas",
+}
+# Identificador secuencial de cada tabla (EstudianteID también aparece en las demás tablas de casos)
+COLUMNAS_ID_DATASET = {
+    "estudiantes": "EstudianteID",
+    "eventlog": "EventID",
+    "alegaciones": "AlegacionID",
+    "historico": "AsignacionID",
+}
+
+def tablas_de_dataset(dataset, particiones=None):
+    """
+    Tablas {nombre de fichero: DataFrame} de un dataset. Se puede particionar el EventLog por Fase aunque
+    no sea una de sus columnas: se obtiene de Actividades.
+    """
+    tablas = {nombre: dataset[clave] for clave, nombre in TABLAS_DATASET.items() if clave in dataset}
+    if (particiones or {}).get("EventLog") == "Fase" and "Fase" not in tablas["EventLog"].columns:
+        actividades = dataset["actividades"] if "actividades" in dataset else generar_actividades()  # Las cohortes no la guardan por curso
+        fases = dict(zip(actividades["ActividadID"], actividades["Fase"]))
+        tablas["EventLog"] = tablas["EventLog"].assign(Fase=tablas["EventLog"]["ActividadID"].map(fases))
+    return tablas
+
+def estado_dataset(dataset, formato="csv", compresion=None, particiones=None):
+    """
+    Resume lo necesario para ampliar el dataset más adelante sin volver a leerlo: formato de salida,
+    curso, modo de adjudicación, último ID de cada tabla, plazas ocupadas (aceptados) por destino y
+    filas por tabla.
+    """
+    estudiantes = dataset["estudiantes"]
+    aceptados = estudiantes.loc[estudiantes["EstadoFinal"] == "Aceptado", "DestinoAsignado"].dropna()
+    return {
+        "formato": formato,
+        "compresion": compresion,
+        "particiones": dict(particiones or {}),
+        "anio_curso": PLAZOS[4][0].year,
+        "modo_adjudicacion": MODO_ADJUDICACION,
+        "ids": {columna: int(dataset[clave][columna].max()) if len(dataset[clave]) else 0
+                for clave, columna in COLUMNAS_ID_DATASET.items()},
+        "plazas_ocupadas": {str(int(d)): int(n) for d, n in aceptados.value_counts().sort_index().items()},
+        "filas": {nombre: len(dataset[clave]) for clave, nombre in TABLAS_DATASET.items() if clave in dataset},
+    }
+
+def guardar_estado_dataset(ruta_data, estado):
+    with open(os.path.join(ruta_data, NOMBRE_ESTADO), "w", encoding="utf-8") as f:
+        json.dump(estado, f, ensure_ascii=False, indent=2)
+
+def guardar_dataset(dataset, ruta_data, formato="csv", num_workers=1, compresion=None, particiones=None,
+                    eventlog_binario=None):
+    """
+    Guarda las tablas de un dataset, su estado (NOMBRE_ESTADO), el resumen de rutas
+    (NOMBRE_RESUMEN_RUTAS) y, si las hay, el reporte de inconsistencias. Con `eventlog_binario` se
+    escribe también EventLog.evlog; sin él se borra el de una ejecución anterior, que ya no coincidiría.
+    """
+    compresion = COMPRESION_SALIDA if compresion is None else compresion
+    particiones = PARTICIONES_SALIDA if particiones is None else particiones
+    eventlog_binario = EVENTLOG_BINARIO if eventlog_binario is None else eventlog_binario
+    tablas = tablas_de_dataset(dataset, particiones)
+    if "resumen_rutas" in dataset:
+        tablas[NOMBRE_RESUMEN_RUTAS] = dataset["resumen_rutas"]  # Mismo formato y compresión que las demás tablas
+    ejecutar_etapa(
+        "escritura", guardar_tablas, tablas, ruta_data,
+        formato=formato, num_workers=num_workers, compresion=compresion, particiones=particiones
+    )
+    guardar_estado_dataset(ruta_data, estado_dataset(dataset, formato, compresion, particiones))
+    ruta_binaria = os.path.join(ruta_data, f"EventLog.{EXTENSION_BINARIA}")
+    if eventlog_binario:
+        ejecutar_etapa("escritura_binaria", escribir_eventlog_binario, dataset["eventlog"], ruta_binaria)
+        print(f"💾 EventLog binario guardado en {ruta_binaria}")
+    elif os.path.exists(ruta_binaria):
+        os.remove(ruta_binaria)
+        print(f"🗑️ Eliminado {ruta_binaria} de una ejecución anterior")
 
     # Guardar reporte de validación
+    inconsistencias = dataset.get("inconsistencias", [])
     if inconsistencias:
-        with open(f"{RUTA_DATA}/reporte_inconsistencias.txt", "w", encoding="utf-8") as f:
+        with open(f"{ruta_data}/reporte_inconsistencias.txt", "w", encoding="utf-8") as f:
             f.write("REPORTE DE INCONSISTENCIAS\n")
             f.write("=" * 50 + "\n\n")
             for inc in inconsistencias:
                 f.write(f"- {inc}\n")
-        print(f"⚠️ Se guardó reporte de inconsistencias en {RUTA_DATA}/reporte_inconsistencias.txt")
+        print(f"⚠️ Se guardó reporte de inconsistencias en {ruta_data}/reporte_inconsistencias.txt")
 
-    print(f"\n✅ Generación de CSVs Erasmus COMPLETADA con coordinación mejorada.")
-    print(f"📈 Resumen: {len(inconsistencias)} inconsistencias detectadas y reportadas.")
+if __name__ == "__main__":
+    ejecutar_pipeline()
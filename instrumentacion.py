@@ -0,0 +1,145 @@
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+# ---- Configuración de la instrumentación ----
+MEDIR_MEMORIA = False  # tracemalloc da el pico de memoria Python por etapa, pero ralentiza mucho las etapas con bucles
+NOMBRE_INFORME = "informe_ejecucion.json"
+
+# Funciones a las que se envía cada registro de etapa (p. ej. para reenviarlo a un colector externo)
+HOOKS_METRICAS = []
+
+# Estado de la ejecución en curso
+_INFORME = {"etapas": []}
+
+def registrar_hook(funcion):
+    """Añade una función que recibirá el diccionario de métricas de cada etapa al terminar."""
+    HOOKS_METRICAS.append(funcion)
+    return funcion
+
+def eliminar_hook(funcion):
+    """Deja de enviar métricas a una función registrada con registrar_hook."""
+    if funcion in HOOKS_METRICAS:
+        HOOKS_METRICAS.remove(funcion)
+
+def _reiniciar_pico_rss():
+    """En Linux reinicia el pico de RSS del proceso para poder medirlo por etapa (no-op en otros sistemas)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def _pico_rss_mb():
+    """
+    Pico de RSS en MB: VmHWM en Linux, ru_maxrss (pico de todo el proceso) en otros Unix y None donde
+    no existe el módulo resource (Windows).
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmHWM:"):
+                    return round(int(linea.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource  # Solo en Unix
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def contar_filas(valor):
+    """Número de filas de una entrada o salida de etapa (DataFrame, lista, tupla o gestión de plazas)."""
+    if isinstance(valor, (pd.DataFrame, pd.Series, list)):
+        return len(valor)
+    if isinstance(valor, tuple):
+        return sum(contar_filas(v) or 0 for v in valor) or None
+    if isinstance(valor, dict):
+        if "historial_estudiantes" in valor:
+            return len(valor["historial_estudiantes"])  # Estudiantes con alguna asignación
+        filas = [contar_filas(v) for v in valor.values()]
+        return sum(f for f in filas if f) or None
+    return None
+
+def iniciar_ejecucion(parametros=None, medir_memoria=None, segundos_arranque=None):
+    """
+    Reinicia el informe de la ejecución y activa tracemalloc si se pide medir la memoria Python.
+    `segundos_arranque` es el tiempo de importación de los módulos previo a la primera etapa.
+    """
+    global _INFORME
+    medir_memoria = MEDIR_MEMORIA if medir_memoria is None else medir_memoria
+    if medir_memoria and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _INFORME = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "parametros": dict(parametros or {}),
+        "tracemalloc": medir_memoria,
+        "segundos_arranque": round(segundos_arranque, 4) if segundos_arranque is not None else None,
+        "inicio": (time.perf_counter(), time.process_time()),
+        "etapas": [],
+    }
+
+def ejecutar_etapa(nombre, funcion, *args, metadatos=None, **kwargs):
+    """
+    Ejecuta una etapa del pipeline registrando tiempo de pared, tiempo de CPU, pico de memoria
+    (tracemalloc si está activo y RSS) y filas de entrada y salida. `metadatos` se añade tal cual
+    al registro. Devuelve el resultado de la etapa.
+    """
+    filas_entrada = sum(contar_filas(a) or 0 for a in args if isinstance(a, (pd.DataFrame, dict)))
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    rss_por_etapa = _reiniciar_pico_rss()
+    inicio_pared, inicio_cpu = time.perf_counter(), time.process_time()
+
+    resultado = funcion(*args, **kwargs)
+
+    registro = {
+        "etapa": nombre,
+        "segundos": round(time.perf_counter() - inicio_pared, 4),
+        "segundos_cpu": round(time.process_time() - inicio_cpu, 4),
+        "filas_entrada": filas_entrada,
+        "filas_salida": contar_filas(resultado),
+        "pico_memoria_mb": round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2) if tracemalloc.is_tracing() else None,
+        "pico_rss_mb": _pico_rss_mb(),
+        "rss_por_etapa": rss_por_etapa,
+        **(metadatos or {}),
+    }
+    _INFORME["etapas"].append(registro)
+
+    for hook in list(HOOKS_METRICAS):
+        try:
+            hook(registro)
+        except Exception as e:  # Un colector externo nunca debe interrumpir la generación
+            print(f"⚠️ Error en el hook de métricas {getattr(hook, '__name__', hook)}: {e}")
+    return resultado
+
+def anotar_informe(clave, valor):
+    """Añade al informe de la ejecución en curso un resultado que no es de una etapa concreta."""
+    _INFORME[clave] = valor
+
+def obtener_informe():
+    """Devuelve el informe de la ejecución en curso con los totales acumulados."""
+    informe = {clave: valor for clave, valor in _INFORME.items() if clave != "inicio"}
+    if "inicio" in _INFORME:
+        inicio_pared, inicio_cpu = _INFORME["inicio"]
+        informe["segundos_totales"] = round(time.perf_counter() - inicio_pared, 4)
+        informe["segundos_cpu_totales"] = round(time.process_time() - inicio_cpu, 4)
+    informe["pico_rss_mb"] = max((e["pico_rss_mb"] for e in _INFORME["etapas"] if e["pico_rss_mb"] is not None), default=None)
+    return informe
+
+def guardar_informe(ruta_data, nombre=NOMBRE_INFORME):
+    """Escribe el informe JSON de la ejecución junto a los datos y devuelve su ruta."""
+    os.makedirs(ruta_data, exist_ok=True)
+    ruta = os.path.join(ruta_data, nombre)
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(obtener_informe(), f, ensure_ascii=False, indent=2, default=str)
+    return ruta
@@ -1,47 +1,92 @@
-import pandas as pd
-import re
-
-def limpiar_nombres_universidades():
-    """
-    Limpia los números del formato "1. ", "2. ", etc. del inicio de los nombres de universidades
-    en los archivos Destinos.csv y ReporteGestionPlazas.csv
-    """
-    
-    # Función para limpiar el nombre
-    def limpiar_nombre(nombre):
-        # Usar regex para eliminar el patrón "número. " del inicio
-        return re.sub(r'^\d+\.\s*', '', str(nombre))
-    
-    print("🧹 Limpiando nombres de universidades...")
-    
-    # 1. Limpiar Destinos.csv
-    print("   📄 Procesando Destinos.csv...")
-    destinos_df = pd.read_csv('data/Destinos.csv')
-    destinos_df['NombreDestino'] = destinos_df['NombreDestino'].apply(limpiar_nombre)
-    destinos_df.to_csv('data/Destinos.csv', index=False)
-    print(f"   ✅ Limpiados {len(destinos_df)} destinos")
-    
-    # 2. Limpiar ReporteGestionPlazas.csv
-    print("   📄 Procesando ReporteGestionPlazas.csv...")
-    reporte_df = pd.read_csv('data/ReporteGestionPlazas.csv')
-    reporte_df['NombreDestino'] = reporte_df['NombreDestino'].apply(limpiar_nombre)
-    reporte_df.to_csv('data/ReporteGestionPlazas.csv', index=False)
-    print(f"   ✅ Limpiados {len(reporte_df)} registros del reporte")
-    
-    # Mostrar algunos ejemplos de antes y después
-    print("\n📋 Ejemplos de nombres limpiados:")
-    ejemplos = [
-        "1. Universidad de Heidelberg",
-        "25. Universidad de Ljubljana", 
-        "100. Universidad de Aveiro",
-        "372. Universidad de Última"
-    ]
-    
-    for ejemplo in ejemplos:
-        limpio = limpiar_nombre(ejemplo)
-        print(f"   • '{ejemplo}' → '{limpio}'")
-    
-    print("\n✅ Limpieza completada. Los archivos han sido actualizados.")
-
-if __name__ == "__main__":
-    limpiar_nombres_universidades() 
\ No newline at end of file
+import argparse
+import os
+
+import pandas as pd
+
+from llm_helpers import limpiar_nombres
+
+# La normalización de nombres se aplica ya en el pipeline (etapa normalizacion_nombres de generate_data).
+# Este script solo corrige datasets generados con versiones anteriores, leyendo los ficheros por bloques
+# para que los reportes grandes no tengan que caber en memoria.
+TABLAS_CON_NOMBRES = ("Destinos", "ReporteGestionPlazas")
+COLUMNA_NOMBRES = "NombreDestino"
+TAMANO_BLOQUE = 200_000  # Filas por bloque al reescribir un fichero
+
+def corregir_fichero(ruta, columna=COLUMNA_NOMBRES, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Reescribe un CSV limpiando `columna` bloque a bloque. Las demás columnas se leen y escriben como
+    texto, sin alterar su formato. Si ningún nombre cambia, el fichero original se deja intacto.
+    Devuelve (filas procesadas, nombres corregidos).
+    """
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    filas, corregidos = 0, 0
+    try:
+        bloques = pd.read_csv(ruta, dtype=str, keep_default_na=False, chunksize=tamano_bloque)
+        for i, bloque in enumerate(bloques):
+            limpios = limpiar_nombres(bloque[columna])
+            corregidos += int((limpios != bloque[columna]).sum())
+            filas += len(bloque)
+            bloque[columna] = limpios
+            bloque.to_csv(temporal, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+        if corregidos:
+            os.replace(temporal, ruta)  # Sustitución atómica: el original sigue intacto si algo falla antes
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    return filas, corregidos
+
+def ficheros_con_nombres(ruta_data):
+    """
+    Busca bajo `ruta_data` los ficheros *.csv* de las tablas con nombres: nombre.csv* (también en los
+    directorios curso=... de las cohortes) y los part-N.csv* de sus particiones.
+    Devuelve (rutas a corregir, [(ruta, motivo)] omitidas): solo se pueden reescribir los CSV sin comprimir
+    que tienen la columna de nombres (no la tiene una tabla particionada por ella).
+    """
+    corregir, omitidos = [], []
+    for directorio, _, ficheros in sorted(os.walk(ruta_data)):
+        en_particion = any(parte in TABLAS_CON_NOMBRES for parte in os.path.relpath(directorio, ruta_data).split(os.sep))
+        for nombre in sorted(ficheros):
+            tabla, _, extension = nombre.partition(".")
+            if not extension.startswith("csv") or extension.endswith(".tmp") or not (tabla in TABLAS_CON_NOMBRES or en_particion):
+                continue
+            ruta = os.path.join(directorio, nombre)
+            if extension != "csv":
+                omitidos.append((ruta, f"comprimido ({extension.split('.', 1)[1]})"))
+            elif COLUMNA_NOMBRES not in pd.read_csv(ruta, nrows=0).columns:
+                omitidos.append((ruta, f"sin columna {COLUMNA_NOMBRES}"))
+            else:
+                corregir.append(ruta)
+    return corregir, omitidos
+
+def corregir_dataset(ruta_data="data", tamano_bloque=TAMANO_BLOQUE):
+    """Corrige los nombres de todos los CSV de Destinos y ReporteGestionPlazas bajo `ruta_data` (incluidas particiones)."""
+    print(f"🧹 Limpiando nombres de universidades en {ruta_data}...")
+    total = 0
+    corregir, omitidos = ficheros_con_nombres(ruta_data)
+    for ruta in corregir:
+        filas, corregidos = corregir_fichero(ruta, tamano_bloque=tamano_bloque)
+        total += corregidos
+        print(f"   ✅ {ruta}: {corregidos} de {filas} nombres corregidos")
+    for ruta, motivo in omitidos:
+        print(f"   ⚠️ {ruta}: omitido, {motivo}")
+    print(f"\n✅ Limpieza completada: {total} nombres corregidos"
+          + (f"; {len(omitidos)} ficheros omitidos (regenera el dataset o descomprímelos para corregirlos)." if omitidos else "."))
+    return total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Limpia la numeración de los nombres de universidades.")
+    parser.add_argument("--fix-existing", action="store_true",
+                        help="Corregir un dataset generado anteriormente (los nuevos ya salen normalizados)")
+    parser.add_argument("--data-dir", default="data", help="Directorio del dataset (por defecto: data)")
+    parser.add_argument("--chunk-size", type=int, default=TAMANO_BLOQUE, help="Filas por bloque al reescribir")
+    args = parser.parse_args(argv)
+
+    if not args.fix_existing:
+        print("ℹ️ Los nombres ya se normalizan durante la generación (etapa normalizacion_nombres).")
+        print("   Usa --fix-existing para corregir datasets generados con versiones anteriores.")
+        return 0
+    corregir_dataset(args.data_dir, args.chunk_size)
+    return 0
+
+if __name__ == "__main__":
+    main()
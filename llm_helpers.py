@@ -1,95 +1,349 @@
+import asyncio
+import hashlib
+import json
 import os
-from dotenv import load_dotenv
 import random
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from conformidad import filtrar_patrones
+
+# ---- Configuración del proveedor LLM ----
+# openai y python-dotenv solo se importan la primera vez que se llama al proveedor, de modo que las
+# ejecuciones sin LLM (USE_LLM = False) no pagan su importación ni la creación del cliente.
+PROVEEDOR_LLM = "openai"  # Ver registrar_proveedor para añadir otros
+MODELO_LLM = "gpt-4"
+
+# ---- Caché persistente de respuestas ----
+# Las respuestas se guardan en disco bajo un hash de (modelo, mensajes, temperatura, n): una ejecución
+# con la caché caliente no llama a la red y reproduce exactamente las mismas universidades, motivos y patrones.
+USAR_CACHE_LLM = True
+REFRESCAR_CACHE_LLM = False  # True fuerza nuevas llamadas y sobrescribe las entradas existentes
+RUTA_CACHE_LLM = ".cache_llm"
+TTL_CACHE_LLM = 30 * 24 * 3600  # Segundos de validez de una respuesta (None = sin caducidad; las de lote no caducan)
+TAMANO_MAX_CACHE_LLM = 50 * 1024 * 1024  # Bytes; se eliminan primero las entradas usadas hace más tiempo
+
+# ---- Precarga asíncrona ----
+TIMEOUT_LLM = 60       # Segundos máximos por petición al proveedor (el único timeout: un intento no se corta)
+REINTENTOS_LLM = 3     # Intentos por petición antes de usar el fallback
+BACKOFF_LLM = 2.0      # Espera base (s) entre intentos; se duplica en cada reintento
+
+# ---- Modo por lotes ----
+# None: llamadas interactivas. "escribir": las peticiones sin respuesta en caché se anotan en
+# RUTA_LOTE_LLM (formato JSONL de la Batch API de OpenAI) en lugar de enviarse. "offline": solo se
+# usan respuestas cacheadas (p. ej. ingeridas desde un fichero de resultados, ver lote_llm.py).
+MODO_LOTE_LLM = None
+RUTA_LOTE_LLM = "lote_llm_peticiones.jsonl"
+
+_CLIENTE_OPENAI = None
+_CLIENTE_OPENAI_INICIALIZADO = False
+
+def obtener_cliente_openai():
+    """Carga el .env y crea el cliente OpenAI en la primera llamada (None si no es posible)."""
+    global _CLIENTE_OPENAI, _CLIENTE_OPENAI_INICIALIZADO
+    if not _CLIENTE_OPENAI_INICIALIZADO:
+        _CLIENTE_OPENAI_INICIALIZADO = True
+        try:
+            from dotenv import load_dotenv
+            from openai import OpenAI
+            load_dotenv()
+            _CLIENTE_OPENAI = OpenAI()  # Lee la key de la variable de entorno OPENAI_API_KEY
+        except Exception as e:
+            print(f"Error al instanciar el cliente OpenAI. Asegúrate de que openai está instalado y OPENAI_API_KEY está en tu .env: {e}")
+            _CLIENTE_OPENAI = None
+    return _CLIENTE_OPENAI
+
+def _completar_openai(mensajes, modelo, temperatura):
+    response = obtener_cliente_openai().chat.completions.create(
+        model=modelo,
+        messages=mensajes,
+        temperature=temperatura,
+        timeout=TIMEOUT_LLM
+    )
+    return response.choices[0].message.content
+
+# Proveedores disponibles: nombre -> (completar(mensajes, modelo, temperatura) -> texto, disponible() -> bool)
+PROVEEDORES = {
+    "openai": (_completar_openai, lambda: obtener_cliente_openai() is not None),
+}
+
+def registrar_proveedor(nombre, completar, disponible=None):
+    """
+    Registra un proveedor alternativo (otro API, modelo local, stub de pruebas...). Su función completar
+    debe cortar cada petición a los TIMEOUT_LLM segundos, como la de OpenAI: la precarga no añade otro timeout.
+    """
+    PROVEEDORES[nombre] = (completar, disponible or (lambda: True))
 
-# Importar la clase OpenAI
-from openai import OpenAI
+def proveedor_disponible(proveedor=None):
+    """Indica si el proveedor configurado puede atender peticiones (lo inicializa si hace falta)."""
+    proveedor = proveedor or PROVEEDOR_LLM
+    return proveedor in PROVEEDORES and PROVEEDORES[proveedor][1]()
 
-# Cargar variables de entorno
-load_dotenv()
+def clave_cache_llm(modelo, mensajes, temperatura, n):
+    """Clave de la caché: hash del modelo, los mensajes (sistema y prompt), la temperatura y n."""
+    contenido = json.dumps([modelo, mensajes, temperatura, n], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
 
-# Configurar la API Key es ahora implícito al instanciar el cliente
-# openai.api_key = os.getenv("OPENAI_API_KEY") # <-- Ya no se necesita
+def leer_cache_llm(clave):
+    """Devuelve el texto cacheado para la clave, o None si no existe o ha caducado (salvo las de origen "lote")."""
+    ruta = os.path.join(RUTA_CACHE_LLM, f"{clave}.json")
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            entrada = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Las respuestas ingeridas de un lote no caducan: el modo offline depende de ellas y no se pueden volver a pedir
+    caducada = TTL_CACHE_LLM is not None and time.time() - entrada["creado"] > TTL_CACHE_LLM
+    if caducada and entrada.get("origen") != "lote":
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass  # Ya eliminada por otra petición concurrente
+        return None
+    os.utime(ruta)  # La fecha de modificación marca el último uso para el desalojo por tamaño
+    return entrada["texto"]
+
+def guardar_cache_llm(clave, texto, **metadatos):
+    """Guarda una respuesta y desaloja las entradas usadas hace más tiempo si se supera el tamaño máximo."""
+    os.makedirs(RUTA_CACHE_LLM, exist_ok=True)
+    ruta = os.path.join(RUTA_CACHE_LLM, f"{clave}.json")
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump({"creado": time.time(), **metadatos, "texto": texto}, f, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+    entradas = []
+    for nombre in os.listdir(RUTA_CACHE_LLM):
+        if nombre.endswith(".json"):
+            try:
+                info = os.stat(os.path.join(RUTA_CACHE_LLM, nombre))
+            except OSError:
+                continue
+            entradas.append((info.st_mtime, info.st_size, nombre))
+    total = sum(tamano for _, tamano, _ in entradas)
+    for _, tamano, nombre in sorted(entradas):
+        if total <= TAMANO_MAX_CACHE_LLM:
+            break
+        if nombre != f"{clave}.json":
+            try:
+                os.remove(os.path.join(RUTA_CACHE_LLM, nombre))
+            except OSError:
+                pass  # Ya eliminada por otra petición concurrente
+            total -= tamano
+
+def limpiar_cache_llm():
+    """Elimina todas las respuestas cacheadas."""
+    if os.path.isdir(RUTA_CACHE_LLM):
+        for nombre in os.listdir(RUTA_CACHE_LLM):
+            os.remove(os.path.join(RUTA_CACHE_LLM, nombre))
+
+class PeticionEnLote(RuntimeError):
+    """La petición se ha anotado en el fichero de lote y su respuesta aún no está disponible."""
+
+_CERROJO_LOTE = threading.Lock()
+
+def anotar_peticion_lote(clave, modelo, mensajes, temperatura, ruta=None):
+    """Añade la petición al fichero de lote (una línea por custom_id) y devuelve si era nueva."""
+    ruta = ruta or RUTA_LOTE_LLM
+    with _CERROJO_LOTE:
+        existentes = set()
+        if os.path.exists(ruta):
+            with open(ruta, encoding="utf-8") as f:
+                existentes = {json.loads(linea)["custom_id"] for linea in f if linea.strip()}
+        if clave in existentes:
+            return False
+        linea = {
+            "custom_id": clave,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {"model": modelo, "messages": mensajes, "temperature": temperatura},
+        }
+        with open(ruta, "a", encoding="utf-8") as f:
+            f.write(json.dumps(linea, ensure_ascii=False) + "\n")
+        return True
+
+def completar(system, prompt, temperatura=0.7, n=None, modelo=None, proveedor=None):
+    """
+    Interfaz común de los helpers: envía un mensaje de sistema y un prompt y devuelve el texto generado.
+    Consulta primero la caché persistente, de modo que el proveedor solo se inicializa si hace falta.
+    """
+    proveedor = proveedor or PROVEEDOR_LLM
+    modelo = modelo or MODELO_LLM
+    mensajes = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": prompt}
+    ]
 
-# Instanciar el cliente OpenAI (lee la key de la variable de entorno)
-try:
-    client = OpenAI()
-except Exception as e:
-    print(f"Error al instanciar el cliente OpenAI. Asegúrate de que OPENAI_API_KEY está en tu .env: {e}")
-    client = None # Marcar como None si falla la inicialización
+    clave = clave_cache_llm(modelo, mensajes, temperatura, n)
+    if USAR_CACHE_LLM and not REFRESCAR_CACHE_LLM:
+        texto = leer_cache_llm(clave)
+        if texto is not None:
+            return texto
+
+    if MODO_LOTE_LLM == "escribir":
+        anotar_peticion_lote(clave, modelo, mensajes, temperatura)
+        raise PeticionEnLote(f"Petición {clave[:12]} anotada en {RUTA_LOTE_LLM}")
+    if MODO_LOTE_LLM == "offline":
+        raise RuntimeError(f"Respuesta {clave[:12]} no disponible en la caché (modo offline)")
+    if not proveedor_disponible(proveedor):
+        raise RuntimeError(f"Proveedor LLM '{proveedor}' no disponible")
+    completar_proveedor, _ = PROVEEDORES[proveedor]
+    texto = completar_proveedor(mensajes, modelo, temperatura)
+    if USAR_CACHE_LLM:
+        guardar_cache_llm(clave, texto, modelo=modelo, temperatura=temperatura, n=n, proveedor=proveedor)
+    return texto
 
 # ---- Funciones ----
 
-def get_universities(n=300):
+# ---- Generación de universidades por lotes ----
+PAISES_UE = [
+    "Alemania", "Austria", "Bélgica", "Bulgaria", "Croacia", "Chipre", "República Checa", 
+    "Dinamarca", "Estonia", "Finlandia", "Francia", "Grecia", "Hungría", "Irlanda", 
+    "Italia", "Letonia", "Lituania", "Luxemburgo", "Malta", "Países Bajos", "Polonia", 
+    "Portugal", "Rumania", "Eslovaquia", "Eslovenia", "Suecia"
+]
+PAISES_PRIORITARIOS = ("Alemania", "Francia", "Italia", "Polonia")  # Reciben el doble de universidades
+TAMANO_LOTE_UNIVERSIDADES = 50  # Universidades por petición: respuestas cortas que no se truncan
+HILOS_LLM = 8                   # Peticiones simultáneas
+MAX_RONDAS_RELLENO = 3          # Rondas extra para cubrir duplicados o respuestas incompletas
+PATRON_NUMERACION = r'^\s*(?:\d+[.)]|[-*•])\s*'  # "1. ", "2) ", "- " al inicio de una línea
+
+def limpiar_nombres(serie):
     """
-    Llama a GPT para generar nombres de universidades europeas plausibles y su país,
-    incluyendo prácticamente todos los países de la Unión Europea excepto España.
-    Devuelve una lista de tuplas: [(nombre, pais), ...]
+    Quita la numeración o viñeta inicial ("1. ", "2) ", "- ") y los espacios sobrantes de una columna de
+    nombres. Es la única limpieza de nombres: la usan las respuestas del LLM, la etapa
+    normalizacion_nombres de generate_data y limpiar_nombres_universidades.py.
     """
-    if not client:
-        print("Cliente OpenAI no inicializado. Usando fallback para universidades.")
-        return fallback_universities(n)
-
-    # Lista completa de países de la UE (excepto España) para el prompt
-    paises_ue = [
-        "Alemania", "Austria", "Bélgica", "Bulgaria", "Croacia", "Chipre", "República Checa", 
-        "Dinamarca", "Estonia", "Finlandia", "Francia", "Grecia", "Hungría", "Irlanda", 
-        "Italia", "Letonia", "Lituania", "Luxemburgo", "Malta", "Países Bajos", "Polonia", 
-        "Portugal", "Rumania", "Eslovaquia", "Eslovenia", "Suecia"
-    ]
+    return (
+        serie.str.replace(PATRON_NUMERACION, '', regex=True)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+    )
 
+def clave_universidad(nombre):
+    """Clave de deduplicación de un nombre ya limpio: sin acentos, mayúsculas ni signos de puntuación."""
+    sin_acentos = unicodedata.normalize("NFKD", nombre)
+    return "".join(c for c in sin_acentos.casefold() if c.isalnum())
+
+def repartir_por_pais(n, paises=PAISES_UE):
+    """Reparte n universidades entre países (doble peso para los prioritarios) por mayor resto."""
+    pesos = [2 if pais in PAISES_PRIORITARIOS else 1 for pais in paises]
+    cuotas = [n * peso / sum(pesos) for peso in pesos]
+    reparto = [int(c) for c in cuotas]
+    por_resto = sorted(range(len(paises)), key=lambda i: (reparto[i] - cuotas[i], i))
+    for i in por_resto[:n - sum(reparto)]:
+        reparto[i] += 1
+    return dict(zip(paises, reparto))
+
+def _pedir_lote_universidades(pais, cantidad, parte, excluir):
+    """Pide un lote de universidades de un país y lo devuelve parseado como [(nombre, pais), ...]."""
     prompt = (
-        f"Genera una lista de {n} nombres plausibles de universidades europeas y su país. "
-        f"INCLUYE UNIVERSIDADES DE TODOS ESTOS PAÍSES DE LA UNIÓN EUROPEA: {', '.join(paises_ue)}. "
-        f"Distribuye las universidades de manera equilibrada entre todos estos países, "
-        f"priorizando ligeramente Alemania, Francia, Italia y Polonia, pero asegurándote de incluir "
-        f"universidades de TODOS los países mencionados. "
-        f"Usa nombres realistas de universidades existentes o plausibles. "
-        f"Formatea cada entrada como: Nombre Universidad - País. Ejemplo: Sorbonne Université - Francia\n"
-        f"IMPORTANTE: NO incluyas universidades de España. "
+        f"Genera una lista de {cantidad} nombres plausibles de universidades de {pais} (bloque {parte}). "
+        f"Usa nombres realistas de universidades existentes o plausibles, todos distintos entre sí; "
+        f"en los bloques posteriores al primero incluye universidades regionales, politécnicas y escuelas superiores menos conocidas. "
+        + (f"NO repitas ninguna de estas: {'; '.join(excluir)}. " if excluir else "")
+        + f"Formatea cada entrada como: Nombre Universidad - País. Ejemplo: Sorbonne Université - Francia\n"
         f"Devuelve SOLO la lista, una entrada por línea."
     )
-    try:
-        # Usar la nueva sintaxis client.chat.completions.create
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Eres un generador de datos académicos. Devuelves listas en formato 'Nombre - País'."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
-        )
-        # Acceder al contenido de la respuesta con la nueva estructura
-        text = response.choices[0].message.content
+    text = completar(
+        "Eres un generador de datos académicos. Devuelves listas en formato 'Nombre - País'.",
+        prompt,
+        temperatura=0.7,
+        n=cantidad
+    )
 
-        universidades_paises = []
-        for line in text.strip().split('\n'):
-            parts = line.split(' - ')
-            if len(parts) == 2:
-                nombre = parts[0].strip()
-                pais = parts[1].strip()
-                universidades_paises.append((nombre, pais))
-            else:
-                print(f"Advertencia: Línea de universidad mal formateada: {line}")
+    nombres = limpiar_nombres(pd.Series([line.rsplit(' - ', 1)[0] for line in text.strip().split('\n')], dtype=str))
+    return [(nombre, pais) for nombre in nombres if nombre]  # El país es el del lote, para mantener el reparto
 
+def get_universities(n=300, usar_fallback=True):
+    """
+    Llama a GPT para generar nombres de universidades europeas plausibles y su país,
+    incluyendo prácticamente todos los países de la Unión Europea excepto España.
+    Las peticiones se dividen en lotes por país de hasta TAMANO_LOTE_UNIVERSIDADES que se lanzan en
+    paralelo; cada respuesta se parsea al llegar, se deduplica por nombre normalizado y se piden
+    lotes de relleno hasta alcanzar n (o agotar MAX_RONDAS_RELLENO).
+    Devuelve una lista de tuplas: [(nombre, pais), ...]
+    Con usar_fallback=False propaga el error en lugar de devolver el fallback.
+    """
+    try:
+        cuotas = repartir_por_pais(n)
+        obtenidas = {pais: [] for pais in PAISES_UE}
+        vistas = set()
+        partes = {pais: 0 for pais in PAISES_UE}
+
+        with ThreadPoolExecutor(max_workers=HILOS_LLM) as pool:
+            for ronda in range(1 + MAX_RONDAS_RELLENO):
+                lotes = []
+                for pais in PAISES_UE:
+                    faltan = cuotas[pais] - len(obtenidas[pais])
+                    while faltan > 0:
+                        cantidad = min(faltan, TAMANO_LOTE_UNIVERSIDADES)
+                        partes[pais] += 1
+                        # En las rondas de relleno se indican los nombres ya obtenidos para evitar repetirlos
+                        excluir = [nombre for nombre, _ in obtenidas[pais][-100:]] if ronda > 0 else []
+                        lotes.append((pais, cantidad, partes[pais], excluir))
+                        faltan -= cantidad
+                if not lotes:
+                    break
+                if ronda > 0:
+                    print(f"🔁 Ronda de relleno {ronda}: {sum(l[1] for l in lotes)} universidades en {len(lotes)} lotes")
+
+                futuros = {pool.submit(_pedir_lote_universidades, *lote): i for i, lote in enumerate(lotes)}
+                resultados = [None] * len(lotes)
+                for futuro in as_completed(futuros):
+                    try:
+                        resultados[futuros[futuro]] = futuro.result()
+                    except Exception as e:
+                        if not isinstance(e, PeticionEnLote):
+                            print(f"Advertencia: lote de universidades de {lotes[futuros[futuro]][0]} fallido: {e}")
+                        resultados[futuros[futuro]] = None
+                if all(r is None for r in resultados):
+                    break  # Ningún lote respondió (sin red, modo offline o modo lote): no tiene sentido rellenar
+
+                # Se incorporan en el orden de los lotes para que el resultado sea reproducible
+                for (pais, cantidad, _, _), universidades in zip(lotes, resultados):
+                    for nombre, pais_universidad in (universidades or [])[:cantidad]:
+                        clave = clave_universidad(nombre)
+                        if clave and clave not in vistas and len(obtenidas[pais]) < cuotas[pais]:
+                            vistas.add(clave)
+                            obtenidas[pais].append((nombre, pais_universidad))
+
+        universidades_paises = [u for pais in PAISES_UE for u in obtenidas[pais]]
         if not universidades_paises:
             raise ValueError("El LLM no devolvió universidades válidas.")
+        print(f"✅ {len(universidades_paises)} universidades únicas obtenidas en {sum(partes.values())} lotes.")
+        if len(universidades_paises) < n:
+            print(f"Advertencia: el LLM generó {len(universidades_paises)} de {n} universidades únicas.")
 
         return universidades_paises[:n] # Devuelve lista de tuplas
 
     except Exception as e:
-        print(f"Error al llamar a la API de OpenAI para universidades: {e}")
-        print("Generando nombres de universidades y países genéricos.")
+        if not usar_fallback:
+            raise
+        print(f"Error al llamar al LLM para universidades: {e}")
+        avisar_relleno("universidades", n, n)
         return fallback_universities(n)
 
+def avisar_relleno(nombre, genericos, total):
+    """
+    Avisa de forma visible de que `genericos` de los `total` elementos pedidos al LLM se completan con el
+    fallback genérico. En modo offline indica cómo obtener las respuestas que faltan en la caché.
+    """
+    if not genericos:
+        return
+    print(f"⚠️⚠️ {nombre}: {genericos} de {total} NO proceden del LLM y se completan con valores genéricos.")
+    if MODO_LOTE_LLM == "offline":
+        print("   ⚠️ Faltan respuestas en la caché (modo offline). Vuelve a ejecutar 'llm-batch write', envía el "
+              "lote y 'llm-batch ingest': las rondas de relleno solo se pueden anotar tras ingerir las anteriores.")
+
 def fallback_universities(n):
     """Función helper para el fallback de universidades con todos los países de la UE excepto España."""
-    paises_fallback = [
-        "Alemania", "Austria", "Bélgica", "Bulgaria", "Croacia", "Chipre", "República Checa", 
-        "Dinamarca", "Estonia", "Finlandia", "Francia", "Grecia", "Hungría", "Irlanda", 
-        "Italia", "Letonia", "Lituania", "Luxemburgo", "Malta", "Países Bajos", "Polonia", 
-        "Portugal", "Rumania", "Eslovaquia", "Eslovenia", "Suecia"
-    ]
+    paises_fallback = PAISES_UE
     
     # Crear una distribución más equilibrada
     universidades = []
@@ -117,14 +371,10 @@ def fallback_universities(n):
     
     return universidades
 
-def get_alegation_motives(n=20):
+def get_alegation_motives(n=20, usar_fallback=True):
     """
     Llama a GPT para generar motivos realistas y específicos de alegaciones Erasmus.
     """
-    if not client:
-        print("Cliente OpenAI no inicializado. Usando fallback para motivos de alegación.")
-        return fallback_alegation_motives()
-        
     prompt = (
         f"Genera una lista de {n} motivos específicos y realistas por los cuales un estudiante de la Universidad de Sevilla podría presentar una alegación relacionada con su solicitud Erasmus. "
         f"Incluye diferentes categorías como: errores administrativos (ej. 'Error en cálculo de nota media', 'Documentación traspapelada'), problemas con destinos (ej. 'Destino cancelado sin alternativa viable', 'Información errónea sobre asignaturas en destino X'), motivos personales justificados (ej. 'Enfermedad sobrevenida documentada', 'Situación familiar grave inesperada'), problemas académicos (ej. 'No reconocimiento de créditos específicos', 'Error en baremación por idioma')."
@@ -132,17 +382,12 @@ def get_alegation_motives(n=20):
         f"Formatea la respuesta como una lista simple, un motivo por línea, sin numeración ni guiones iniciales."
     )
     try:
-        # Usar la nueva sintaxis
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Eres un experto en gestión de programas de movilidad estudiantil."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
+        text = completar(
+            "Eres un experto en gestión de programas de movilidad estudiantil.",
+            prompt,
+            temperatura=0.7,
+            n=n
         )
-        # Acceder al contenido
-        text = response.choices[0].message.content
 
         motivos = []
         for m in text.split("\n"):
@@ -155,7 +400,9 @@ def get_alegation_motives(n=20):
         return motivos[:n]
 
     except Exception as e:
-        print(f"Error al llamar a la API de OpenAI para motivos: {e}")
+        if not usar_fallback:
+            raise
+        print(f"Error al llamar al LLM para motivos: {e}")
         print("Usando motivos de alegación por defecto.")
         return fallback_alegation_motives()
 
@@ -184,14 +431,10 @@ def fallback_alegation_motives():
         "Solicitud de cambio de destino por causa mayor documentada"
     ]
 
-def get_process_patterns(n=10):
+def get_process_patterns(n=10, usar_fallback=True):
     """
     Llama a GPT para generar patrones (secuencias de IDs de actividad) realistas del proceso Erasmus.
     """
-    if not client:
-        print("Cliente OpenAI no inicializado. Usando fallback para patrones de proceso.")
-        return fallback_process_patterns()
-        
     # Obtener descripción de actividades para el prompt (ACTUALIZADA con IDs renumerados)
     actividades_desc = """
     1: Solicitud Convalidación Idioma Recibida
@@ -256,17 +499,12 @@ Devuelve SOLO las listas, una por línea.
 """
 
     try:
-        # Usar la nueva sintaxis
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Generas listas de Python representando secuencias de IDs de actividad."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.6 # Temperatura un poco más baja para seguir el formato
+        text = completar(
+            "Generas listas de Python representando secuencias de IDs de actividad.",
+            prompt,
+            temperatura=0.6, # Temperatura un poco más baja para seguir el formato
+            n=n
         )
-        # Acceder al contenido
-        text = response.choices[0].message.content
 
         # Parsear la respuesta para extraer las listas
         patrones = []
@@ -283,13 +521,17 @@ Devuelve SOLO las listas, una por línea.
                 print(f"Advertencia: No se pudo parsear la línea del LLM con ast.literal_eval: {line}")
                 continue
 
+        # Solo se aceptan los patrones que respetan el orden del modelo de proceso (idioma, alegaciones, bucles LA)
+        patrones = filtrar_patrones(patrones)
         if not patrones:
              raise ValueError("El LLM no devolvió patrones válidos.")
 
         return patrones
 
     except Exception as e:
-        print(f"Error al llamar a la API de OpenAI o parsear la respuesta: {e}")
+        if not usar_fallback:
+            raise
+        print(f"Error al llamar al LLM o parsear la respuesta: {e}")
         print("Usando patrones de proceso por defecto.")
         return fallback_process_patterns()
 
@@ -344,3 +586,77 @@ def fallback_process_patterns():
         # Con Idioma Rechazo (1->2), Cancelado
         [1, 2, 33]
     ]
+
+# ---- Precarga asíncrona de las peticiones al LLM ----
+# nombre -> (helper, fallback(n)). Los fallbacks consumen `random`, por lo que solo se ejecutan en el
+# hilo principal (al recoger el resultado) para no alterar la secuencia aleatoria del pipeline.
+PETICIONES_LLM = {
+    "universidades": (get_universities, fallback_universities),
+    "motivos": (get_alegation_motives, lambda n: fallback_alegation_motives()),
+    "patrones": (get_process_patterns, lambda n: fallback_process_patterns()),
+}
+
+_PRECARGAS = {}  # nombre -> (n, Future con el resultado o None si hay que usar el fallback)
+
+async def _pedir_con_reintentos(nombre, n):
+    """
+    Lanza una petición en un hilo con reintentos y backoff exponencial. No se corta por tiempo: un hilo no
+    se puede cancelar y un reintento en paralelo duplicaría las llamadas, así que cada intento dura lo que
+    tarden sus peticiones al proveedor (acotadas por TIMEOUT_LLM) y el siguiente empieza cuando termina.
+    """
+    helper, _ = PETICIONES_LLM[nombre]
+    jitter = random.Random()  # Generador propio: no consume la secuencia global de `random`
+    for intento in range(REINTENTOS_LLM):
+        try:
+            return await asyncio.to_thread(helper, n, usar_fallback=False)
+        except Exception as e:
+            print(f"⚠️ Petición LLM '{nombre}' fallida (intento {intento + 1}/{REINTENTOS_LLM}): {e}")
+            if intento < REINTENTOS_LLM - 1:
+                await asyncio.sleep(BACKOFF_LLM * 2 ** intento * (1 + jitter.random()))
+    return None
+
+async def _precargar(peticiones, futuros):
+    resultados = await asyncio.gather(*(_pedir_con_reintentos(nombre, n) for nombre, n in peticiones.items()))
+    for nombre, resultado in zip(peticiones, resultados):
+        futuros[nombre].set_result(resultado)
+
+def iniciar_precarga(peticiones):
+    """
+    Lanza en segundo plano y de forma concurrente las peticiones {nombre: n} (ver PETICIONES_LLM),
+    para que la latencia de red se solape con las etapas que no necesitan el LLM.
+    """
+    futuros = {nombre: Future() for nombre in peticiones}
+    for nombre, n in peticiones.items():
+        _PRECARGAS[nombre] = (n, futuros[nombre])
+
+    def ejecutar():
+        try:
+            asyncio.run(_precargar(peticiones, futuros))
+        except Exception as e:
+            for futuro in futuros.values():
+                if not futuro.done():
+                    futuro.set_exception(e)
+
+    threading.Thread(target=ejecutar, name="precarga-llm", daemon=True).start()
+    print(f"🚀 Precargando en paralelo las peticiones al LLM: {', '.join(peticiones)}")
+
+def obtener_llm(nombre, n):
+    """
+    Devuelve el resultado de una petición al LLM: espera a la precarga si se lanzó con el mismo n y,
+    si no, llama de forma síncrona. Si la precarga agotó los reintentos se usa el fallback.
+    """
+    helper, fallback = PETICIONES_LLM[nombre]
+    n_precarga, futuro = _PRECARGAS.pop(nombre, (None, None))
+    if futuro is None or n_precarga != n:
+        return helper(n)
+    try:
+        resultado = futuro.result()
+    except Exception as e:
+        print(f"Error en la precarga del LLM para {nombre}: {e}")
+        resultado = None
+    if resultado is None:
+        print(f"Usando {nombre} por defecto tras agotar los reintentos.")
+        if nombre == "universidades":
+            avisar_relleno(nombre, n, n)
+        return fallback(n)
+    return resultado
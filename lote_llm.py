@@ -0,0 +1,113 @@
+import json
+import os
+import random
+import re
+
+import llm_helpers as lh
+
+# ---- Configuración del modo por lotes ----
+RUTA_RESULTADOS_LOTE = "lote_llm_resultados.jsonl"
+NUM_MOTIVOS = 20
+NUM_PATRONES = 20
+
+def escribir_lote(num_destinos, ruta=None, num_motivos=NUM_MOTIVOS, num_patrones=NUM_PATRONES):
+    """
+    Anota en un fichero JSONL (formato de la Batch API de OpenAI) todas las peticiones que el
+    pipeline haría al LLM y que aún no tienen respuesta en la caché, sin llamar a la red.
+    Las rondas de relleno de universidades dependen de las respuestas anteriores, así que solo se anotan
+    al repetir la escritura después de ingerir el lote: se repite hasta que no quede nada pendiente.
+    Devuelve el número de peticiones pendientes en el fichero.
+    """
+    ruta = ruta or lh.RUTA_LOTE_LLM
+    if os.path.exists(ruta):
+        os.remove(ruta)  # El lote solo recoge lo que falta ahora; lo ya ingerido se sirve desde la caché
+    modo_anterior, ruta_anterior = lh.MODO_LOTE_LLM, lh.RUTA_LOTE_LLM
+    lh.MODO_LOTE_LLM, lh.RUTA_LOTE_LLM = "escribir", ruta
+    estado_aleatorio = random.getstate()  # Los fallbacks no deben alterar la secuencia del llamador
+    try:
+        for helper, n in ((lh.get_universities, num_destinos), (lh.get_alegation_motives, num_motivos),
+                          (lh.get_process_patterns, num_patrones)):
+            try:
+                helper(n, usar_fallback=False)
+            except Exception:
+                pass  # Las peticiones ya están anotadas; el resultado se obtendrá al ingerir el lote
+    finally:
+        lh.MODO_LOTE_LLM, lh.RUTA_LOTE_LLM = modo_anterior, ruta_anterior
+        random.setstate(estado_aleatorio)
+
+    pendientes = 0
+    if os.path.exists(ruta):
+        with open(ruta, encoding="utf-8") as f:
+            pendientes = sum(1 for linea in f if linea.strip())
+    print(f"📝 {pendientes} peticiones pendientes en {ruta}")
+    if pendientes:
+        print("   Tras 'llm-batch ingest', vuelve a ejecutar 'llm-batch write' hasta que no queden peticiones "
+              "pendientes (rondas de relleno por nombres repetidos o respuestas incompletas).")
+    return pendientes
+
+def ingerir_resultados(ruta_resultados=RUTA_RESULTADOS_LOTE):
+    """
+    Carga un fichero de resultados de la Batch API en la caché de respuestas del LLM (con el
+    custom_id como clave), de modo que la generación posterior puede ejecutarse sin red.
+    Devuelve (respuestas ingeridas, errores).
+    """
+    ingeridas, errores = 0, 0
+    with open(ruta_resultados, encoding="utf-8") as f:
+        for linea in f:
+            if not linea.strip():
+                continue
+            resultado = json.loads(linea)
+            respuesta = resultado.get("response") or {}
+            if resultado.get("error") or respuesta.get("status_code") != 200:
+                errores += 1
+                continue
+            texto = respuesta["body"]["choices"][0]["message"]["content"]
+            lh.guardar_cache_llm(resultado["custom_id"], texto, origen="lote", modelo=respuesta["body"].get("model"))
+            ingeridas += 1
+    print(f"📥 {ingeridas} respuestas ingeridas desde {ruta_resultados} ({errores} con error)")
+    return ingeridas, errores
+
+def _respuesta_simulada(peticion):
+    """Respuesta local de sustitución para una petición del lote, reproducible por custom_id."""
+    rng = random.Random(peticion["custom_id"])
+    system, prompt = (m["content"] for m in peticion["body"]["messages"])
+    cantidad = int(re.search(r"Genera (?:una lista de )?(\d+)", prompt).group(1))
+
+    if "'Nombre - País'" in system:
+        pais = re.search(r"universidades de (.+?) \(bloque (\d+)\)", prompt)
+        pais, parte = pais.group(1), int(pais.group(2))
+        prefijos = ["Universidad de", "Universidad Técnica de", "Instituto Politécnico de", "Escuela Superior de"]
+        return "\n".join(
+            f"{rng.choice(prefijos)} {pais} {parte}-{i} - {pais}" for i in range(1, cantidad + 1)
+        )
+    if "movilidad estudiantil" in system:
+        return "\n".join(lh.fallback_alegation_motives()[:cantidad])
+    patrones = lh.fallback_process_patterns()
+    return "\n".join(str(rng.choice(patrones)) for _ in range(cantidad))
+
+def simular_resultados(ruta_peticiones=None, ruta_resultados=RUTA_RESULTADOS_LOTE):
+    """
+    Sustituto local de la Batch API: genera un fichero de resultados con el mismo formato para
+    cada petición del lote (útil para pruebas y ejecuciones sin acceso al modelo).
+    """
+    ruta_peticiones = ruta_peticiones or lh.RUTA_LOTE_LLM
+    with open(ruta_peticiones, encoding="utf-8") as f:
+        peticiones = [json.loads(linea) for linea in f if linea.strip()]
+
+    with open(ruta_resultados, "w", encoding="utf-8") as f:
+        for peticion in peticiones:
+            resultado = {
+                "id": f"local-{peticion['custom_id'][:12]}",
+                "custom_id": peticion["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "model": peticion["body"]["model"],
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": _respuesta_simulada(peticion)}}],
+                    },
+                },
+                "error": None,
+            }
+            f.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+    print(f"🧪 {len(peticiones)} resultados simulados escritos en {ruta_resultados}")
+    return len(peticiones)